@@ -2,20 +2,61 @@
 """
 CLI para el pipeline nuevo de análisis NO_MATCH.
 Uso: python analyzer_cli.py --chats data/Chat.csv --training data/Intent.csv --out outputs/
+     python analyzer_cli.py tune --chats data/Chat.csv --training data/Intent.csv   (perfil n_threads / n_batch / llm_workers)
 """
 import argparse
 import os
 from core.config_loader import load_config, get_config_path, get_model_filename_from_config
-from core.analyzer import analizar_pipeline
+from core.analyzer import analizar_pipeline, sample_judge_prompts
+from core.tuning import TUNING_SAMPLE, format_result, profile_key, run_tuning, save_profile, tuning_profiles_path
+
+
+def tune(args, config):
+    """Benchmark de n_threads / n_batch / llm_workers sobre prompts reales y perfil ganador para este host + modelo."""
+    from core.llm_runtime import llm_config_from_pipeline, make_token_counter
+
+    if not config.get("model_filename"):
+        print("tune: no hay model_path configurado.")
+        return
+    print(f"Armando {args.muestra} prompts de muestra...")
+    prompts = sample_judge_prompts(args.chats, args.training, config, n=args.muestra)
+    if not prompts:
+        print("tune: no hay casos NO_MATCH en los chats.")
+        return
+    print(f"Benchmark con {len(prompts)} prompts (n_threads, después n_batch, después llm_workers):")
+    try:
+        best, _ = run_tuning(
+            prompts,
+            llm_config_from_pipeline(config),
+            count_tokens=make_token_counter(config["model_filename"]),
+            logger_callback=print,
+        )
+    except (ImportError, OSError, RuntimeError) as e:
+        print(f"tune: no se pudo cargar el modelo ({e}).")
+        return
+    path = tuning_profiles_path(config)
+    save_profile(path, profile_key(config["model_filename"]), best, len(prompts))
+    print("Ganador: " + format_result(best))
+    print(f"Perfil guardado en {path} (analizar_pipeline lo aplica solo; use_tuning_profile: false para ignorarlo).")
 
 
 def main():
     p = argparse.ArgumentParser(description="Dialogflow NO_MATCH Analyzer (pipeline nuevo)")
+    p.add_argument(
+        "command", nargs="?", choices=("analizar", "tune"), default="analizar",
+        help="analizar (por defecto) o tune: benchmark de n_threads / n_batch / llm_workers y perfil por host + modelo",
+    )
     p.add_argument("--chats", required=True, help="Ruta al CSV de chats")
     p.add_argument("--training", required=True, help="Ruta al CSV de training/intents")
     p.add_argument("--out", default="outputs", help="Directorio de salida (default: outputs/)")
     p.add_argument("--config", help="Ruta a config JSON (opcional; model_path para LLM)")
     p.add_argument("--no-llm", action="store_true", help="No llamar al LLM (solo contexto + retriever + slots)")
+    p.add_argument("--rebuild-index", action="store_true", help="Reconstruir el índice de training aunque esté en caché")
+    p.add_argument("--no-dedup", action="store_true", help="Juzgar cada caso aunque repita texto + flow_ref de otro")
+    p.add_argument("--resume", action="store_true", help="Reanudar: no volver a juzgar casos ya guardados en <out>/journal.jsonl")
+    p.add_argument("--triage-only", action="store_true", help="Solo triage por reglas, sin LLM (el resto queda AMBIGUOUS)")
+    p.add_argument("--stream", action="store_true", help="Leer el CSV de chats por chunks (exports grandes agrupados por sesión)")
+    p.add_argument("--muestra", type=int, default=TUNING_SAMPLE, help="tune: prompts de la muestra por combinación")
     args = p.parse_args()
     config = {}
     config_path = args.config if args.config and os.path.isfile(args.config) else get_config_path()
@@ -25,9 +66,20 @@ def main():
         config.pop("csv_intents", None)
         config.pop("output_folder", None)
     model_filename = get_model_filename_from_config(config) if config else ""
-    if args.no_llm:
+    if args.no_llm or args.triage_only:
         model_filename = ""
     config["model_filename"] = model_filename or None
+    config["rebuild_index"] = args.rebuild_index
+    config["resume"] = args.resume
+    if args.no_dedup:
+        config["dedup_cases"] = False
+    if args.stream:
+        config["stream_ingest"] = True
+    if args.triage_only:
+        config["triage_only"] = True
+    if args.command == "tune":
+        tune(args, config)
+        return
     analizar_pipeline(
         path_chat_csv=args.chats,
         path_training_csv=args.training,
@@ -48,6 +48,8 @@ class IAAnalyzerApp(tk.Tk):
         self.pestana_actual = self.pestanas[nombre]
         self.pestana_actual.pack(fill="both", expand=True)
         self.sidebar.set_selected(nombre)
+        if hasattr(self.pestana_actual, "on_show"):
+            self.pestana_actual.on_show()
 
     def on_close(self):
         self.destroy()
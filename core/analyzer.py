@@ -1,44 +1,163 @@
 """
 Pipeline nuevo (local): orquestador por caso NO_MATCH.
-Preprocess + armado de prompts en paralelo real (ProcessPoolExecutor, sin GIL); LLM judge secuencial de a uno.
-Config: model_path (nombre .gguf, vacío = sin LLM), n_ctx, n_threads, max_workers. Salida: analisis_no_match.csv, auditoria.jsonl, cases_debug/.
+Productor (hilo): preprocess + retrieval + armado de prompts en paralelo real (ProcessPoolExecutor, sin GIL),
+hacia una cola acotada. Consumidor: LLM judge en tandas (llm_batch_size; con llm_workers > 1 repartidas entre
+procesos, core/judge_pool.py; con cascade_model_path, cascada chico -> grande en core/judge_cascade.py);
+cada fila se escribe apenas se juzga.
+Config: model_path (nombre .gguf, vacío = sin LLM), n_ctx, n_threads, max_workers, use_cache / cache_folder / rebuild_index
+(cachés de turnos y del índice de training), dedup_cases / dedup_context (un judge por texto + flow_ref),
+journal / resume (journal.jsonl con fsync por fila; resume saltea casos ya juzgados),
+llm_cache / llm_cache_max_entries (caché SQLite de veredictos entre corridas),
+resident_runtime (GUI: LocalLLM e índice de training residentes entre corridas, core/runtime_registry.py).
+Salida: analisis_no_match.csv, auditoria.jsonl, cases_debug/.
 """
 import os
 import json
+import queue
+import threading
+from collections import deque
 from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, Any, List, Optional, Tuple
 
+import numpy as np
+
 # Globals para workers de proceso (evitar GIL; paralelismo real)
-_worker_df_turns = None
 _worker_index = None
 _worker_max_msgs = None
 _worker_top_int = None
 _worker_ev_per = None
 _worker_neutral = None
+_worker_prompt_budget = None
+_worker_tokenizer_model = None
+_worker_count_tokens = None
+
+# Columnas de df_turns que usan infer_flow_ref / build_context_window en los workers
+WORKER_TURN_COLUMNS = ("session_id", "turn_index", "tipo", "texto", "intent_detectado", "flow_from_intent")
 
 
 def _init_process_worker(args: Tuple) -> None:
-    """Inicializador de cada proceso: recibe (df_turns, index, max_msgs, top_int, ev_per, neutral)."""
-    global _worker_df_turns, _worker_index, _worker_max_msgs, _worker_top_int, _worker_ev_per, _worker_neutral
-    (_worker_df_turns, _worker_index, _worker_max_msgs, _worker_top_int, _worker_ev_per, _worker_neutral) = args
+    """
+    Inicializador de cada proceso: recibe (index_source, max_msgs, top_int, ev_per, neutral, prompt_budget,
+    tokenizer_model). index_source es (cache_dir, key) de la caché del índice (se abre con mmap: la matriz queda
+    en el page cache compartido entre procesos) o el índice mismo si no hay caché.
+    Los turnos no viajan acá: cada tarea trae los de sus sesiones (_session_turns).
+    """
+    global _worker_index, _worker_max_msgs, _worker_top_int, _worker_ev_per, _worker_neutral
+    global _worker_prompt_budget, _worker_tokenizer_model, _worker_count_tokens
+    (index_source, _worker_max_msgs, _worker_top_int, _worker_ev_per, _worker_neutral,
+     _worker_prompt_budget, _worker_tokenizer_model) = args
+    if isinstance(index_source, tuple):
+        _worker_index = load_training_index(*index_source, mmap=True)
+        if _worker_index is None:
+            raise RuntimeError(f"No se pudo abrir el índice de training cacheado en {index_source[0]}")
+    else:
+        _worker_index = index_source
+    _worker_count_tokens = None
 
 
-def _process_case_worker(case: Dict[str, Any]) -> Dict[str, Any]:
-    """Worker por caso: usa globals seteados por _init_process_worker."""
-    return process_one_case(
-        case,
-        _worker_df_turns,
+def _process_cases_worker(task: Tuple) -> List[Tuple[Dict[str, Any], str]]:
+    """
+    Worker por tarea (casos, turnos de sus sesiones o None): retrieval en batch + prompt por payload.
+    Usa globals seteados por _init_process_worker; el índice de sesiones se arma sobre el corte recibido.
+    """
+    cases, turns = task
+    payloads = process_cases(
+        cases,
+        turns,
         _worker_index,
         _worker_max_msgs,
         _worker_top_int,
         _worker_ev_per,
         _worker_neutral,
+        build_session_index(turns) if turns is not None else None,
     )
+    global _worker_count_tokens
+    if _worker_count_tokens is None:
+        # Tokenizer del modelo (vocab_only) una vez por proceso, recién cuando hace falta
+        _worker_count_tokens = make_token_counter(_worker_tokenizer_model)
+    out = []
+    for p in payloads:
+        prompt, n_tokens, trimmed = build_judge_prompt_budgeted(p, _worker_prompt_budget, _worker_count_tokens)
+        p["prompt_tokens"] = n_tokens
+        p["prompt_trimmed"] = trimmed
+        out.append((p, prompt))
+    return out
+
+
+class _PipelineStopped(Exception):
+    """El consumidor dejó de leer la cola (error en el judge o en la escritura)."""
+
+
+def _put(q: "queue.Queue", item: Tuple, stop: threading.Event) -> None:
+    """q.put bloqueante que se corta si el consumidor terminó (evita dejar al productor colgado)."""
+    while True:
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            if stop.is_set():
+                raise _PipelineStopped()
+
+
+def _map_bounded(executor, fn, items, max_in_flight: int):
+    """executor.map con a lo sumo max_in_flight tareas pendientes (no consume todo el iterable de entrada)."""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _session_chunks(case_batches, chunk_size: int):
+    """
+    Re-parte tandas de casos en chunks de unos chunk_size casos sin cortar una sesión entre dos chunks
+    (los casos vienen agrupados por sesión), así cada sesión viaja a un solo worker.
+    """
+    chunk: List[Dict[str, Any]] = []
+    for batch in case_batches:
+        for case in batch:
+            if len(chunk) >= chunk_size and case["session_id"] != chunk[-1]["session_id"]:
+                yield chunk
+                chunk = []
+            chunk.append(case)
+    if chunk:
+        yield chunk
+
 
+def _session_turns(
+    cases: List[Dict[str, Any]],
+    df_turns,
+    session_index: Optional[Dict[str, Any]],
+    max_msgs: int,
+):
+    """
+    Turnos que necesita una tarea: por sesión, de los max_msgs turnos previos al primer trigger (desde el inicio
+    si algún caso no trae flow_ref) hasta el último trigger, solo WORKER_TURN_COLUMNS. None si ningún caso los
+    necesita (streaming, o contexto ya armado para dedup_context).
+    """
+    if df_turns is None:
+        return None
+    ranges: Dict[Any, Tuple[int, int]] = {}
+    for case in cases:
+        has_flow = "flow_ref" in case and "last_valid_intent" in case
+        if has_flow and "context_messages" in case:
+            continue
+        start, end = session_bounds(session_index, case["session_id"])
+        # turn_index es la posición dentro de la sesión (cumcount en cargar_chats_as_turns)
+        hi = min(end, start + int(case.get("trigger_turn_index", -1)) + 1)
+        lo = max(start, hi - max_msgs) if has_flow else start
+        if lo >= hi:
+            continue
+        prev = ranges.get(case["session_id"])
+        ranges[case["session_id"]] = (min(lo, prev[0]), max(hi, prev[1])) if prev else (lo, hi)
+    columns = [c for c in WORKER_TURN_COLUMNS if c in df_turns.columns]
+    if not ranges:
+        return df_turns.iloc[0:0][columns]
+    positions = np.concatenate([np.arange(lo, hi) for lo, hi in ranges.values()])
+    return df_turns.iloc[positions][columns].reset_index(drop=True)
 
-def _build_prompt_worker(payload: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
-    """Worker que arma el prompt para un payload (sin estado compartido)."""
-    return (payload, build_judge_prompt(payload))
 
 from core.spec import (
     MAX_MSG_CONTEXT,
@@ -46,17 +165,30 @@ from core.spec import (
     EVIDENCE_PER_INTENT,
     FLOWS_NEUTRALES,
     MAX_WORKERS,
+    PIPELINE_QUEUE_SIZE,
 )
 from core.preprocess import cargar_chats_as_turns
-from core.training import load_training_ffill
+from core.sessions import build_session_index, session_bounds
 from core.cases import extract_no_match_cases
-from core.context_builder import infer_flow_ref, build_context_window
-from core.retriever import build_training_index, retrieve_candidates
+from core.stream_ingest import stream_no_match_cases, STREAM_CHUNK_ROWS
+from core.context_builder import infer_flow_ref, build_context_window, attach_flow_ref
+from core.retriever import retrieve_candidates_batch, RETRIEVE_CHUNK
+from core.index_cache import get_training_index, cached_index_entry, load_training_index
+from core.dedup import dedup_key, dedup_case_batches, fan_out_row
+from core.journal import JudgeJournal, journal_path, input_fingerprint
+from core.llm_cache import VerdictCache, LLM_CACHE_FILENAME, LLM_CACHE_MAX_ENTRIES
+from core.config_loader import resolve_cache_dir
 from core.slot_signals import detect_slot_signals
 from core.post_validate import post_validate
-from core.report_writer import write_reports
-from core.report_aggregate import write_informe_general
-from core.llm_runtime import build_judge_prompt
+from core.triage import (
+    triage_case, DECIDED_BY_TRIAGE, DECIDED_BY_LLM, DECIDED_BY_LLM_LARGE, DECIDED_BY_LOGPROBS, DECIDED_BY_DEFAULT,
+)
+from core.judge_cascade import needs_escalation, format_cascade_stats
+from core.tuning import judge_workers, pipeline_judge_config
+from core.report_writer import write_reports, StreamingReportWriter, update_multiplicidad
+from core.report_aggregate import InformeAccumulator, write_informe
+from core.llm_runtime import build_judge_prompt_budgeted, make_token_counter, format_judge_stats, needs_full_judge
+from core.prompt_budget import prompt_budget
 
 
 def process_one_case(
@@ -67,47 +199,251 @@ def process_one_case(
     top_intents: int = TOP_INTENTS,
     evidence_per_intent: int = EVIDENCE_PER_INTENT,
     neutral_flows: Optional[Any] = None,
+    session_index: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """
-    Por cada case: infer_flow_ref, build_context_window, retrieve_candidates, detect_slot_signals.
+    Por cada case: flow_ref (columna del case si extract_no_match_cases la trajo; si no, infer_flow_ref),
+    build_context_window, retrieve_candidates, detect_slot_signals.
     Devuelve payload listo para el judge (y metadatos para el reporte).
+    session_index (build_session_index): corta la sesión por offsets en lugar de filtrar df_turns.
     """
-    neutral_flows = neutral_flows or FLOWS_NEUTRALES
-    trigger_ref = {
-        "session_id": case["session_id"],
-        "turn_index": case.get("trigger_turn_index"),
-    }
-    flow_ref, last_valid_intent = infer_flow_ref(
-        trigger_ref, df_turns, set(neutral_flows)
-    )
-    context_messages = build_context_window(
-        trigger_ref, df_turns, flow_ref, max_msgs, set(neutral_flows)
-    )
-    candidates = retrieve_candidates(
-        case["trigger_user_text_norm"],
+    return process_cases(
+        [case], df_turns, index, max_msgs, top_intents, evidence_per_intent, neutral_flows, session_index
+    )[0]
+
+
+def process_cases(
+    cases: List[Dict[str, Any]],
+    df_turns,
+    index: Dict[str, Any],
+    max_msgs: int = MAX_MSG_CONTEXT,
+    top_intents: int = TOP_INTENTS,
+    evidence_per_intent: int = EVIDENCE_PER_INTENT,
+    neutral_flows: Optional[Any] = None,
+    session_index: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    process_one_case para una tanda de casos: contexto y slots por caso, y los candidatos de todos
+    los triggers en una sola llamada a retrieve_candidates_batch. Devuelve los payloads en orden.
+    Casos que ya traen context_messages (ingesta en streaming) no necesitan df_turns.
+    """
+    neutral_flows = set(neutral_flows or FLOWS_NEUTRALES)
+    payloads = []
+    for case in cases:
+        trigger_ref = {
+            "session_id": case["session_id"],
+            "turn_index": case.get("trigger_turn_index"),
+        }
+        if "flow_ref" in case and "last_valid_intent" in case:
+            flow_ref, last_valid_intent = case["flow_ref"], case["last_valid_intent"]
+        else:
+            flow_ref, last_valid_intent = infer_flow_ref(
+                trigger_ref, df_turns, neutral_flows, session_index
+            )
+        if "context_messages" in case:
+            context_messages = case["context_messages"]
+        else:
+            context_messages = build_context_window(
+                trigger_ref, df_turns, flow_ref, max_msgs, neutral_flows, session_index
+            )
+        payloads.append({
+            "case_id": case["case_id"],
+            "session_id": case["session_id"],
+            "fecha": case.get("fecha", ""),
+            "flow_ref": flow_ref,
+            "last_valid_intent": last_valid_intent,
+            "context_messages": context_messages,
+            "trigger_user_text": case["trigger_user_text"],
+            "trigger_user_text_norm": case["trigger_user_text_norm"],
+            "slot_signals": detect_slot_signals(case["trigger_user_text_norm"]),
+            "candidates": [],
+            "mensaje_no_match": case["trigger_user_text"],
+            "bot_no_match_text": case.get("bot_no_match_text", ""),
+        })
+    all_candidates = retrieve_candidates_batch(
+        [p["trigger_user_text_norm"] for p in payloads],
         index,
-        flow_ref,
+        [p["flow_ref"] for p in payloads],
         top_intents=top_intents,
         evidence_per_intent=evidence_per_intent,
     )
-    slot_signals = detect_slot_signals(case["trigger_user_text_norm"])
-    bot_text = (case.get("no_match_bot_turn") or {}).get("texto", "")
+    for p, candidates in zip(payloads, all_candidates):
+        p["candidates"] = candidates
+    return payloads
+
+
+def _format_prompt_tokens(prompt_tokens: List[int], budget: int, n_trimmed: int) -> str:
+    """Distribución de tokens de prompt de la corrida (para el log)."""
+    t = sorted(prompt_tokens)
+
+    def q(f: float) -> int:
+        return t[min(len(t) - 1, int(f * len(t)))]
+
+    return (
+        f"Tokens de prompt: p50 {q(0.5)}, p90 {q(0.9)}, p99 {q(0.99)}, máx {t[-1]} "
+        f"(presupuesto {budget}; {n_trimmed} de {len(t)} prompts recortados)"
+    )
+
+
+def _judge_row(payload: Dict[str, Any], prompt: str, llm=None) -> Dict[str, Any]:
+    """
+    Judge de un payload (llm.chat_json + post_validate; sin llm, decisión por defecto con el top candidato)
+    y fila del reporte (CSV_COLUMNS salvo multiplicidad). Con llm suma generated_tokens (solo va al JSONL).
+    """
+    if llm is None:
+        return _verdict_row(payload, None)
+    try:
+        llm_result = llm.chat_json(prompt)
+    except Exception as e:
+        llm_result = e
+    return _verdict_row(payload, llm_result, getattr(llm, "last_generated_tokens", 0))
+
+
+def _verdict_row(
+    payload: Dict[str, Any],
+    llm_result: Any,
+    generated_tokens: Optional[int] = None,
+    decided_by: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Fila del reporte a partir de la salida del judge: dict (pasa por post_validate), Exception (AMBIGUOUS con el
+    error en why) o None (sin LLM). generated_tokens (None = sin LLM) va solo al JSONL.
+    decided_by: triage / llm / llm_large / llm_logprobs / sin_llm (por defecto, según haya salida del LLM).
+    """
+    if decided_by is None:
+        decided_by = DECIDED_BY_DEFAULT if llm_result is None else DECIDED_BY_LLM
+    if isinstance(llm_result, Exception):
+        e = llm_result
+        llm_result = {
+            "decision": "AMBIGUOUS",
+            "flow_recommended": payload.get("flow_ref", ""),
+            "intent_recommended": [],
+            "intents_relevantes": payload.get("candidates", []),
+            "why": str(e),
+            "improvements": [],
+            "new_training_phrases": {},
+            "suggested_dialogflow": {"parameters": [], "contexts": []},
+            "confidence": 0.0,
+            "review_flag": True,
+        }
+    elif llm_result is not None:
+        try:
+            if "confidence" not in llm_result:
+                llm_result["confidence"] = 0.5
+            llm_result = post_validate(
+                llm_result,
+                payload.get("candidates", []),
+                payload.get("flow_ref", ""),
+                payload.get("slot_signals", []),
+                payload.get("trigger_user_text", ""),
+            )
+        except Exception as e:
+            return _verdict_row(payload, e, generated_tokens, decided_by)
+    else:
+        top_candidate = (payload.get("candidates") or [{}])[0]
+        llm_result = {
+            "decision": "AMBIGUOUS",
+            "flow_recommended": payload.get("flow_ref", ""),
+            "intent_recommended": [top_candidate.get("intent", "")] if top_candidate else [],
+            "intents_relevantes": payload.get("candidates", []),
+            "why": "Sin LLM (use_llm=False o model_filename no configurado)",
+            "improvements": [],
+            "new_training_phrases": {},
+            "suggested_dialogflow": {"parameters": [], "contexts": []},
+            "confidence": 0.5,
+            "review_flag": True,
+        }
+    row = {
+        "fecha": payload.get("fecha", ""),
+        "session_id": payload.get("session_id", ""),
+        "case_id": payload.get("case_id", ""),
+        "mensaje_no_match": payload.get("mensaje_no_match", ""),
+        "bot_no_match_text": payload.get("bot_no_match_text", ""),
+        "flow_ref": payload.get("flow_ref", ""),
+        "last_valid_intent": payload.get("last_valid_intent", ""),
+        "decision": llm_result.get("decision", ""),
+        "flow_recommended": llm_result.get("flow_recommended", ""),
+        "intent_top": (llm_result.get("intent_recommended") or [""])[0] if llm_result.get("intent_recommended") else "",
+        "intents_relevantes": json.dumps(llm_result.get("intents_relevantes", []), ensure_ascii=False),
+        "top_evidence": json.dumps(
+            [(e.get("phrase"), e.get("sim")) for c in (payload.get("candidates") or [])[:1] for e in (c.get("evidence") or [])[:3]],
+            ensure_ascii=False,
+        ),
+        "slot_signals": json.dumps(payload.get("slot_signals", []), ensure_ascii=False),
+        "improvements": json.dumps(llm_result.get("improvements", []), ensure_ascii=False),
+        "new_training_phrases": json.dumps(llm_result.get("new_training_phrases", {}), ensure_ascii=False),
+        "suggested_dialogflow": json.dumps(llm_result.get("suggested_dialogflow", {}), ensure_ascii=False),
+        "confidence": llm_result.get("confidence", 0),
+        "review_flag": llm_result.get("review_flag", False),
+        "decided_by": decided_by,
+    }
+    if generated_tokens is not None:
+        row["generated_tokens"] = generated_tokens
+    if "decision_probs" in llm_result:
+        row["decision_probs"] = llm_result["decision_probs"]
+    return row
+
+
+def _classified_verdict(payload: Dict[str, Any], probs: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Veredicto a partir de la distribución de classify_decision (judge_mode=classify, margen suficiente):
+    decisión más probable con su probabilidad como confidence; intent del top candidato del flow_ref si es
+    MISSED_EXISTING_INTENT_IN_FLOW. Sin improvements ni frases nuevas (eso lo da el judge completo).
+    """
+    decision = max(probs, key=probs.get)
+    flow_ref = payload.get("flow_ref", "")
+    candidates = payload.get("candidates") or []
+    in_flow = [c for c in candidates if c.get("flow") == flow_ref]
     return {
-        "case_id": case["case_id"],
-        "session_id": case["session_id"],
-        "fecha": case.get("fecha", ""),
-        "flow_ref": flow_ref,
-        "last_valid_intent": last_valid_intent,
-        "context_messages": context_messages,
-        "trigger_user_text": case["trigger_user_text"],
-        "trigger_user_text_norm": case["trigger_user_text_norm"],
-        "slot_signals": slot_signals,
-        "candidates": candidates,
-        "mensaje_no_match": case["trigger_user_text"],
-        "bot_no_match_text": bot_text,
+        "decision": decision,
+        "flow_recommended": "" if decision == "OUT_OF_SCOPE" else flow_ref,
+        "intent_recommended": [in_flow[0].get("intent", "")] if decision == "MISSED_EXISTING_INTENT_IN_FLOW" and in_flow else [],
+        "intents_relevantes": candidates[:3],
+        "why": f"Clasificación por logprobs: {decision} (p={probs[decision]:.2f}).",
+        "improvements": [],
+        "new_training_phrases": {},
+        "suggested_dialogflow": {"parameters": list(payload.get("slot_signals") or []), "contexts": []},
+        "confidence": probs[decision],
+        "decision_probs": probs,
     }
 
 
+def sample_judge_prompts(
+    path_chat_csv: str,
+    path_training_csv: str,
+    config: Optional[Dict[str, Any]] = None,
+    n: int = 8,
+) -> List[str]:
+    """
+    Prompts reales del judge para benchmarks (analyzer_cli.py tune): los primeros n casos únicos (dedup) que el
+    triage no decide, armados como en analizar_pipeline (contexto, retrieval, presupuesto de tokens), en este proceso.
+    Si no alcanzan, completa con casos que decide el triage.
+    """
+    config = config or {}
+    neutral = config.get("neutral_flows") or FLOWS_NEUTRALES
+    df_turns = cargar_chats_as_turns(path_chat_csv)
+    session_index = build_session_index(df_turns)
+    if set(neutral) != set(FLOWS_NEUTRALES):
+        attach_flow_ref(df_turns, set(neutral), session_index)
+    index = get_training_index(path_training_csv)
+    seen = set()
+    unique = []
+    for case in extract_no_match_cases(df_turns, session_index).to_dict("records"):
+        key = dedup_key(case)
+        if key not in seen:
+            seen.add(key)
+            unique.append(case)
+    payloads = process_cases(
+        unique[:4 * n], df_turns, index,
+        config.get("max_msg_context", MAX_MSG_CONTEXT), config.get("top_intents", TOP_INTENTS),
+        config.get("evidence_per_intent", EVIDENCE_PER_INTENT), neutral, session_index,
+    )
+    payloads = [p for p in payloads if triage_case(p) is None] + [p for p in payloads if triage_case(p) is not None]
+    budget = prompt_budget(config.get("n_ctx", 4096), config.get("max_tokens", 800), config.get("prompt_token_budget"))
+    count_tokens = make_token_counter(config.get("model_filename"))
+    return [build_judge_prompt_budgeted(p, budget, count_tokens)[0] for p in payloads[:n]]
+
+
 def analizar_pipeline(
     path_chat_csv: str,
     path_training_csv: str,
@@ -117,144 +453,406 @@ def analizar_pipeline(
     use_llm: bool = True,
 ) -> None:
     """
-    Pipeline nuevo: load turns -> training index -> cases -> (paralelo) process_one_case -> (secuencial) LLM judge -> post_validate -> write_reports.
+    Pipeline nuevo: load turns -> training index -> cases -> dedup -> (paralelo, hilo productor) process_cases + prompts
+    -> cola acotada -> (secuencial) LLM judge -> post_validate -> fila escrita (StreamingReportWriter) -> informe general.
     Si use_llm=False, no se llama al LLM (solo contexto + retriever + slots) y se rellenan decision/confidence por defecto.
+    triage (config, por defecto true con LLM): los casos que deciden las reglas (core/triage.py) no van al LLM;
+    triage_only: triage sin LLM (el resto queda con la decisión por defecto).
     """
     config = config or {}
-    if logger_callback:
-        logger_callback("Cargando chats como turnos...")
-    df_turns = cargar_chats_as_turns(path_chat_csv)
-    if logger_callback:
-        logger_callback("Cargando training y construyendo índice...")
-    df_training = load_training_ffill(path_training_csv)
-    index = build_training_index(df_training)
-    cases = extract_no_match_cases(df_turns)
-    if logger_callback:
-        logger_callback(f"Casos NO_MATCH encontrados: {len(cases)}")
-    if not cases:
-        if logger_callback:
-            logger_callback("No hay casos NO_MATCH. Escribiendo reporte vacío.")
-        write_reports([], path_out, write_jsonl=config.get("write_jsonl", True), write_debug=config.get("write_debug", False))
-        return
-
+    llm_cfg = None
+    if use_llm and not config.get("triage_only"):
+        # Perfil de analyzer_cli.py tune para este host + modelo (n_threads, n_batch, llm_workers)
+        config, llm_cfg = pipeline_judge_config(config, logger_callback)
+    cache_dir = resolve_cache_dir(config, path_out) if config.get("use_cache", True) else None
+    neutral = config.get("neutral_flows") or FLOWS_NEUTRALES
     max_workers = config.get("max_workers", MAX_WORKERS)
     max_msgs = config.get("max_msg_context", MAX_MSG_CONTEXT)
     top_int = config.get("top_intents", TOP_INTENTS)
     ev_per = config.get("evidence_per_intent", EVIDENCE_PER_INTENT)
-    neutral = config.get("neutral_flows") or FLOWS_NEUTRALES
+    stream = config.get("stream_ingest", False)
+    dedup = config.get("dedup_cases", True)
+    dedup_ctx = config.get("dedup_context", False)
+    triage_only = config.get("triage_only", False)
+    if triage_only:
+        use_llm = False
+    triage = config.get("triage", True) and (use_llm or triage_only)
+    judge_mode = config.get("judge_mode", "generate")
+    # GUI: modelo e índice residentes entre corridas (core/runtime_registry.py)
+    resident = config.get("resident_runtime", False)
+    classify_margin = float(config.get("classify_margin", 0.2))
+    # Por defecto escala solo el margen bajo; classify_full_decisions fuerza generación para las decisiones cuyas
+    # recomendaciones (intent, frases, parámetros) se quieran completas
+    classify_full = config.get("classify_full_decisions", []) or []
 
-    # Fase paralela 1 (procesos, sin GIL): preprocess por caso
-    worker_args = (df_turns, index, max_msgs, top_int, ev_per, neutral)
-    n_workers = max(1, min(len(cases), max_workers))
-    payloads = []
-    with ProcessPoolExecutor(
-        max_workers=n_workers,
-        initializer=_init_process_worker,
-        initargs=(worker_args,),
-    ) as executor:
-        for p in executor.map(_process_case_worker, cases):
-            payloads.append(p)
-
-    # Fase paralela 2 (procesos, sin GIL): armar todos los prompts
-    payloads_with_prompts = []
-    with ProcessPoolExecutor(max_workers=n_workers) as executor:
-        for item in executor.map(_build_prompt_worker, payloads):
-            payloads_with_prompts.append(item)
-
-    if use_llm and config.get("model_filename"):
+    df_turns = session_index = None
+    if not stream:
+        if logger_callback:
+            logger_callback("Cargando chats como turnos...")
+        df_turns = cargar_chats_as_turns(path_chat_csv, cache_dir=cache_dir, logger_callback=logger_callback)
+        session_index = build_session_index(df_turns)
+        if set(neutral) != set(FLOWS_NEUTRALES):
+            attach_flow_ref(df_turns, set(neutral), session_index)
+    if logger_callback:
+        logger_callback("Cargando training y construyendo índice...")
+    get_index = get_training_index
+    if resident:
+        from core.runtime_registry import get_index
+    index = get_index(
+        path_training_csv,
+        cache_dir=cache_dir,
+        rebuild=config.get("rebuild_index", False),
+        logger_callback=logger_callback,
+    )
+    if stream:
+        if logger_callback:
+            logger_callback("Leyendo chats en streaming (por chunks)...")
+        case_batches = stream_no_match_cases(
+            path_chat_csv, max_msgs, set(neutral), config.get("stream_chunk_rows", STREAM_CHUNK_ROWS)
+        )
+        n_workers = max(1, max_workers)
+        chunk = RETRIEVE_CHUNK
+    else:
+        cases = extract_no_match_cases(df_turns, session_index)
+        if logger_callback:
+            logger_callback(f"Casos NO_MATCH encontrados: {len(cases)}")
+        if cases.empty:
+            if logger_callback:
+                logger_callback("No hay casos NO_MATCH. Escribiendo reporte vacío.")
+            write_reports([], path_out, write_jsonl=config.get("write_jsonl", True), write_debug=config.get("write_debug", False))
+            return
+        case_batches = [cases.to_dict("records")]
+        n_workers = max(1, min(len(cases), max_workers))
+        chunk = max(1, min(RETRIEVE_CHUNK, -(-len(cases) // (n_workers * 4))))
+
+    def case_key(case: Dict[str, Any]):
+        """Clave de dedup (sin dedup: el case_id). Con dedup_context arma el contexto acá si no vino del streaming."""
+        if not dedup:
+            return case["case_id"]
+        if dedup_ctx and "context_messages" not in case:
+            trigger_ref = {"session_id": case["session_id"], "turn_index": case["trigger_turn_index"]}
+            case["context_messages"] = build_context_window(
+                trigger_ref, df_turns, case["flow_ref"], max_msgs, set(neutral), session_index
+            )
+        return dedup_key(case, dedup_ctx)
+
+    # Solo el primer caso de cada clave pasa a retrieval / prompt / judge; los repetidos llegan a la cola como "dup"
+    counts: Dict[Any, int] = {}
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, config.get("pipeline_queue_size", PIPELINE_QUEUE_SIZE)))
+    budget = prompt_budget(config.get("n_ctx", 4096), config.get("max_tokens", 800), config.get("prompt_token_budget"))
+    tokenizer_model = config.get("model_filename") if use_llm else None
+    # Índice por mmap desde la caché si está (cada worker lo abre); si no, viaja pickleado una vez por worker
+    index_source = cached_index_entry(cache_dir, path_training_csv) or index
+    worker_args = (index_source, max_msgs, top_int, ev_per, neutral, budget, tokenizer_model)
+    stop = threading.Event()
+
+    def produce() -> None:
+        """Fase paralela (procesos, sin GIL): contexto + retrieval en batch + prompt por tanda, hacia la cola del judge."""
         try:
-            from core.llm_runtime import LocalLLM, LLMConfig
-            llm_cfg = LLMConfig(
-                model_filename=config["model_filename"],
-                n_ctx=config.get("n_ctx", 4096),
-                n_threads=config.get("n_threads", 8),
-                n_batch=config.get("n_batch", 256),
-                temperature=config.get("temperature", 0.2),
-                max_tokens=config.get("max_tokens", 800),
+            unique_batches = dedup_case_batches(
+                case_batches, counts, case_key, lambda key, case: _put(q, ("dup", key, case), stop)
             )
-            llm = LocalLLM(llm_cfg)
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                initializer=_init_process_worker,
+                initargs=(worker_args,),
+            ) as executor:
+                tasks = (
+                    (chunk_cases, _session_turns(chunk_cases, df_turns, session_index, max_msgs))
+                    for chunk_cases in _session_chunks(unique_batches, chunk)
+                )
+                for batch in _map_bounded(executor, _process_cases_worker, tasks, n_workers * 2):
+                    for payload, prompt in batch:
+                        _put(q, ("case", payload, prompt), stop)
+        except _PipelineStopped:
+            return
+        except BaseException as e:
+            _put(q, ("error", e, None), stop)
+            return
+        _put(q, ("done", None, None), stop)
+
+    producer = threading.Thread(target=produce, name="analyzer-producer", daemon=True)
+    producer.start()
+
+    # La carga del modelo se superpone con la fase paralela
+    llm = None
+    cascade = None
+    verdict_cache = None
+    if use_llm and llm_cfg is not None:
+        try:
+            from core.llm_runtime import make_judge
+            if cache_dir and config.get("llm_cache", True):
+                verdict_cache = VerdictCache(
+                    os.path.join(cache_dir, LLM_CACHE_FILENAME),
+                    max_entries=config.get("llm_cache_max_entries", LLM_CACHE_MAX_ENTRIES),
+                )
+            n_llm_workers = judge_workers(config)
+
+            def load_judge(cfg):
+                """
+                LocalLLM / HttpJudge (make_judge), o JudgePool con llm_workers > 1 y backend local
+                (la caché de veredictos se separa por modelo). Con resident_runtime, el LocalLLM del registro.
+                """
+                if resident and cfg.backend == "local":
+                    from core.runtime_registry import get_judge, release_judge
+                    if n_llm_workers == 1:
+                        return get_judge(cfg, cache=verdict_cache, logger_callback=logger_callback)
+                    # Con JudgePool el LocalLLM residente de este modelo sería una copia de más
+                    release_judge(cfg.model_filename)
+                if n_llm_workers == 1 or cfg.backend != "local":
+                    judge = make_judge(cfg, cache=verdict_cache)
+                    if logger_callback and cfg.backend == "http":
+                        logger_callback(f"Judge vía HTTP en {cfg.server_url} ({cfg.concurrency} requests en vuelo).")
+                    return judge
+                from core.judge_pool import JudgePool
+                from core.llm_runtime import judge_cache_scope, resolve_model_path
+                scope = (
+                    judge_cache_scope(cfg, str(resolve_model_path(cfg.model_filename)))
+                    if verdict_cache is not None else None
+                )
+                judge = JudgePool(cfg, n_llm_workers, cache=verdict_cache, cache_scope=scope)
+                if logger_callback:
+                    logger_callback(
+                        f"Judge {cfg.model_filename} en {n_llm_workers} procesos "
+                        f"({judge.worker_cfg.n_threads} hilos por proceso)."
+                    )
+                return judge
+
+            if config.get("cascade_model_path"):
+                # Cascada: cada nivel se carga al primer caso que lo necesita y queda residente
+                from dataclasses import replace
+                from core.judge_cascade import JudgeCascade, CASCADE_MIN_CONFIDENCE
+                cascade = JudgeCascade(
+                    llm_cfg,
+                    replace(llm_cfg, model_filename=config["cascade_model_path"]),
+                    load_judge,
+                    min_confidence=float(config.get("cascade_min_confidence", CASCADE_MIN_CONFIDENCE)),
+                )
+                llm = cascade
+                if logger_callback:
+                    logger_callback(
+                        f"Judge en cascada: {llm_cfg.model_filename} -> {config['cascade_model_path']} "
+                        f"(confidence < {cascade.min_confidence} o review_flag)."
+                    )
+            else:
+                llm = load_judge(llm_cfg)
         except Exception as e:
+            if verdict_cache is not None:
+                verdict_cache.close()
+                verdict_cache = None
             if logger_callback:
                 logger_callback(f"No se pudo cargar LLM: {e}. Continuando sin judge.")
-            use_llm = False
-
-    # Fase secuencial: enviar de a uno a la LLM (cada prompt ya armado)
-    rows = []
-    for i, (payload, prompt) in enumerate(payloads_with_prompts):
-        if logger_callback and (i + 1) % 10 == 0:
-            logger_callback(f"Procesando case {i + 1}/{len(payloads_with_prompts)} (LLM)...")
-        if use_llm and config.get("model_filename"):
-            try:
-                llm_result = llm.chat_json(prompt)
-                if "confidence" not in llm_result:
-                    llm_result["confidence"] = 0.5
-                llm_result = post_validate(
-                    llm_result,
-                    payload.get("candidates", []),
-                    payload.get("flow_ref", ""),
-                    payload.get("slot_signals", []),
-                    payload.get("trigger_user_text", ""),
-                )
-            except Exception as e:
-                llm_result = {
-                    "decision": "AMBIGUOUS",
-                    "flow_recommended": payload.get("flow_ref", ""),
-                    "intent_recommended": [],
-                    "intents_relevantes": payload.get("candidates", []),
-                    "why": str(e),
-                    "improvements": [],
-                    "new_training_phrases": {},
-                    "suggested_dialogflow": {"parameters": [], "contexts": []},
-                    "confidence": 0.0,
-                    "review_flag": True,
-                }
-        else:
-            top_candidate = (payload.get("candidates") or [{}])[0]
-            llm_result = {
-                "decision": "AMBIGUOUS",
-                "flow_recommended": payload.get("flow_ref", ""),
-                "intent_recommended": [top_candidate.get("intent", "")] if top_candidate else [],
-                "intents_relevantes": payload.get("candidates", []),
-                "why": "Sin LLM (use_llm=False o model_filename no configurado)",
-                "improvements": [],
-                "new_training_phrases": {},
-                "suggested_dialogflow": {"parameters": [], "contexts": []},
-                "confidence": 0.5,
-                "review_flag": True,
-            }
-        row = {
-            "fecha": payload.get("fecha", ""),
-            "session_id": payload.get("session_id", ""),
-            "case_id": payload.get("case_id", ""),
-            "mensaje_no_match": payload.get("mensaje_no_match", ""),
-            "bot_no_match_text": payload.get("bot_no_match_text", ""),
-            "flow_ref": payload.get("flow_ref", ""),
-            "last_valid_intent": payload.get("last_valid_intent", ""),
-            "decision": llm_result.get("decision", ""),
-            "flow_recommended": llm_result.get("flow_recommended", ""),
-            "intent_top": (llm_result.get("intent_recommended") or [""])[0] if llm_result.get("intent_recommended") else "",
-            "intents_relevantes": json.dumps(llm_result.get("intents_relevantes", []), ensure_ascii=False),
-            "top_evidence": json.dumps(
-                [(e.get("phrase"), e.get("sim")) for c in (payload.get("candidates") or [])[:1] for e in (c.get("evidence") or [])[:3]],
-                ensure_ascii=False,
-            ),
-            "slot_signals": json.dumps(payload.get("slot_signals", []), ensure_ascii=False),
-            "improvements": json.dumps(llm_result.get("improvements", []), ensure_ascii=False),
-            "new_training_phrases": json.dumps(llm_result.get("new_training_phrases", {}), ensure_ascii=False),
-            "suggested_dialogflow": json.dumps(llm_result.get("suggested_dialogflow", {}), ensure_ascii=False),
-            "confidence": llm_result.get("confidence", 0),
-            "review_flag": llm_result.get("review_flag", False),
+
+    if llm is not None and judge_mode == "classify" and not getattr(llm, "supports_classify", False):
+        # Sin logits (p. ej. llm_backend http) no hay clasificación: un aviso y judge generativo para todos los casos
+        if logger_callback:
+            logger_callback(
+                f"judge_mode=classify no disponible con el backend {llm.cfg.backend} (sin logprobs): "
+                "se usa el judge generativo."
+            )
+        judge_mode = "generate"
+
+    judge_id = None
+    if llm is not None:
+        judge_id = {
+            "model": llm.cfg.model_filename,
+            "temperature": llm.cfg.temperature,
+            "top_p": llm.cfg.top_p,
+            "max_tokens": llm.cfg.max_tokens,
+            "seed": llm.cfg.seed,
+            "constrained_json": llm.cfg.constrained_json,
+            "early_stop": llm.cfg.early_stop,
         }
-        rows.append(row)
+        if llm.cfg.backend != "local":
+            judge_id.update({"backend": llm.cfg.backend, "server_url": llm.cfg.server_url})
+        if cascade is not None:
+            judge_id.update({"cascade_model": cascade.large_cfg.model_filename, "cascade_min_confidence": cascade.min_confidence})
+        if judge_mode == "classify":
+            judge_id.update({
+                "judge_mode": judge_mode,
+                "classify_margin": classify_margin,
+                "classify_full_decisions": sorted(classify_full),
+                "classify_temperature": llm.cfg.classify_temperature,
+            })
+    journal = None
+    if config.get("journal", True):
+        journal = JudgeJournal(journal_path(path_out), resume=config.get("resume", False))
+        if logger_callback and journal.entries:
+            logger_callback(f"Reanudando: {len(journal.entries)} casos en el journal.")
 
-    write_reports(
-        rows,
-        path_out,
-        write_jsonl=config.get("write_jsonl", True),
-        write_debug=config.get("write_debug", False),
-    )
-    if config.get("write_informe_general", True) and rows:
-        write_informe_general(rows, path_out, write_md=True)
+    # Consumidor: los payloads se juzgan en tandas de hasta llm_batch_size (con pool, al menos 2 casos por worker)
+    # con llm.chat_json_batch; sin LLM, de a uno. Cada fila se escribe al terminar, en orden de llegada y se suma
+    # al informe general; no se guardan las filas (solo la clave de cada una, para corregir la multiplicidad)
+    informe = InformeAccumulator()
+    row_keys: List[Any] = []
+    # Multiplicidad con la que se escribió la primera fila de cada clave (después solo puede crecer)
+    first_mult: Dict[Any, int] = {}
+    rep_rows: Dict[Any, Dict[str, Any]] = {}
+    waiting: Dict[Any, List[Dict[str, Any]]] = {}
+    pending: List[Tuple[Dict[str, Any], str, Any, Optional[str]]] = []
+    batch_window = 1
+    if llm is not None:
+        # En vuelo a la vez: procesos del pool o requests HTTP concurrentes
+        if llm.cfg.backend == "http":
+            n_procs = max(1, llm.cfg.concurrency)
+        else:
+            n_procs = judge_workers(config)
+        batch_window = max(1, llm.cfg.batch_size, 2 * n_procs if n_procs > 1 else 1)
+    n_judged = 0
+    n_triaged = 0
+    prompt_tokens: List[int] = []
+    n_trimmed = 0
+    try:
+        with StreamingReportWriter(
+            path_out, write_jsonl=config.get("write_jsonl", True), write_debug=config.get("write_debug", False)
+        ) as writer:
+            def emit(row: Dict[str, Any], key: Any) -> None:
+                writer.write_row(row)
+                # Cada clave cuenta una vez en los casos únicos del informe: en su primera fila
+                informe.add(row, 0.0 if key in first_mult else 1.0)
+                first_mult.setdefault(key, row["multiplicidad"])
+                row_keys.append(key)
+
+            def finish(item: Dict[str, Any], key: Any, fp: Optional[str], row: Dict[str, Any], judged: bool) -> None:
+                if judged and journal is not None:
+                    journal.append(item["case_id"], fp, row)
+                row["multiplicidad"] = counts[key]
+                rep_rows[key] = row
+                emit(row, key)
+                for case in waiting.pop(key, []):
+                    emit(fan_out_row(row, case, counts[key]), key)
+
+            def flush() -> None:
+                if not pending:
+                    return
+                prompts = [prompt for _, prompt, _, _ in pending]
+                out: List[Optional[Dict[str, Any]]] = [None] * len(pending)
+                full = list(range(len(pending)))
+                if judge_mode == "classify":
+                    # Un prefill por caso; solo los de margen bajo (o decisiones que piden recomendaciones)
+                    # pasan al judge generativo
+                    full = []
+                    for i, probs in enumerate(llm.classify_batch(prompts)):
+                        if isinstance(probs, Exception) or needs_full_judge(probs, classify_margin, classify_full):
+                            full.append(i)
+                        else:
+                            item = pending[i][0]
+                            out[i] = _verdict_row(item, _classified_verdict(item, probs), 0, DECIDED_BY_LOGPROBS)
+                    llm.stats["escalated"] += len(full)
+                if full:
+                    results = llm.chat_json_batch([prompts[i] for i in full])
+                    for i, llm_result, n_tokens in zip(full, results, llm.last_generated_tokens_batch):
+                        out[i] = _verdict_row(pending[i][0], llm_result, n_tokens)
+                if cascade is not None:
+                    # Cascada: lo que el modelo chico deja con confianza baja o review_flag lo re-juzga el grande;
+                    # si el grande falla, queda el veredicto del chico
+                    up = [i for i, row in enumerate(out) if needs_escalation(row, cascade.min_confidence)]
+                    if up:
+                        results = cascade.escalate_batch([prompts[i] for i in up])
+                        for i, llm_result, n_tokens in zip(up, results, cascade.last_generated_tokens_batch):
+                            if not isinstance(llm_result, Exception):
+                                out[i] = _verdict_row(pending[i][0], llm_result, n_tokens, DECIDED_BY_LLM_LARGE)
+                for (item, _, key, fp), row in zip(pending, out):
+                    finish(item, key, fp, row, True)
+                pending.clear()
+
+            while True:
+                if pending:
+                    try:
+                        kind, item, prompt = q.get_nowait()
+                    except queue.Empty:
+                        # Sin más payloads listos: juzgar lo acumulado en lugar de esperar
+                        flush()
+                        continue
+                else:
+                    kind, item, prompt = q.get()
+                if kind == "done":
+                    flush()
+                    break
+                if kind == "error":
+                    raise item
+                if kind == "dup":
+                    key, case = item, prompt
+                    if key in rep_rows:
+                        emit(fan_out_row(rep_rows[key], case, counts[key]), key)
+                    else:
+                        waiting.setdefault(key, []).append(case)
+                    continue
+                n_judged += 1
+                prompt_tokens.append(item.get("prompt_tokens", 0))
+                n_trimmed += bool(item.get("prompt_trimmed"))
+                if logger_callback and n_judged == 1:
+                    logger_callback("Primer caso listo para el judge.")
+                if logger_callback and n_judged % 10 == 0:
+                    logger_callback(f"Procesando case {n_judged} (LLM)...")
+                key = case_key(item)
+                verdict = triage_case(item) if triage else None
+                if verdict is not None:
+                    n_triaged += 1
+                    finish(item, key, None, _verdict_row(item, verdict, decided_by=DECIDED_BY_TRIAGE), False)
+                    continue
+                row = None
+                fp = None
+                if journal is not None:
+                    fp = input_fingerprint(prompt, judge_id)
+                    row = journal.lookup(item["case_id"], fp)
+                if row is not None:
+                    finish(item, key, fp, row, False)
+                elif llm is not None:
+                    pending.append((item, prompt, key, fp))
+                    if len(pending) >= batch_window:
+                        flush()
+                else:
+                    finish(item, key, fp, _judge_row(item, prompt, llm), True)
+    finally:
+        stop.set()
+        producer.join()
+        if journal is not None:
+            journal.close()
+        if llm is not None and hasattr(llm, "close"):
+            # JudgePool, JudgeCascade (sus niveles) o la sesión HTTP
+            llm.close()
+        if llm is not None and logger_callback:
+            logger_callback(format_judge_stats(llm.stats))
+            if cascade is not None:
+                logger_callback(format_cascade_stats(cascade.tier_stats))
+            if llm.stats.get("worker_restarts"):
+                logger_callback(f"Workers del judge reiniciados: {llm.stats['worker_restarts']}")
+        if verdict_cache is not None:
+            if logger_callback:
+                logger_callback(f"Caché de veredictos LLM: {verdict_cache.stats()}")
+            verdict_cache.close()
+
+    if logger_callback:
+        if stream:
+            logger_callback(f"Casos NO_MATCH encontrados: {len(row_keys)}")
+        if dedup and row_keys:
+            logger_callback(f"Casos únicos (dedup) juzgados: {n_judged} de {len(row_keys)}")
+        if triage and n_judged:
+            logger_callback(
+                f"Triage: {n_triaged} de {n_judged} casos únicos decididos por reglas "
+                f"({100.0 * n_triaged / n_judged:.1f}% sin LLM); "
+                + ("el resto queda sin LLM (--triage-only)." if triage_only else f"{n_judged - n_triaged} al LLM.")
+            )
+        if prompt_tokens:
+            logger_callback(_format_prompt_tokens(prompt_tokens, budget, n_trimmed))
+        if journal is not None and journal.n_resumed:
+            logger_callback(f"Tomados del journal (sin volver a juzgar): {journal.n_resumed}")
+    if not row_keys:
+        if logger_callback:
+            logger_callback("No hay casos NO_MATCH. Reporte vacío.")
+        return
+
+    # Streaming + dedup: una clave pudo sumar casos después de escribir sus primeras filas
+    if any(counts[key] != mult for key, mult in first_mult.items()):
+        update_multiplicidad(
+            path_out,
+            [counts[key] for key in row_keys],
+            write_jsonl=config.get("write_jsonl", True),
+            write_debug=config.get("write_debug", False),
+        )
+    if config.get("write_informe_general", True):
+        write_informe(informe.build(), path_out, write_md=True)
         if logger_callback:
             logger_callback("Informe general escrito en " + path_out)
     if logger_callback:
@@ -1,51 +1,86 @@
 """
 Extracción de casos NO_MATCH: cada fila donde tipo=bot e intent_detectado empieza con NO_MATCH.
+Una sola pasada vectorizada sobre df_turns; devuelve una tabla columnar de casos.
 """
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
-from core.preprocess import normalize_text
+from typing import Dict, Any, Optional
+from core.preprocess import normalize_texts
+from core.sessions import build_session_index, row_session_starts
 
+CASE_COLUMNS = [
+    "case_id", "session_id", "fecha", "no_match_turn_index", "bot_no_match_text",
+    "trigger_turn_index", "trigger_user_text", "trigger_user_text_norm",
+]
 
-def extract_no_match_cases(df_turns: pd.DataFrame) -> List[Dict[str, Any]]:
+
+def extract_no_match_cases(
+    df_turns: pd.DataFrame,
+    session_index: Optional[Dict[str, Any]] = None,
+) -> pd.DataFrame:
     """
     Filtra filas tipo=bot con intent_detectado empezando por NO_MATCH.
-    Por cada una construye un case con: case_id, no_match_bot_turn, trigger_user_turn,
-    trigger_user_text, trigger_user_text_norm, fecha, session_id.
+    Devuelve un DataFrame (una fila por case) con CASE_COLUMNS: case_id, session_id, fecha,
+    no_match_turn_index, bot_no_match_text, trigger_turn_index (-1 si no hay turno usuario previo),
+    trigger_user_text, trigger_user_text_norm.
+    Si df_turns trae flow_ref / last_valid_intent (attach_flow_ref), se copian los del trigger.
+    El trigger es el último turno usuario anterior en la sesión: forward-fill por sesión de la
+    posición del último turno usuario (df_turns ordenado por sesión, ver cargar_chats_as_turns).
     """
-    cases = []
-    df = df_turns.copy()
-    df["intent_str"] = df["intent_detectado"].astype(str)
-    no_match_mask = df["intent_str"].str.upper().str.startswith("NO_MATCH") & (df["tipo"] == "bot")
-    no_match_indices = df.index[no_match_mask].tolist()
-    for idx in no_match_indices:
-        row = df.loc[idx]
-        session_id = row["session_id"]
-        turn_index = row.get("turn_index", idx)
-        case_id = f"{session_id}:{turn_index}"
-        session_df = df[df["session_id"] == session_id].sort_index()
-        pos_in_session = session_df.index.get_loc(idx)
-        # trigger_user_turn = última fila usuario antes de esta
-        trigger_user_text = ""
-        trigger_user_text_norm = ""
-        trigger_row = None
-        trigger_turn_index = None
-        for i in range(pos_in_session - 1, -1, -1):
-            prev = session_df.iloc[i]
-            if str(prev.get("tipo", "")).lower() == "usuario":
-                trigger_user_text = str(prev.get("texto", ""))
-                trigger_user_text_norm = str(prev.get("texto_norm", "")) or normalize_text(trigger_user_text)
-                trigger_row = prev
-                trigger_turn_index = prev.get("turn_index", session_df.index[i])
-                break
-        no_match_bot_turn = row.to_dict()
-        cases.append({
-            "case_id": case_id,
-            "session_id": session_id,
-            "fecha": row.get("fecha", ""),
-            "no_match_bot_turn": no_match_bot_turn,
-            "trigger_user_turn": trigger_row,
-            "trigger_turn_index": trigger_turn_index,
-            "trigger_user_text": trigger_user_text,
-            "trigger_user_text_norm": trigger_user_text_norm,
-        })
+    n = len(df_turns)
+    if session_index is None:
+        session_index = build_session_index(df_turns)
+    intent_str = df_turns["intent_detectado"].astype(str)
+    no_match_mask = (intent_str.str.upper().str.startswith("NO_MATCH") & (df_turns["tipo"] == "bot")).to_numpy(dtype=bool)
+    nm_pos = np.flatnonzero(no_match_mask)
+    if not len(nm_pos):
+        return pd.DataFrame(columns=CASE_COLUMNS)
+
+    # Posición del último turno usuario hasta cada fila, acotada al inicio de su sesión
+    positions = np.arange(n)
+    is_user = (df_turns["tipo"].astype(str).str.lower() == "usuario").to_numpy(dtype=bool)
+    last_user = np.maximum.accumulate(np.where(is_user, positions, -1))
+    last_user[last_user < row_session_starts(session_index)] = -1
+    trigger_pos = last_user[nm_pos]
+    has_trigger = trigger_pos >= 0
+    tp = trigger_pos[has_trigger]
+
+    if "turn_index" in df_turns.columns:
+        turn_index = df_turns["turn_index"].to_numpy()
+    else:
+        turn_index = df_turns.index.to_numpy()
+    session_ids = df_turns["session_id"].to_numpy(dtype=object)
+    textos = df_turns["texto"].to_numpy(dtype=object)
+
+    trigger_turn_index = np.full(len(nm_pos), -1, dtype=np.int64)
+    trigger_turn_index[has_trigger] = turn_index[tp]
+    trigger_text = np.full(len(nm_pos), "", dtype=object)
+    trigger_text[has_trigger] = [str(t) for t in textos[tp]]
+    trigger_norm = np.full(len(nm_pos), "", dtype=object)
+    if "texto_norm" in df_turns.columns:
+        trigger_norm[has_trigger] = [str(t) for t in df_turns["texto_norm"].to_numpy(dtype=object)[tp]]
+    pending = np.flatnonzero(has_trigger & (trigger_norm == ""))
+    if len(pending):
+        trigger_norm[pending] = normalize_texts(trigger_text[pending])
+
+    nm_session = session_ids[nm_pos]
+    nm_turn = turn_index[nm_pos]
+    fecha = df_turns["fecha"].to_numpy(dtype=object)[nm_pos] if "fecha" in df_turns.columns else ""
+    cases = pd.DataFrame({
+        "case_id": [f"{s}:{t}" for s, t in zip(nm_session, nm_turn)],
+        "session_id": nm_session,
+        "fecha": fecha,
+        "no_match_turn_index": nm_turn,
+        "bot_no_match_text": textos[nm_pos],
+        "trigger_turn_index": trigger_turn_index,
+        "trigger_user_text": trigger_text,
+        "trigger_user_text_norm": trigger_norm,
+    }, columns=CASE_COLUMNS)
+    if "flow_ref" in df_turns.columns and "last_valid_intent" in df_turns.columns:
+        flow_ref = np.full(len(nm_pos), "UNKNOWN", dtype=object)
+        flow_ref[has_trigger] = df_turns["flow_ref"].to_numpy(dtype=object)[tp]
+        last_valid_intent = np.full(len(nm_pos), "", dtype=object)
+        last_valid_intent[has_trigger] = df_turns["last_valid_intent"].to_numpy(dtype=object)[tp]
+        cases["flow_ref"] = flow_ref
+        cases["last_valid_intent"] = last_valid_intent
     return cases
@@ -64,3 +64,14 @@ def get_model_filename_from_config(config: Dict[str, Any]) -> str:
     Devuelve cadena vacía si no hay modelo configurado.
     """
     return (config.get("model_path") or config.get("model_filename") or "").strip()
+
+
+def resolve_cache_dir(config: Dict[str, Any], path_out: str) -> str:
+    """
+    Carpeta de cachés persistentes (índice de training, etc.).
+    config cache_folder (relativa a base_path, como las demás rutas) o, si no está, <path_out>/cache.
+    """
+    folder = (config.get("cache_folder") or "").strip()
+    if folder:
+        return resolve_data_path(folder)
+    return os.path.join(path_out, "cache")
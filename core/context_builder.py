@@ -2,77 +2,164 @@
 Inferencia de flow_ref y construcción de ventana de contexto.
 Hacia atrás desde trigger_user_turn; regla de cambio de flow confirmado.
 """
+import numpy as np
 import pandas as pd
-from typing import Tuple, List, Dict, Any, Set
+from typing import Tuple, List, Dict, Any, Set, Optional
+
+from core.sessions import build_session_index, row_session_starts, session_slice
+
+
+def _column(session: pd.DataFrame, name: str) -> list:
+    """Valores de una columna como lista (\"\" si la columna no existe)."""
+    if name in session.columns:
+        return session[name].tolist()
+    return [""] * len(session)
+
+
+def _session_before(
+    trigger_user_turn: Dict[str, Any],
+    df_turns: pd.DataFrame,
+    session_index: Optional[Dict[str, Any]],
+    inclusive: bool,
+) -> pd.DataFrame:
+    """Turnos de la sesión del trigger con turn_index < (o <=) el del trigger."""
+    session_id = trigger_user_turn.get("session_id")
+    turn_index = trigger_user_turn.get("turn_index", -1)
+    if turn_index is None or pd.isna(turn_index):
+        turn_index = -1
+    session = session_slice(df_turns, session_id, session_index)
+    if inclusive:
+        return session[session["turn_index"] <= turn_index]
+    return session[session["turn_index"] < turn_index]
 
 
 def infer_flow_ref(
     trigger_user_turn: Dict[str, Any],
     df_turns: pd.DataFrame,
     neutral_flows: Set[str],
+    session_index: Optional[Dict[str, Any]] = None,
 ) -> Tuple[str, str]:
     """
     Busca hacia atrás desde trigger_user_turn el último intent válido.
     Devuelve (flow_ref, last_valid_intent_before_no_match).
     Regla: último turn con intent válido y flow no neutral; si no hay, último intent válido (aunque neutral); si no hay ninguno -> UNKNOWN.
+    session_index (core.sessions.build_session_index): si se pasa, la sesión se corta por offsets.
     """
-    session_id = trigger_user_turn.get("session_id")
-    turn_index = trigger_user_turn.get("turn_index", -1)
-    if turn_index is None:
-        turn_index = -1
-    session = df_turns[df_turns["session_id"] == session_id].sort_values("turn_index")
-    session = session[session["turn_index"] < turn_index]
+    session = _session_before(trigger_user_turn, df_turns, session_index, inclusive=False)
     if session.empty:
         return "UNKNOWN", ""
+    intents = _column(session, "intent_detectado")
+    flows = _column(session, "flow_from_intent")
     flow_ref = "UNKNOWN"
     last_valid_intent = ""
-    row_with_last_intent = None
-    for _, row in session.iloc[::-1].iterrows():
-        intent = str(row.get("intent_detectado", "") or "").strip()
-        flow = str(row.get("flow_from_intent", "") or "").strip()
+    flow_of_last_intent = None
+    for i in range(len(session) - 1, -1, -1):
+        intent = str(intents[i] or "").strip()
+        flow = str(flows[i] or "").strip()
         if not intent or flow.upper() == "NO_MATCH":
             continue
         last_valid_intent = intent
-        row_with_last_intent = row
+        flow_of_last_intent = flows[i]
         if flow and flow not in neutral_flows:
             flow_ref = flow
             break
         if flow_ref == "UNKNOWN":
             flow_ref = flow or "UNKNOWN"
-    if flow_ref == "UNKNOWN" and last_valid_intent and row_with_last_intent is not None:
-        flow_ref = (row_with_last_intent.get("flow_from_intent") or "").strip() or "UNKNOWN"
+    if flow_ref == "UNKNOWN" and last_valid_intent and flow_of_last_intent is not None:
+        flow_ref = str(flow_of_last_intent or "").strip() or "UNKNOWN"
     return flow_ref, last_valid_intent
 
 
+def _last_before(mask: np.ndarray, row_starts: np.ndarray) -> np.ndarray:
+    """Por fila: posición de la última fila anterior (estrictamente) de la misma sesión con mask; -1 si no hay."""
+    positions = np.where(mask, np.arange(len(mask)), -1)
+    last = np.maximum.accumulate(positions) if len(positions) else positions
+    prev = np.r_[-1, last[:-1]] if len(last) else last
+    prev[prev < row_starts] = -1
+    return prev
+
+
+def attach_flow_ref(
+    df_turns: pd.DataFrame,
+    neutral_flows: Set[str],
+    session_index: Optional[Dict[str, Any]] = None,
+) -> pd.DataFrame:
+    """
+    Agrega columnas flow_ref y last_valid_intent a cada turno: el resultado de infer_flow_ref
+    con ese turno como trigger (mira solo turnos anteriores de la sesión).
+    Vectorizado: forward-fill por sesión de la posición del último intent válido / no neutral.
+    df_turns debe venir ordenado por sesión (cargar_chats_as_turns). Modifica y devuelve df_turns.
+    """
+    if session_index is None:
+        session_index = build_session_index(df_turns)
+    intents = df_turns["intent_detectado"].fillna("").astype(str).str.strip()
+    flows = df_turns["flow_from_intent"].fillna("").astype(str).str.strip()
+    intent_arr = intents.to_numpy(dtype=object)
+    flow_arr = flows.to_numpy(dtype=object)
+    valid = ((intents != "") & (flows.str.upper() != "NO_MATCH")).to_numpy(dtype=bool)
+    has_flow = (flows != "").to_numpy(dtype=bool)
+    non_neutral = valid & has_flow & ~flows.isin(set(neutral_flows)).to_numpy(dtype=bool)
+    # Sin flow no neutral, flow_ref es el del último válido con flow distinto de UNKNOWN;
+    # si no hay, el del primer válido de la sesión (fallback de infer_flow_ref)
+    named = valid & has_flow & (flows != "UNKNOWN").to_numpy(dtype=bool)
+
+    row_starts = row_session_starts(session_index)
+    last_non_neutral = _last_before(non_neutral, row_starts)
+    last_named = _last_before(named, row_starts)
+    last_valid = _last_before(valid, row_starts)
+    # Primer válido desde el inicio de la sesión (solo se usa si hay un válido antes de la fila)
+    valid_pos = np.flatnonzero(valid)
+    first_valid = np.full(len(df_turns), -1, dtype=np.int64)
+    if len(valid_pos):
+        k = np.searchsorted(valid_pos, row_starts)
+        in_range = k < len(valid_pos)
+        first_valid[in_range] = valid_pos[k[in_range]]
+
+    flow_ref = np.full(len(df_turns), "UNKNOWN", dtype=object)
+    last_valid_intent = np.full(len(df_turns), "", dtype=object)
+    m = last_non_neutral >= 0
+    flow_ref[m] = flow_arr[last_non_neutral[m]]
+    last_valid_intent[m] = intent_arr[last_non_neutral[m]]
+    m_fallback = ~m & (last_valid >= 0)
+    m_named = m_fallback & (last_named >= 0)
+    flow_ref[m_named] = flow_arr[last_named[m_named]]
+    m_first = m_fallback & (last_named < 0)
+    flow_ref[m_first] = [f or "UNKNOWN" for f in flow_arr[first_valid[m_first]]]
+    last_valid_intent[m_fallback] = intent_arr[first_valid[m_fallback]]
+    df_turns["flow_ref"] = flow_ref
+    df_turns["last_valid_intent"] = last_valid_intent
+    return df_turns
+
+
 def build_context_window(
     trigger_user_turn: Dict[str, Any],
     df_turns: pd.DataFrame,
     flow_ref: str,
     max_msgs: int,
     neutral_flows: Set[str],
+    session_index: Optional[Dict[str, Any]] = None,
 ) -> List[Dict[str, Any]]:
     """
     Ventana hacia atrás desde trigger_user_turn. Máximo max_msgs turnos.
     Corta si "cambio de flow confirmado": 2 intents seguidos con flow != flow_ref y no neutral,
     o 2 de los últimos 3 con flow != flow_ref y no neutral. Neutrales no cuentan como cambio.
+    session_index (core.sessions.build_session_index): si se pasa, la sesión se corta por offsets.
     """
-    session_id = trigger_user_turn.get("session_id")
-    turn_index = trigger_user_turn.get("turn_index", -1)
-    if turn_index is None:
-        turn_index = -1
-    session = df_turns[df_turns["session_id"] == session_id].sort_values("turn_index")
-    session = session[session["turn_index"] <= turn_index]
+    session = _session_before(trigger_user_turn, df_turns, session_index, inclusive=True)
     if session.empty:
         return []
-    rows = list(session.iloc[::-1].iterrows())
+    tipos = _column(session, "tipo")
+    textos = _column(session, "texto")
+    intents = _column(session, "intent_detectado")
+    flows = _column(session, "flow_from_intent")
     context = []
     non_neutral_outliers = 0
     last_three_flows = []
-    for i, (_, row) in enumerate(rows):
+    for i, pos in enumerate(range(len(session) - 1, -1, -1)):
         if i >= max_msgs:
             break
-        flow = str(row.get("flow_from_intent", "") or "").strip()
-        intent = str(row.get("intent_detectado", "") or "").strip()
+        flow = str(flows[pos] or "").strip()
+        intent = str(intents[pos] or "").strip()
         if flow.upper() == "NO_MATCH":
             continue
         is_neutral = flow in neutral_flows
@@ -86,8 +173,8 @@ def build_context_window(
         if non_neutral_outliers >= 2 or (len(last_three_flows) >= 2 and sum(last_three_flows) >= 2):
             break
         context.append({
-            "tipo": row.get("tipo", ""),
-            "texto": row.get("texto", ""),
+            "tipo": tipos[pos],
+            "texto": textos[pos],
             "intent": intent,
         })
     context.reverse()
@@ -0,0 +1,74 @@
+"""
+Deduplicación de casos NO_MATCH antes de retrieval y judge.
+El mismo mensaje ("hola", "cuánto me pueden dar?") aparece miles de veces: retrieval, prompt y LLM
+dependen solo de trigger_user_text_norm + flow_ref (y del contexto, si se pide incluirlo en la clave),
+así que se procesa un representante por clave y el resultado se replica a cada case_id (fan_out_row).
+"""
+import hashlib
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def context_hash(context_messages: List[Dict[str, Any]]) -> str:
+    """Hash estable de la ventana de contexto (tipo + texto de cada mensaje)."""
+    data = json.dumps(
+        [(m.get("tipo", ""), m.get("texto", "")) for m in context_messages or []],
+        ensure_ascii=False,
+    )
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def dedup_key(case: Dict[str, Any], with_context: bool = False) -> Tuple:
+    """Clave de deduplicación: (trigger_user_text_norm, flow_ref[, hash del contexto])."""
+    key = (case.get("trigger_user_text_norm") or "", case.get("flow_ref") or "")
+    if with_context:
+        key += (context_hash(case.get("context_messages")),)
+    return key
+
+
+def dedup_case_batches(
+    case_batches: Iterable[List[Dict[str, Any]]],
+    counts: Dict[Any, int],
+    key_fn: Callable[[Dict[str, Any]], Any],
+    on_duplicate: Optional[Callable[[Any, Dict[str, Any]], None]] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Filtra las tandas de casos dejando solo el primero de cada clave (el representante).
+    Va llenando counts (clave -> multiplicidad) y llama on_duplicate(clave, caso) por cada repetido.
+    Los repetidos no guardan context_messages (no se usan y en streaming ocupan memoria).
+    """
+    for batch in case_batches:
+        unique = []
+        for case in batch:
+            key = key_fn(case)
+            if key in counts:
+                counts[key] += 1
+                case.pop("context_messages", None)
+                if on_duplicate:
+                    on_duplicate(key, case)
+            else:
+                counts[key] = 1
+                unique.append(case)
+        if unique:
+            yield unique
+
+
+def fan_out_row(rep_row: Dict[str, Any], case: Dict[str, Any], multiplicidad: int) -> Dict[str, Any]:
+    """
+    Fila de un caso repetido: el resultado del representante con los campos propios del caso
+    (fecha, session_id, case_id, mensaje, bot_no_match_text, last_valid_intent) y la multiplicidad de la clave.
+    """
+    row = dict(rep_row)
+    row.update({
+        "fecha": case.get("fecha", ""),
+        "session_id": case.get("session_id", ""),
+        "case_id": case.get("case_id", ""),
+        "mensaje_no_match": case.get("trigger_user_text", ""),
+        "bot_no_match_text": case.get("bot_no_match_text", ""),
+        "last_valid_intent": case.get("last_valid_intent", rep_row.get("last_valid_intent", "")),
+        "multiplicidad": multiplicidad,
+    })
+    if "generated_tokens" in row:
+        # El costo del judge se cuenta una vez, en la fila del representante
+        row["generated_tokens"] = 0
+    return row
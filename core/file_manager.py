@@ -1,4 +1,5 @@
 import os
+import hashlib
 import pandas as pd
 
 def guardar_csv(df: pd.DataFrame, path_csv: str):
@@ -6,3 +7,12 @@ def guardar_csv(df: pd.DataFrame, path_csv: str):
     if d:
         os.makedirs(d, exist_ok=True)
     df.to_csv(path_csv, index=False, encoding="utf-8")
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hash SHA-256 del contenido del archivo (lectura por bloques)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
@@ -0,0 +1,145 @@
+"""
+Caché en disco del índice de training (TF-IDF).
+Clave: hash del contenido del CSV de training + parámetros del vectorizer + versión del formato.
+Se guarda vocabulary, IDF, matriz CSR (data/indices/indptr en .npy, abribles con mmap), offsets por
+intent y tabla de frases; en un hit se reconstruye el índice sin releer ni refitear.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from core.file_manager import file_sha256
+from core.retriever import VECTORIZER_PARAMS, assemble_index, build_training_index
+from core.training import load_training_ffill
+
+INDEX_CACHE_VERSION = 1
+_MATRIX_PARTS = ("data", "indices", "indptr")
+
+
+def training_cache_key(path_training_csv: str) -> str:
+    """Clave de caché: sha256(contenido del CSV) + VECTORIZER_PARAMS + INDEX_CACHE_VERSION."""
+    h = hashlib.sha256()
+    h.update(file_sha256(path_training_csv).encode("ascii"))
+    h.update(json.dumps(VECTORIZER_PARAMS, sort_keys=True).encode("utf-8"))
+    h.update(str(INDEX_CACHE_VERSION).encode("ascii"))
+    return h.hexdigest()[:32]
+
+
+def _entry_dir(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, "training_index", key)
+
+
+def cached_index_entry(cache_dir: Optional[str], path_training_csv: str) -> Optional[Tuple[str, str]]:
+    """(cache_dir, key) si la caché tiene el índice de este CSV (los workers lo abren con mmap); si no, None."""
+    if not cache_dir:
+        return None
+    key = training_cache_key(path_training_csv)
+    if not os.path.isfile(os.path.join(_entry_dir(cache_dir, key), "meta.json")):
+        return None
+    return cache_dir, key
+
+
+def save_training_index(index: Dict[str, Any], cache_dir: str, key: str) -> str:
+    """Escribe el índice en <cache_dir>/training_index/<key>/ (escritura atómica: carpeta temporal + rename)."""
+    final_dir = _entry_dir(cache_dir, key)
+    parent = os.path.dirname(final_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=key + ".", dir=parent)
+    try:
+        vectorizer = index["vectorizer"]
+        matrix = index["matrix"].tocsr()
+        with open(os.path.join(tmp_dir, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump({term: int(i) for term, i in vectorizer.vocabulary_.items()}, f, ensure_ascii=False)
+        np.save(os.path.join(tmp_dir, "idf.npy"), np.asarray(vectorizer.idf_))
+        for part in _MATRIX_PARTS:
+            np.save(os.path.join(tmp_dir, f"matrix_{part}.npy"), getattr(matrix, part))
+        np.save(os.path.join(tmp_dir, "intent_starts.npy"), index["intent_starts"])
+        np.save(os.path.join(tmp_dir, "intent_ends.npy"), index["intent_ends"])
+        with open(os.path.join(tmp_dir, "phrases.json"), "w", encoding="utf-8") as f:
+            json.dump(index["df"].to_dict(orient="split", index=False), f, ensure_ascii=False)
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": INDEX_CACHE_VERSION,
+                "shape": list(matrix.shape),
+                "vectorizer_params": VECTORIZER_PARAMS,
+            }, f)
+        if os.path.isdir(final_dir):
+            shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return final_dir
+
+
+def load_training_index(cache_dir: str, key: str, mmap: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Carga el índice cacheado; None si no existe o está incompleto / de otra versión.
+    Con mmap=True la matriz CSR se abre memory-mapped (sin copiarla a memoria).
+    """
+    entry = _entry_dir(cache_dir, key)
+    meta_path = os.path.join(entry, "meta.json")
+    if not os.path.isfile(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_CACHE_VERSION:
+            return None
+        mode = "r" if mmap else None
+        data, indices, indptr = (
+            np.load(os.path.join(entry, f"matrix_{part}.npy"), mmap_mode=mode) for part in _MATRIX_PARTS
+        )
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=tuple(meta["shape"]), copy=False)
+        with open(os.path.join(entry, "vocabulary.json"), "r", encoding="utf-8") as f:
+            vocabulary = json.load(f)
+        vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+        vectorizer.vocabulary_ = vocabulary
+        vectorizer.idf_ = np.load(os.path.join(entry, "idf.npy"))
+        with open(os.path.join(entry, "phrases.json"), "r", encoding="utf-8") as f:
+            table = json.load(f)
+        df = pd.DataFrame(table["data"], columns=table["columns"])
+        index = assemble_index(vectorizer, matrix, df)
+        if not np.array_equal(index["intent_starts"], np.load(os.path.join(entry, "intent_starts.npy"))):
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return index
+
+
+def get_training_index(
+    path_training_csv: str,
+    cache_dir: Optional[str] = None,
+    rebuild: bool = False,
+    logger_callback=None,
+) -> Dict[str, Any]:
+    """
+    Índice de training desde la caché si el CSV no cambió; si no, load_training_ffill + build_training_index
+    y se guarda. Sin cache_dir no usa caché. rebuild=True ignora la entrada existente y la reescribe.
+    """
+    if not cache_dir:
+        return build_training_index(load_training_ffill(path_training_csv))
+    key = training_cache_key(path_training_csv)
+    if not rebuild:
+        index = load_training_index(cache_dir, key)
+        if index is not None:
+            if logger_callback:
+                logger_callback("Índice de training cargado desde caché.")
+            return index
+    index = build_training_index(load_training_ffill(path_training_csv))
+    try:
+        save_training_index(index, cache_dir, key)
+        if logger_callback:
+            logger_callback("Índice de training construido y guardado en caché.")
+    except OSError as e:
+        if logger_callback:
+            logger_callback(f"No se pudo guardar la caché del índice: {e}")
+    return index
@@ -0,0 +1,96 @@
+"""
+Journal del judge: cada fila juzgada se agrega a <salida>/journal.jsonl con fsync, clave case_id + huella
+del input (prompt + identidad del judge). Si el proceso muere, --resume relee el journal, saltea los casos
+ya juzgados con la misma huella y reconstruye CSV / JSONL / informe con esas filas más las nuevas.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+JOURNAL_VERSION = 1
+JOURNAL_FILENAME = "journal.jsonl"
+
+
+def journal_path(path_out_dir: str) -> str:
+    return os.path.join(path_out_dir, JOURNAL_FILENAME)
+
+
+def input_fingerprint(prompt: str, judge: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Huella del input de un caso: prompt armado + identidad del judge (modelo y parámetros de muestreo;
+    None = sin LLM). Si cambia el training, el contexto o el modelo, el caso se vuelve a juzgar.
+    """
+    data = json.dumps({"v": JOURNAL_VERSION, "prompt": prompt, "judge": judge}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def load_journal(path: str) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """
+    case_id -> (huella, fila) de un journal existente (vacío si no hay archivo).
+    Líneas inválidas (típicamente la última, cortada por un crash) se ignoran; si un case_id se repite, gana la última.
+    """
+    entries: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    if not os.path.isfile(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+                entries[e["case_id"]] = (e["fingerprint"], e["row"])
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+    return entries
+
+
+class JudgeJournal:
+    """
+    Journal append-only con fsync por fila. resume=False empieza de cero (trunca);
+    resume=True carga lo existente para lookup y sigue agregando al final.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.entries = load_journal(path) if resume else {}
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        if resume and self.entries:
+            self._compact()
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        self.n_resumed = 0
+
+    def _compact(self) -> None:
+        """Reescribe el journal solo con las entradas válidas (saca la línea cortada del crash)."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for case_id, (fp, row) in self.entries.items():
+                f.write(json.dumps({"case_id": case_id, "fingerprint": fp, "row": row}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def lookup(self, case_id: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Fila ya juzgada para case_id con la misma huella (copia), o None."""
+        entry = self.entries.get(case_id)
+        if entry is None or entry[0] != fingerprint:
+            return None
+        self.n_resumed += 1
+        return dict(entry[1])
+
+    def append(self, case_id: str, fingerprint: str, row: Dict[str, Any]) -> None:
+        """Agrega la fila y la baja a disco (flush + fsync) antes de seguir."""
+        self._file.write(json.dumps({"case_id": case_id, "fingerprint": fingerprint, "row": row}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
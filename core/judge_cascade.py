@@ -0,0 +1,128 @@
+"""
+Cascada de dos modelos del judge (config cascade_model_path): el modelo chico (model_path) juzga todos los casos
+y solo escalan al grande los que, tras post_validate, quedan con confidence < cascade_min_confidence o review_flag.
+Cada nivel se carga al primer uso (LocalLLM o JudgePool, según llm_workers) y queda residente toda la corrida.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, List
+
+from core.llm_runtime import LLMConfig, new_judge_stats
+
+CASCADE_SMALL = "small"
+CASCADE_LARGE = "large"
+# Confianza mínima (post_validate) para quedarse con el veredicto del modelo chico
+CASCADE_MIN_CONFIDENCE = 0.7
+
+
+def needs_escalation(row: Dict[str, Any], min_confidence: float = CASCADE_MIN_CONFIDENCE) -> bool:
+    """True si la fila del modelo chico debe re-juzgarse con el grande (confianza baja o review_flag)."""
+    try:
+        confidence = float(row.get("confidence") or 0)
+    except (TypeError, ValueError):
+        confidence = 0.0
+    return bool(row.get("review_flag")) or confidence < min_confidence
+
+
+def format_cascade_stats(tier_stats: Dict[str, Dict[str, Any]]) -> str:
+    """Línea del log: casos, latencia media por caso y carga de cada nivel."""
+    parts = []
+    for name, s in tier_stats.items():
+        if s["error"]:
+            parts.append(f"{name} ({s['model']}): no cargó ({s['error']})")
+        elif not s["cases"]:
+            parts.append(f"{name} ({s['model']}): sin casos, sin cargar")
+        else:
+            parts.append(
+                f"{name} ({s['model']}): {s['cases']} casos, {s['ms'] / s['cases']:.0f} ms por caso, "
+                f"carga {s['load_ms'] / 1000:.1f} s"
+            )
+    return "Cascada del judge: " + "; ".join(parts)
+
+
+class JudgeCascade:
+    """
+    Misma interfaz que LocalLLM para el pipeline (cfg, stats agregadas, chat_json_batch, classify_batch,
+    last_generated_tokens_batch), delegada al modelo chico; escalate_batch juzga con el grande.
+    loader(cfg) construye un nivel; si falla, las posiciones de ese nivel devuelven la Exception
+    (y el pipeline se queda con lo que haya). tier_stats: casos, ms de juicio y ms de carga por nivel.
+    """
+
+    def __init__(
+        self,
+        small_cfg: LLMConfig,
+        large_cfg: LLMConfig,
+        loader: Callable[[LLMConfig], Any],
+        min_confidence: float = CASCADE_MIN_CONFIDENCE,
+    ):
+        self.cfg = small_cfg
+        self.large_cfg = large_cfg
+        self.loader = loader
+        self.min_confidence = min_confidence
+        self.stats = new_judge_stats()
+        self.stats["escalated_large"] = 0
+        self.last_generated_tokens_batch: List[int] = []
+        self._cfgs = {CASCADE_SMALL: small_cfg, CASCADE_LARGE: large_cfg}
+        self._judges: Dict[str, Any] = {}
+        self.tier_stats: Dict[str, Dict[str, Any]] = {
+            name: {"model": c.model_filename, "cases": 0, "ms": 0, "load_ms": 0, "error": None}
+            for name, c in self._cfgs.items()
+        }
+
+    @property
+    def supports_classify(self) -> bool:
+        """classify_batch va al modelo chico: logprobs solo con el backend local (sin cargarlo para preguntar)."""
+        return self.cfg.backend == "local"
+
+    def tier(self, name: str) -> Any:
+        """Judge del nivel (lo carga la primera vez). Si la carga falló, vuelve a levantar ese error."""
+        if name in self._judges:
+            return self._judges[name]
+        s = self.tier_stats[name]
+        if s["error"]:
+            raise RuntimeError(s["error"])
+        t0 = time.perf_counter()
+        try:
+            judge = self.loader(self._cfgs[name])
+        except Exception as e:
+            s["error"] = f"{type(e).__name__}: {e}"
+            raise
+        s["load_ms"] = int((time.perf_counter() - t0) * 1000)
+        self._judges[name] = judge
+        return judge
+
+    def _run(self, name: str, method: str, prompts: List[str]) -> List[Any]:
+        try:
+            judge = self.tier(name)
+        except Exception as e:
+            self.last_generated_tokens_batch = [0] * len(prompts)
+            return [e] * len(prompts)
+        before = dict(judge.stats)
+        t0 = time.perf_counter()
+        results = getattr(judge, method)(prompts)
+        # stats: contadores de new_judge_stats sumados sobre los dos niveles
+        for k, v in judge.stats.items():
+            self.stats[k] = self.stats.get(k, 0) + v - before.get(k, 0)
+        s = self.tier_stats[name]
+        s["cases"] += len(prompts)
+        s["ms"] += int((time.perf_counter() - t0) * 1000)
+        self.last_generated_tokens_batch = list(getattr(judge, "last_generated_tokens_batch", [0] * len(prompts)))
+        return results
+
+    def chat_json_batch(self, prompts: List[str]) -> List[Any]:
+        return self._run(CASCADE_SMALL, "chat_json_batch", prompts)
+
+    def classify_batch(self, prompts: List[str]) -> List[Any]:
+        return self._run(CASCADE_SMALL, "classify_batch", prompts)
+
+    def escalate_batch(self, prompts: List[str]) -> List[Any]:
+        """chat_json_batch con el modelo grande (los casos que needs_escalation marcó)."""
+        self.stats["escalated_large"] += len(prompts)
+        return self._run(CASCADE_LARGE, "chat_json_batch", prompts)
+
+    def close(self) -> None:
+        for judge in self._judges.values():
+            close = getattr(judge, "close", None)
+            if close is not None:
+                close()
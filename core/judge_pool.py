@@ -0,0 +1,249 @@
+"""
+Pool de procesos del judge (config llm_workers > 1).
+N procesos, cada uno con su LocalLLM: llama.cpp abre el .gguf con mmap, así las páginas del modelo se comparten
+entre procesos, y cada worker usa n_threads = núcleos / N. Un caso en vuelo por worker; si un worker muere,
+el watchdog lo reinicia y vuelve a encolar su caso (hasta POOL_MAX_CASE_RETRIES veces por caso).
+La caché de veredictos se consulta en el proceso principal, antes de repartir.
+"""
+from __future__ import annotations
+
+import multiprocessing as mp
+import multiprocessing.connection as mp_connection
+import os
+from collections import deque
+from dataclasses import replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.llm_cache import VerdictCache, verdict_key
+from core.llm_runtime import LLMConfig, classify_cache_scope, new_judge_stats
+
+# Espera máxima por resultado antes de revisar que los workers sigan vivos
+POOL_POLL_SECONDS = 0.5
+# Reintentos de un caso cuyo worker murió antes de marcarlo como error
+POOL_MAX_CASE_RETRIES = 2
+
+
+def pool_threads_per_worker(n_workers: int, total: Optional[int] = None) -> int:
+    """Hilos de llama.cpp por worker: núcleos totales / N (mínimo 1)."""
+    return max(1, (total or os.cpu_count() or 1) // max(1, n_workers))
+
+
+def local_llm_factory(cfg: LLMConfig):
+    """Factory por defecto (se ejecuta dentro del worker)."""
+    from core.llm_runtime import LocalLLM
+    return LocalLLM(cfg)
+
+
+def _pool_worker(wid: int, factory: Callable, cfg: LLMConfig, conn) -> None:
+    """
+    Loop del worker: carga el modelo, avisa "ready" y juzga (task_id, prompt) hasta recibir None.
+    Un Pipe propio por worker (send es sincrónico, sin locks compartidos): si el proceso muere a mitad de
+    un caso no deja trabado el canal de los demás.
+    """
+    try:
+        llm = factory(cfg)
+    except Exception as e:
+        conn.send(("load_error", None, None, f"{type(e).__name__}: {e}", 0, {}))
+        return
+    conn.send(("ready", None, None, None, 0, {}))
+    while True:
+        task = conn.recv()
+        if task is None:
+            return
+        task_id, prompt, method = task
+        before = dict(llm.stats)
+        result, error = None, None
+        try:
+            result = getattr(llm, method)(prompt)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        delta = {k: v - before.get(k, 0) for k, v in llm.stats.items()}
+        n_tokens = llm.last_generated_tokens if method == "chat_json" else 0
+        conn.send(("result", task_id, result, error, n_tokens, delta))
+
+
+class JudgePool:
+    """
+    Pool de N procesos con LocalLLM. map(prompts) devuelve, en orden, (resultado, tokens generados) por prompt;
+    el resultado es el dict del judge o una Exception (error del modelo, o el caso tiró abajo a su worker
+    más de max_case_retries veces). stats: contadores agregados (new_judge_stats) + worker_restarts.
+    """
+
+    # Los workers son LocalLLM: classify_batch por logprobs
+    supports_classify = True
+
+    def __init__(
+        self,
+        cfg: LLMConfig,
+        n_workers: int,
+        factory: Callable = local_llm_factory,
+        cache: Optional[VerdictCache] = None,
+        cache_scope: Optional[str] = None,
+        max_case_retries: int = POOL_MAX_CASE_RETRIES,
+    ):
+        self.cfg = cfg
+        self.n_workers = max(1, n_workers)
+        self.worker_cfg = replace(cfg, n_threads=pool_threads_per_worker(self.n_workers))
+        self.factory = factory
+        self.cache = cache
+        self.cache_scope = cache_scope
+        self.max_case_retries = max_case_retries
+        self.stats = new_judge_stats()
+        self.stats["worker_restarts"] = 0
+        self.last_generated_tokens_batch: List[int] = []
+        self._ctx = mp.get_context("spawn")
+        self._workers: Dict[int, Dict[str, Any]] = {}
+        self._pending: deque = deque()
+        self._done: Dict[int, Tuple[Any, int]] = {}
+        self._retries: Dict[int, int] = {}
+        self._next_id = 0
+        for wid in range(self.n_workers):
+            self._start(wid)
+        # Como LocalLLM: el constructor vuelve con los modelos cargados (o falla si ningún worker pudo)
+        while any(w["state"] == "loading" for w in self._workers.values()):
+            self._poll()
+        if not self._ready_workers():
+            errors = "; ".join(sorted({w["error"] for w in self._workers.values() if w["error"]}))
+            self.close()
+            raise RuntimeError(f"Ningún worker del judge pudo cargar el modelo: {errors}")
+
+    def _start(self, wid: int) -> None:
+        conn, child_conn = self._ctx.Pipe()
+        proc = self._ctx.Process(
+            target=_pool_worker,
+            args=(wid, self.factory, self.worker_cfg, child_conn),
+            name=f"judge-worker-{wid}",
+            daemon=True,
+        )
+        proc.start()
+        child_conn.close()
+        self._workers[wid] = {"proc": proc, "conn": conn, "task": None, "state": "loading", "error": None}
+
+    def _ready_workers(self) -> List[int]:
+        return [wid for wid, w in self._workers.items() if w["state"] == "ready"]
+
+    def _dispatch(self) -> None:
+        for wid in self._ready_workers():
+            w = self._workers[wid]
+            while w["task"] is None and self._pending:
+                task = self._pending.popleft()
+                if task[0] in self._done:
+                    continue
+                w["task"] = task
+                try:
+                    w["conn"].send(task)
+                except OSError:
+                    # Worker muerto: el watchdog lo reinicia y reencola el caso
+                    break
+
+    def _poll(self) -> None:
+        conns = {id(w["conn"]): wid for wid, w in self._workers.items() if w["state"] != "failed"}
+        ready = mp_connection.wait([self._workers[wid]["conn"] for wid in conns.values()], timeout=POOL_POLL_SECONDS)
+        for conn in ready:
+            wid = conns[id(conn)]
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                # Proceso muerto: lo atiende el watchdog
+                continue
+            self._handle(wid, msg)
+        self._watchdog()
+
+    def _handle(self, wid: int, msg: Tuple) -> None:
+        w = self._workers[wid]
+        kind, task_id, result, error, n_tokens, delta = msg
+        if kind == "ready":
+            w["state"] = "ready"
+        elif kind == "load_error":
+            w["state"], w["error"] = "failed", error
+        elif kind == "result":
+            task = w["task"]
+            w["task"] = None
+            for k, v in delta.items():
+                self.stats[k] = self.stats.get(k, 0) + v
+            if task_id in self._done:
+                return
+            if error is None and self.cache is not None:
+                self.cache.put(verdict_key(self._scope(task[2]), task[1]), result)
+            self._done[task_id] = (RuntimeError(error) if error is not None else result, n_tokens)
+
+    def _watchdog(self) -> None:
+        """Reinicia workers muertos (cargando o juzgando) y vuelve a encolar su caso al frente."""
+        for wid, w in list(self._workers.items()):
+            if w["state"] == "failed" or w["proc"].is_alive():
+                continue
+            w["conn"].close()
+            if w["state"] == "loading":
+                # Murió cargando el modelo: reiniciarlo volvería a fallar
+                if not w["error"]:
+                    w["error"] = f"exit code {w['proc'].exitcode} al cargar"
+                w["state"] = "failed"
+                continue
+            task = w["task"]
+            self.stats["worker_restarts"] += 1
+            if task is not None and task[0] not in self._done:
+                self._retries[task[0]] = self._retries.get(task[0], 0) + 1
+                if self._retries[task[0]] > self.max_case_retries:
+                    self._done[task[0]] = (
+                        RuntimeError(f"El worker del judge murió {self._retries[task[0]]} veces con este caso"), 0
+                    )
+                else:
+                    self._pending.appendleft(task)
+            self._start(wid)
+
+    def _scope(self, method: str) -> str:
+        return classify_cache_scope(self.cache_scope, self.cfg) if method == "classify_decision" else self.cache_scope
+
+    def map(self, prompts: List[str], method: str = "chat_json") -> List[Tuple[Any, int]]:
+        """
+        Juzga prompts en paralelo (un caso por worker) con el método de LocalLLM dado (chat_json o
+        classify_decision); devuelve (resultado o Exception, tokens) en orden.
+        """
+        ids = []
+        for prompt in prompts:
+            task_id = self._next_id
+            self._next_id += 1
+            ids.append(task_id)
+            cached = self.cache.get(verdict_key(self._scope(method), prompt)) if self.cache is not None else None
+            if cached is not None:
+                self._done[task_id] = (cached, 0)
+            else:
+                self._pending.append((task_id, prompt, method))
+        while any(i not in self._done for i in ids):
+            if not self._ready_workers() and not any(w["state"] == "loading" for w in self._workers.values()):
+                raise RuntimeError("No quedan workers del judge disponibles.")
+            self._dispatch()
+            self._poll()
+        return [self._done.pop(i) for i in ids]
+
+    def chat_json_batch(self, prompts: List[str]) -> List[Any]:
+        """Misma interfaz que LocalLLM.chat_json_batch: la tanda se reparte entre los workers."""
+        self.stats["batches"] += 1
+        pairs = self.map(prompts)
+        self.last_generated_tokens_batch = [n for _, n in pairs]
+        return [result for result, _ in pairs]
+
+    def classify_batch(self, prompts: List[str]) -> List[Any]:
+        """Misma interfaz que LocalLLM.classify_batch, repartida entre los workers."""
+        return [result for result, _ in self.map(prompts, method="classify_decision")]
+
+    def close(self) -> None:
+        for w in self._workers.values():
+            if w["proc"].is_alive():
+                try:
+                    w["conn"].send(None)
+                except OSError:
+                    pass
+        for w in self._workers.values():
+            w["proc"].join(timeout=5)
+            if w["proc"].is_alive():
+                w["proc"].terminate()
+                w["proc"].join()
+            w["conn"].close()
+        self._workers.clear()
+
+    def __enter__(self) -> "JudgePool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
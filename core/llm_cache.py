@@ -0,0 +1,108 @@
+"""
+Caché persistente de veredictos del judge (SQLite). Clave = hash de identidad del modelo (ruta, tamaño, mtime
+del .gguf) + parámetros de muestreo de LLMConfig + system prompt + prompt; valor = JSON ya parseado.
+Re-correr después de tocar solo post_validate o los reportes no gasta tokens. Tope de entradas con
+desalojo LRU (last_used = contador creciente de uso) y contadores de hits / misses para el log.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Optional
+
+LLM_CACHE_VERSION = 1
+LLM_CACHE_FILENAME = "llm_verdicts.sqlite"
+LLM_CACHE_MAX_ENTRIES = 50_000
+# Cada cuántos put se revisa el tope (COUNT(*) recorre la tabla)
+_PRUNE_EVERY = 256
+
+
+def model_identity(model_path: str) -> Dict[str, Any]:
+    """Identidad del archivo de modelo: ruta absoluta, tamaño y mtime (un .gguf reemplazado invalida la caché)."""
+    st = os.stat(model_path)
+    return {"path": os.path.abspath(str(model_path)), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def verdict_scope(model_id: Dict[str, Any], sampling: Dict[str, Any], system_prompt: str) -> str:
+    """Parte fija de la clave para una instancia de LLM (se calcula una vez)."""
+    data = json.dumps(
+        {"v": LLM_CACHE_VERSION, "model": model_id, "sampling": sampling, "system": system_prompt},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def verdict_key(scope: str, prompt: str) -> str:
+    return hashlib.sha256((scope + "\n" + prompt).encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """Tabla verdicts(key, value, last_used) en un archivo SQLite (WAL). get / put con contadores."""
+
+    def __init__(self, path: str, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """JSON guardado para key (objeto nuevo en cada llamada) o None; marca la entrada como usada."""
+        row = self._conn.execute("SELECT value FROM verdicts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute(
+            "UPDATE verdicts SET last_used = (SELECT MAX(last_used) FROM verdicts) + 1 WHERE key = ?", (key,)
+        )
+        self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO verdicts (key, value, last_used) "
+            "VALUES (?, ?, (SELECT COALESCE(MAX(last_used), 0) + 1 FROM verdicts))",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+        self._conn.commit()
+        self._puts += 1
+        if self._puts % _PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self) -> int:
+        """Borra las entradas menos usadas por encima de max_entries. Devuelve cuántas borró."""
+        (n,) = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()
+        extra = n - self.max_entries
+        if extra <= 0:
+            return 0
+        self._conn.execute(
+            "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY last_used ASC LIMIT ?)",
+            (extra,),
+        )
+        self._conn.commit()
+        return extra
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def stats(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self.prune()
+            self._conn.close()
+            self._conn = None
@@ -1,21 +1,55 @@
 """
 LLM Judge embebido (llama-cpp-python). Carga modelo GGUF, judge_case devuelve JSON estricto.
+Backends (LLMConfig.backend / config llm_backend): "local" = LocalLLM en proceso (por defecto); "http" = HttpJudge,
+cliente de un servidor local compatible con OpenAI (llama.cpp server) con requests concurrentes (asyncio).
 """
 from __future__ import annotations
 
+import abc
+import asyncio
+import codecs
+import copy
 import json
 import os
 import re
 import sys
+import threading
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.llm_cache import VerdictCache, model_identity, verdict_scope, verdict_key
+from core.prompt_budget import approx_token_count, pack_payload
 
 try:
     from llama_cpp import Llama
 except (ImportError, FileNotFoundError, OSError):
     Llama = None  # type: ignore
 
+try:
+    # API de bajo nivel (llama_batch / llama_decode) para decodificar varias secuencias juntas
+    import llama_cpp as llama_lib
+except (ImportError, FileNotFoundError, OSError):
+    llama_lib = None  # type: ignore
+
+try:
+    from llama_cpp import LlamaRAMCache
+except (ImportError, FileNotFoundError, OSError):
+    LlamaRAMCache = None  # type: ignore
+
+try:
+    from llama_cpp.llama_chat_format import Jinja2ChatFormatter
+except (ImportError, FileNotFoundError, OSError):
+    Jinja2ChatFormatter = None  # type: ignore
+
+try:
+    import requests
+except ImportError:
+    requests = None  # type: ignore
+
 # ---------------------------- Helpers: paths ----------------------------
 def _resource_path(relative: str) -> Path:
     if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
@@ -59,6 +93,50 @@ def safe_json_loads(text: str) -> Dict[str, Any]:
     return json.loads(extract_json_object(text))
 
 
+class JsonObjectScanner:
+    """
+    Escáner incremental de un objeto JSON de nivel superior: cuenta llaves fuera de strings (respeta comillas
+    y escapes). feed() devuelve True cuando el primer objeto quedó balanceado; text_so_far termina en su "}".
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escape = False
+        self.done = False
+
+    def feed(self, chunk: str) -> bool:
+        if self.done:
+            return True
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = self.started
+            elif ch == "{":
+                self.depth += 1
+                self.started = True
+            elif ch == "}" and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.parts.append(chunk[:i + 1])
+                    self.done = True
+                    return True
+        self.parts.append(chunk)
+        return False
+
+    @property
+    def text_so_far(self) -> str:
+        return "".join(self.parts)
+
+
 # ---------------------------- Prompt ----------------------------
 SYSTEM_JSON_ONLY = (
     "Sos un analista de NLU/Dialogflow. "
@@ -79,7 +157,42 @@ JSON_SCHEMA_HINT = {
 }
 
 
-def build_judge_prompt(payload: Dict[str, Any]) -> str:
+def schema_from_hint(hint: Any) -> Dict[str, Any]:
+    """
+    JSON schema a partir de JSON_SCHEMA_HINT: "A | B | C" -> enum, "string" -> string, número -> number,
+    lista -> array, dict vacío -> objeto libre, dict con claves -> objeto con todas las claves requeridas.
+    """
+    if isinstance(hint, str):
+        if "|" in hint:
+            return {"type": "string", "enum": [v.strip() for v in hint.split("|")]}
+        return {"type": "string"}
+    if isinstance(hint, bool):
+        return {"type": "boolean"}
+    if isinstance(hint, (int, float)):
+        return {"type": "number"}
+    if isinstance(hint, list):
+        return {"type": "array", "items": schema_from_hint(hint[0])} if hint else {"type": "array"}
+    if isinstance(hint, dict) and hint:
+        return {
+            "type": "object",
+            "properties": {k: schema_from_hint(v) for k, v in hint.items()},
+            "required": list(hint),
+        }
+    return {"type": "object"}
+
+
+# Schema para decodificación restringida (LLMConfig.constrained_json): la salida siempre parsea
+JUDGE_JSON_SCHEMA = schema_from_hint(JSON_SCHEMA_HINT)
+
+# Etiquetas que puntúa classify_decision (mismo enum que decision en el schema)
+DECISION_LABELS: List[str] = list(JUDGE_JSON_SCHEMA["properties"]["decision"]["enum"])
+# Inicio de la respuesta forzado en la clasificación: la etiqueta es la continuación
+_CLASSIFY_ANSWER_PREFIX = '{"decision": "'
+# Chat template por defecto (ChatML, el de Qwen) si el .gguf no trae tokenizer.chat_template
+_CHATML_TURN = "<|im_start|>{role}\n{content}<|im_end|>\n"
+
+
+def _judge_prompt_header() -> str:
     return (
         "Tarea: clasificar el NO_MATCH y recomendar acciones en Dialogflow.\n"
         "Reglas:\n"
@@ -92,10 +205,63 @@ def build_judge_prompt(payload: Dict[str, Any]) -> str:
         "Salida: JSON estricto con esta forma (ejemplo de schema, NO inventes campos):\n"
         f"{json.dumps(JSON_SCHEMA_HINT, ensure_ascii=False)}\n\n"
         "INPUT:\n"
-        f"{json.dumps(payload, ensure_ascii=False)}"
     )
 
 
+# Prefijo estático del prompt: system + reglas + schema son idénticos en todos los casos y van antes del
+# INPUT, así llama.cpp reutiliza su KV (prefix match / LlamaRAMCache) y solo evalúa el sufijo del caso
+JUDGE_PROMPT_PREFIX = _judge_prompt_header()
+
+
+def judge_messages(user_content: str) -> List[Dict[str, str]]:
+    """Mensajes de chat del judge: system fijo + user (JUDGE_PROMPT_PREFIX + INPUT del caso)."""
+    return [
+        {"role": "system", "content": SYSTEM_JSON_ONLY},
+        {"role": "user", "content": user_content},
+    ]
+
+
+def build_judge_prompt_budgeted(
+    payload: Dict[str, Any],
+    budget_tokens: Optional[int] = None,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> Tuple[str, int, bool]:
+    """
+    Prompt del judge con el INPUT empaquetado por prioridad (prompt_budget.pack_payload) para que
+    system + prompt no pasen budget_tokens (None = sin límite).
+    Devuelve (prompt, tokens de system + prompt, recortado).
+    """
+    count_tokens = count_tokens or approx_token_count
+    header = JUDGE_PROMPT_PREFIX
+    fixed = count_tokens(SYSTEM_JSON_ONLY) + count_tokens(header)
+    input_budget = None if budget_tokens is None else max(0, budget_tokens - fixed)
+    packed, trimmed = pack_payload(payload, input_budget, count_tokens)
+    body = json.dumps(packed, ensure_ascii=False)
+    return header + body, fixed + count_tokens(body), trimmed
+
+
+def build_judge_prompt(payload: Dict[str, Any]) -> str:
+    return build_judge_prompt_budgeted(payload)[0]
+
+
+def make_token_counter(model_filename: Optional[str] = None) -> Callable[[str], int]:
+    """
+    Contador de tokens con el tokenizer del modelo (llama.cpp con vocab_only: no carga pesos).
+    Sin llama-cpp o sin modelo: approx_token_count.
+    """
+    if Llama is None or not model_filename:
+        return approx_token_count
+    try:
+        vocab = Llama(model_path=str(resolve_model_path(model_filename)), vocab_only=True, verbose=False)
+    except Exception:
+        return approx_token_count
+    return lambda text: len(vocab.tokenize(text.encode("utf-8"), add_bos=False, special=True))
+
+
+# Celdas del contexto de tandas por defecto, en múltiplos de n_ctx (LLMConfig.batch_n_ctx = 0)
+BATCH_N_CTX_FACTOR = 2
+
+
 @dataclass
 class LLMConfig:
     model_filename: str
@@ -106,54 +272,252 @@ class LLMConfig:
     top_p: float = 0.9
     max_tokens: int = 800
     seed: int = 42
+    # Gramática derivada de JUDGE_JSON_SCHEMA (response_format de llama.cpp): JSON válido en una pasada
+    constrained_json: bool = False
+    # Streaming de tokens y corte apenas cierra el objeto JSON (JsonObjectScanner)
+    early_stop: bool = True
+    # KV del prefijo estático en una LlamaRAMCache (+ evaluación del prefijo al cargar); 0 MB = apagado (por
+    # defecto: llama-cpp-python ya reutiliza el prefijo de input_ids en el contexto vivo; medir con bench_llm_prefill)
+    prefix_cache_mb: int = 0
+    # Casos por tanda de chat_json_batch (el pipeline acumula hasta batch_size payloads antes de juzgar); en
+    # LocalLLM, secuencias decodificadas juntas en un contexto aparte (llama_batch con un seq_id por caso)
+    batch_size: int = 8
+    # Celdas de KV del contexto de tandas, compartidas por todas las secuencias (como -c de llama-server); 0 =
+    # BATCH_N_CTX_FACTOR * n_ctx. Un prompt entra a la tanda solo si su peor caso cabe: esto limita el paralelismo
+    batch_n_ctx: int = 0
+    # Temperatura de calibración del softmax sobre los logprobs de las etiquetas (classify_decision)
+    classify_temperature: float = 1.0
+    # "local" (LocalLLM, llama.cpp en proceso) o "http" (HttpJudge contra server_url)
+    backend: str = "local"
+    server_url: str = "http://127.0.0.1:8080"
+    # Requests HTTP en vuelo a la vez (chat_json_batch de HttpJudge)
+    concurrency: int = 4
+    request_timeout: float = 300.0
 
 
-class LocalLLM:
-    """Single-process LLM runtime using llama.cpp via llama-cpp-python."""
+def llm_config_from_pipeline(config: Dict[str, Any]) -> LLMConfig:
+    """LLMConfig a partir del config del pipeline (model_filename y claves n_ctx, llm_*, ... de config.json)."""
+    return LLMConfig(
+        model_filename=config["model_filename"],
+        n_ctx=config.get("n_ctx", 4096),
+        n_threads=config.get("n_threads", 8),
+        n_batch=config.get("n_batch", 256),
+        temperature=config.get("temperature", 0.2),
+        max_tokens=config.get("max_tokens", 800),
+        constrained_json=config.get("constrained_json", False),
+        early_stop=config.get("llm_early_stop", True),
+        prefix_cache_mb=config.get("llm_prefix_cache_mb", 0),
+        batch_size=config.get("llm_batch_size", 8),
+        batch_n_ctx=config.get("llm_batch_n_ctx", 0),
+        classify_temperature=config.get("classify_temperature", 1.0),
+        backend=config.get("llm_backend", "local"),
+        server_url=config.get("llm_server_url", LLMConfig.server_url),
+        concurrency=config.get("llm_concurrency", LLMConfig.concurrency),
+    )
 
-    def __init__(self, cfg: LLMConfig):
-        if Llama is None:
-            raise ImportError("llama-cpp-python is required. Install with: pip install llama-cpp-python")
-        self.cfg = cfg
-        model_path = resolve_model_path(cfg.model_filename)
-        self.llm = Llama(
-            model_path=str(model_path),
-            n_ctx=cfg.n_ctx,
-            n_threads=cfg.n_threads,
-            n_batch=cfg.n_batch,
-            seed=cfg.seed,
-            verbose=False,
+
+def new_judge_stats() -> Dict[str, int]:
+    """
+    Contadores de una corrida del judge: prompts al modelo, reparaciones de JSON, tokens generados, cortes
+    tempranos y prefill (ms hasta el primer token por completion, en streaming o en tanda; prefill_samples =
+    completions medidas; prefill_wall_ms = tiempo de reloj de los pasos de la tanda que evaluaron prompts, una vez
+    aunque lleven varios).
+    """
+    return {
+        "calls": 0, "repairs": 0, "repair_failures": 0, "generated_tokens": 0, "early_stops": 0,
+        "prefill_ms": 0, "prefill_samples": 0, "prefill_wall_ms": 0, "batches": 0, "parallel_calls": 0,
+        "classified": 0, "classify_ms": 0, "escalated": 0,
+        "http_requests": 0, "http_ms": 0,
+    }
+
+
+def format_judge_stats(stats: Dict[str, int]) -> str:
+    """Línea de métricas para el log: tasa de reparación sobre los prompts juzgados por el modelo, tokens por prompt."""
+    calls = stats.get("calls", 0)
+    repairs = stats.get("repairs", 0)
+    rate = 100.0 * repairs / calls if calls else 0.0
+    tokens = stats.get("generated_tokens", 0)
+    return (
+        f"Judge: {calls} prompts, {repairs} reparaciones de JSON ({rate:.1f}%), "
+        f"{stats.get('repair_failures', 0)} sin reparar; {tokens} tokens generados "
+        f"({tokens / calls if calls else 0.0:.1f} por prompt), {stats.get('early_stops', 0)} cortes al cerrar el JSON"
+        + (
+            f"; prefill {stats['prefill_ms'] / stats['prefill_samples']:.0f} ms por completion"
+            if stats.get("prefill_samples") else ""
+        )
+        + (f"; {stats['batches']} tandas" if stats.get("batches") else "")
+        + (f" ({stats['parallel_calls']} prompts decodificados en paralelo)" if stats.get("parallel_calls") else "")
+        + (
+            f"; {stats['http_requests']} requests HTTP ({stats['http_ms'] / stats['http_requests']:.0f} ms por request)"
+            if stats.get("http_requests") else ""
         )
+        + (
+            f"; {stats['classified']} clasificados por logprobs ({stats['classify_ms'] / stats['classified']:.0f} ms "
+            f"por caso, {stats.get('escalated', 0)} al judge completo)"
+            if stats.get("classified") else ""
+        )
+    )
+
+
+def sampling_params(cfg: LLMConfig) -> Dict[str, Any]:
+    """Campos de LLMConfig que cambian la salida del modelo (no n_threads / n_batch)."""
+    return {
+        "n_ctx": cfg.n_ctx,
+        "temperature": cfg.temperature,
+        "top_p": cfg.top_p,
+        "max_tokens": cfg.max_tokens,
+        "seed": cfg.seed,
+        "constrained_json": cfg.constrained_json,
+        "early_stop": cfg.early_stop,
+    }
+
+
+def classify_cache_scope(scope: str, cfg: LLMConfig) -> str:
+    """Ámbito de caché de classify_decision: el del judge + temperatura de calibración."""
+    return f"{scope}|classify|T={cfg.classify_temperature}"
+
+
+def decision_margin(probs: Dict[str, float]) -> float:
+    """Diferencia de probabilidad entre la primera y la segunda etiqueta."""
+    top = sorted(probs.values(), reverse=True) + [0.0, 0.0]
+    return top[0] - top[1]
+
+
+def needs_full_judge(probs: Dict[str, float], min_margin: float, full_decisions: Any = ()) -> bool:
+    """True si la clasificación no alcanza: margen bajo o la decisión ganadora pide recomendaciones (judge completo)."""
+    return decision_margin(probs) < min_margin or max(probs, key=probs.get) in set(full_decisions or ())
+
+
+def _common_prefix_len(a: List[int], b: List[int]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def sample_token(
+    logits: np.ndarray, temperature: float, top_p: float, rng: np.random.Generator, top_k: int = 40, min_p: float = 0.05
+) -> int:
+    """
+    Un token desde los logits, con la cadena por defecto de llama.cpp (top-k, top-p, min-p y temperatura);
+    temperature <= 0 = greedy. Lo usa la decodificación en tanda, que no pasa por el sampler de Llama.
+    """
+    z = np.asarray(logits, dtype=np.float64)
+    if temperature <= 0:
+        return int(np.argmax(z))
+    idx = np.argpartition(-z, top_k - 1)[:top_k] if 0 < top_k < len(z) else np.arange(len(z))
+    idx = idx[np.argsort(-z[idx], kind="stable")]
+    p = np.exp(z[idx] - z[idx[0]])
+    p /= p.sum()
+    keep = (np.cumsum(p) - p) < top_p
+    keep &= p >= min_p * p[0]
+    idx = idx[keep]
+    q = np.exp((z[idx] - z[idx[0]]) / temperature)
+    return int(rng.choice(idx, p=q / q.sum()))
+
+
+def judge_cache_scope(cfg: LLMConfig, model_path: str) -> str:
+    """Ámbito de la caché de veredictos: archivo de modelo + muestreo + system prompt."""
+    return verdict_scope(model_identity(str(model_path)), sampling_params(cfg), SYSTEM_JSON_ONLY)
+
+
+class JudgeBackend(abc.ABC):
+    """
+    Interfaz del judge que usa el pipeline: cfg, stats (new_judge_stats), chat_json / chat_json_batch (con la
+    caché de veredictos en cache_scope), classify_batch (si supports_classify), last_generated_tokens(_batch) y close.
+    Las subclases implementan _complete (una completion system + user -> texto); el parseo y la reparación
+    del JSON son comunes.
+    """
+
+    # True si el backend da logits para classify_batch (judge_mode=classify)
+    supports_classify = False
+
+    def __init__(self, cfg: LLMConfig, cache: Optional[VerdictCache] = None, cache_scope: Optional[str] = None):
+        self.cfg = cfg
+        self.stats = new_judge_stats()
+        self.last_generated_tokens = 0
+        self.last_generated_tokens_batch: List[int] = []
+        self.cache = cache
+        self.cache_scope = cache_scope if cache is not None else None
+
+    def _count(self, key: str, n: int = 1) -> None:
+        self.stats[key] = self.stats.get(key, 0) + n
+
+    def _count_tokens(self, n: int) -> None:
+        self._count("generated_tokens", n)
+        self.last_generated_tokens += n
+
+    @abc.abstractmethod
+    def _complete(self, user_content: str, temperature: float, top_p: float) -> str:
+        """Una completion system + user_content; devuelve el texto y suma los tokens generados."""
 
     def chat_json(self, prompt: str) -> Dict[str, Any]:
-        out = self.llm.create_chat_completion(
-            messages=[
-                {"role": "system", "content": SYSTEM_JSON_ONLY},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=self.cfg.temperature,
-            top_p=self.cfg.top_p,
-            max_tokens=self.cfg.max_tokens,
-        )
-        text = (out.get("choices") or [{}])[0].get("message", {}).get("content", "").strip()
+        """JSON del judge para prompt. last_generated_tokens: tokens generados en esta llamada (0 si vino de la caché)."""
+        self.last_generated_tokens = 0
+        if self.cache is None:
+            return self._chat_json(prompt)
+        key = verdict_key(self.cache_scope, prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        result = self._chat_json(prompt)
+        self.cache.put(key, result)
+        return result
+
+    def chat_json_batch(self, prompts: List[str]) -> List[Any]:
+        """
+        chat_json para una tanda, en orden: cada posición es el JSON del judge o la Exception de ese prompt.
+        Prompts repetidos en la tanda se juzgan una vez. last_generated_tokens_batch: tokens por prompt.
+        Acá, uno tras otro con chat_json. LocalLLM decodifica la tanda junta (una secuencia por caso en el mismo
+        llama_decode), HttpJudge la manda en requests concurrentes y con llm_workers > 1 se reparte entre procesos
+        (JudgePool.chat_json_batch).
+        """
+        self._count("batches")
+        results: List[Any] = []
+        tokens: List[int] = []
+        first: Dict[str, int] = {}
+        for prompt in prompts:
+            if prompt in first:
+                prev = results[first[prompt]]
+                results.append(prev if isinstance(prev, Exception) else copy.deepcopy(prev))
+                tokens.append(0)
+                continue
+            first[prompt] = len(results)
+            try:
+                results.append(self.chat_json(prompt))
+            except Exception as e:
+                results.append(e)
+            tokens.append(self.last_generated_tokens)
+        self.last_generated_tokens_batch = tokens
+        return results
+
+    def classify_batch(self, prompts: List[str]) -> List[Any]:
+        """Sin acceso a logits (supports_classify False): el pipeline usa el judge generativo en su lugar."""
+        raise NotImplementedError(f"{type(self).__name__} no clasifica por logprobs")
+
+    def _chat_json(self, prompt: str) -> Dict[str, Any]:
+        self._count("calls")
+        return self._parse_or_repair(self._complete(prompt, self.cfg.temperature, self.cfg.top_p))
+
+    def _parse_or_repair(self, text: str) -> Dict[str, Any]:
         try:
             return safe_json_loads(text)
         except Exception:
+            # Fallback contado: segunda completion para reparar (con constrained_json no debería pasar
+            # salvo corte por max_tokens)
+            self._count("repairs")
             repair = (
                 "Tu salida no fue JSON válido. Convertí EXACTAMENTE el siguiente contenido a un JSON válido, "
                 "sin agregar ni quitar significado. Respondé SOLO JSON:\n" + text
             )
-            out2 = self.llm.create_chat_completion(
-                messages=[
-                    {"role": "system", "content": SYSTEM_JSON_ONLY},
-                    {"role": "user", "content": repair},
-                ],
-                temperature=0.0,
-                top_p=1.0,
-                max_tokens=self.cfg.max_tokens,
-            )
-            text2 = (out2.get("choices") or [{}])[0].get("message", {}).get("content", "").strip()
-            return safe_json_loads(text2)
+            text2 = self._complete(repair, 0.0, 1.0)
+            try:
+                return safe_json_loads(text2)
+            except Exception:
+                self._count("repair_failures")
+                raise
 
     def judge_case(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         result = self.chat_json(build_judge_prompt(payload))
@@ -161,7 +525,546 @@ class LocalLLM:
             result["confidence"] = 0.5
         return result
 
+    def close(self) -> None:
+        pass
+
+
+class LocalLLM(JudgeBackend):
+    """
+    Single-process LLM runtime using llama.cpp via llama-cpp-python.
+    cache (VerdictCache, opcional): chat_json devuelve el JSON guardado si el mismo prompt ya se juzgó
+    con el mismo archivo de modelo y los mismos parámetros de muestreo.
+    chat_json_batch decodifica la tanda junta en un segundo contexto sobre el mismo modelo (ver _batch_setup).
+    """
+
+    supports_classify = True
+    # Contexto de tandas (se crea con la primera tanda); _batch_failed = API de bajo nivel no disponible
+    _batch: Optional[Dict[str, Any]] = None
+    _batch_failed = False
+
+    def __init__(self, cfg: LLMConfig, cache: Optional[VerdictCache] = None):
+        if Llama is None:
+            raise ImportError("llama-cpp-python is required. Install with: pip install llama-cpp-python")
+        model_path = resolve_model_path(cfg.model_filename)
+        super().__init__(cfg, cache, judge_cache_scope(cfg, str(model_path)) if cache is not None else None)
+        self.llm = Llama(
+            model_path=str(model_path),
+            n_ctx=cfg.n_ctx,
+            n_threads=cfg.n_threads,
+            n_batch=cfg.n_batch,
+            seed=cfg.seed,
+            verbose=False,
+        )
+        self.prefix_cached = False
+        if cfg.prefix_cache_mb > 0 and LlamaRAMCache is not None and hasattr(self.llm, "set_cache"):
+            self.llm.set_cache(LlamaRAMCache(capacity_bytes=cfg.prefix_cache_mb << 20))
+            self.prefix_cached = self._warm_prefix()
+
+    def _warm_prefix(self) -> bool:
+        """
+        Evalúa una vez system + JUDGE_PROMPT_PREFIX (1 token generado) para que su estado quede en la
+        LlamaRAMCache: el primer caso y los que siguen a una reparación restauran el prefijo en vez de recalcularlo.
+        """
+        try:
+            self.llm.create_chat_completion(
+                messages=judge_messages(JUDGE_PROMPT_PREFIX), temperature=0.0, max_tokens=1
+            )
+        except Exception:
+            return False
+        return True
+
+    def chat_json_batch(self, prompts: List[str]) -> List[Any]:
+        """
+        Como JudgeBackend.chat_json_batch, con los prompts no cacheados decodificados juntos (_decode_batch): cada
+        paso de llama_decode avanza un token de todas las secuencias activas. Salida no JSON: reparación secuencial.
+        Sin API de bajo nivel, con constrained_json (la gramática va por el sampler de Llama) o batch_size 1,
+        usa el camino secuencial.
+        """
+        if self.cfg.constrained_json or self.cfg.batch_size < 2 or self._batch_context() is None:
+            return super().chat_json_batch(prompts)
+        self._count("batches")
+        results: List[Any] = [None] * len(prompts)
+        tokens = [0] * len(prompts)
+        todo: Dict[str, List[int]] = {}
+        for i, prompt in enumerate(prompts):
+            cached = self.cache.get(verdict_key(self.cache_scope, prompt)) if self.cache is not None else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                todo.setdefault(prompt, []).append(i)
+        decoded = self._decode_batch(list(todo)) if len(todo) > 1 else []
+        for k, (prompt, positions) in enumerate(todo.items()):
+            self.last_generated_tokens = 0
+            if not decoded:
+                try:
+                    result = self._chat_json(prompt)
+                except Exception as e:
+                    result = e
+            elif isinstance(decoded[k][0], Exception):
+                result = decoded[k][0]
+            else:
+                self._count("calls")
+                self._count("parallel_calls")
+                self.last_generated_tokens = decoded[k][1]
+                try:
+                    result = self._parse_or_repair(decoded[k][0])
+                except Exception as e:
+                    result = e
+            if self.cache is not None and not isinstance(result, Exception):
+                self.cache.put(verdict_key(self.cache_scope, prompt), result)
+            for j, i in enumerate(positions):
+                results[i] = result if j == 0 or isinstance(result, Exception) else copy.deepcopy(result)
+                tokens[i] = self.last_generated_tokens if j == 0 else 0
+        self.last_generated_tokens_batch = tokens
+        return results
+
+    def _batch_context(self) -> Optional[Dict[str, Any]]:
+        """Estado del contexto de tandas (lo crea la primera vez); None si la API de bajo nivel no está."""
+        if self._batch is None and not self._batch_failed:
+            try:
+                self._batch = self._batch_setup()
+            except Exception:
+                self._batch = None
+            self._batch_failed = self._batch is None
+        return self._batch
+
+    def _batch_setup(self) -> Optional[Dict[str, Any]]:
+        """
+        Contexto llama.cpp aparte sobre el modelo ya cargado, con batch_size + 1 secuencias en un KV unificado:
+        la última guarda system + JUDGE_PROMPT_PREFIX (evaluado una vez) y cada caso copia esas celdas
+        (seq_cp, sin recalcular) antes de evaluar su INPUT. Celdas: batch_n_ctx (o BATCH_N_CTX_FACTOR * n_ctx),
+        prefijo incluido.
+        """
+        lib = llama_lib
+        if lib is None or not all(
+            hasattr(lib, f) for f in ("llama_batch_init", "llama_decode", "llama_get_logits_ith", "llama_context_default_params")
+        ):
+            return None
+        model = getattr(getattr(self.llm, "_model", None), "model", None) or getattr(self.llm, "model", None)
+        if model is None:
+            return None
+        n_seq = self.cfg.batch_size
+        prefix = self._tokenize(self._chat_text(judge_messages(JUDGE_PROMPT_PREFIX)))
+        kv_cells = self.cfg.batch_n_ctx or BATCH_N_CTX_FACTOR * self.cfg.n_ctx
+        params = lib.llama_context_default_params()
+        params.n_ctx = kv_cells
+        params.n_batch = self.cfg.n_batch
+        for name, value in (
+            ("n_ubatch", self.cfg.n_batch), ("n_seq_max", n_seq + 1), ("n_threads", self.cfg.n_threads),
+            ("n_threads_batch", self.cfg.n_threads), ("kv_unified", True),
+        ):
+            if hasattr(params, name):
+                setattr(params, name, value)
+        new_context = getattr(lib, "llama_init_from_model", None) or lib.llama_new_context_with_model
+        ctx = new_context(model, params)
+        if not ctx:
+            return None
+        # Operaciones sobre el KV por secuencia: llama_memory_* (llama.cpp reciente), llama_kv_self_* o llama_kv_cache_*
+        if hasattr(lib, "llama_get_memory") and hasattr(lib, "llama_memory_seq_rm"):
+            mem = lib.llama_get_memory(ctx)
+            seq_rm = lambda s, p0, p1: lib.llama_memory_seq_rm(mem, s, p0, p1)
+            seq_cp = lambda a, b, p0, p1: lib.llama_memory_seq_cp(mem, a, b, p0, p1)
+        else:
+            api = "llama_kv_self" if hasattr(lib, "llama_kv_self_seq_rm") else "llama_kv_cache"
+            seq_rm = lambda s, p0, p1: getattr(lib, api + "_seq_rm")(ctx, s, p0, p1)
+            seq_cp = lambda a, b, p0, p1: getattr(lib, api + "_seq_cp")(ctx, a, b, p0, p1)
+        if hasattr(lib, "llama_token_is_eog"):
+            vocab = lib.llama_model_get_vocab(model) if hasattr(lib, "llama_model_get_vocab") else model
+            is_eog = lambda t: bool(lib.llama_token_is_eog(vocab, t))
+        else:
+            eos = self.llm.token_eos()
+            is_eog = lambda t: t == eos
+        capacity = max(self.cfg.n_batch, n_seq)
+        state = {
+            "ctx": ctx, "batch": lib.llama_batch_init(capacity, 0, n_seq + 1), "capacity": capacity,
+            "n_seq": n_seq, "cells": kv_cells, "prefix": prefix, "n_vocab": self.llm.n_vocab(),
+            "seq_rm": seq_rm, "seq_cp": seq_cp, "is_eog": is_eog, "rng": np.random.default_rng(self.cfg.seed),
+        }
+        self._decode_entries(state, [(tok, pos, n_seq, False) for pos, tok in enumerate(prefix)])
+        return state
+
+    def _decode_entries(self, state: Dict[str, Any], entries: List[Tuple[int, int, int, bool]]) -> Dict[int, np.ndarray]:
+        """
+        llama_decode de (token, pos, seq_id, logits) en llama_batch de hasta capacity tokens; devuelve los logits
+        pedidos por índice de entrada. Sin hueco en el KV (llama_decode = 1) parte el batch a la mitad, como llama-server.
+        """
+        lib, batch, ctx = llama_lib, state["batch"], state["ctx"]
+        out: Dict[int, np.ndarray] = {}
+        step = state["capacity"]
+        i = 0
+        while i < len(entries):
+            chunk = entries[i:i + step]
+            for k, (tok, pos, seq, logits) in enumerate(chunk):
+                batch.token[k] = tok
+                batch.pos[k] = pos
+                batch.n_seq_id[k] = 1
+                batch.seq_id[k][0] = seq
+                batch.logits[k] = logits
+            batch.n_tokens = len(chunk)
+            ret = lib.llama_decode(ctx, batch)
+            if ret == 1 and step > 1:
+                step //= 2
+                continue
+            if ret != 0:
+                raise RuntimeError(f"llama_decode devolvió {ret}")
+            for k, (_, _, _, logits) in enumerate(chunk):
+                if logits:
+                    ptr = lib.llama_get_logits_ith(ctx, k)
+                    out[i + k] = np.array(np.ctypeslib.as_array(ptr, shape=(state["n_vocab"],)), dtype=np.float32)
+            i += len(chunk)
+        return out
+
+    def _decode_batch(self, prompts: List[str]) -> List[Tuple[Any, int]]:
+        """
+        Decodifica prompts juntos: hasta batch_size secuencias activas, cada una con su seq_id; un llama_decode por
+        paso lleva el siguiente token de cada secuencia y los prompts que entran (prefill del INPUT, el prefijo se
+        copia). Una secuencia termina en EOG, al cerrar el JSON (early_stop) o en max_tokens, y libera su seq_id y
+        sus celdas para el siguiente prompt; entra un prompt si su peor caso (prompt + max_tokens) cabe en el KV.
+        Devuelve (texto o Exception, tokens generados) por prompt, en orden.
+        """
+        state = self._batch
+        n_ctx, n_seq, prefix = self.cfg.n_ctx, state["n_seq"], state["prefix"]
+        out: List[Tuple[Any, int]] = [(None, 0)] * len(prompts)
+        pending: List[Tuple[int, List[int], int]] = []
+        for i, prompt in enumerate(prompts):
+            toks = self._tokenize(self._chat_text(judge_messages(prompt)))
+            shared = min(_common_prefix_len(prefix, toks), len(toks) - 1)
+            need = len(toks) - shared + min(self.cfg.max_tokens, n_ctx - len(toks))
+            if len(toks) >= n_ctx or len(prefix) + need > state["cells"]:
+                out[i] = (ValueError(f"Prompt de {len(toks)} tokens: no entra en n_ctx {n_ctx} con max_tokens"), 0)
+            else:
+                pending.append((i, toks, shared))
+        active: Dict[int, Dict[str, Any]] = {}
+        free = list(range(n_seq))
+        reserved = len(prefix)
+        try:
+            while pending or active:
+                entries: List[Tuple[int, int, int, bool]] = []
+                owners: List[int] = []
+                t_step = time.perf_counter()
+                for seq, st in active.items():
+                    entries.append((st["next"], st["pos"], seq, True))
+                    owners.append(seq)
+                    st["pos"] += 1
+                while pending and free:
+                    i, toks, shared = pending[0]
+                    max_new = min(self.cfg.max_tokens, n_ctx - len(toks))
+                    need = len(toks) - shared + max_new
+                    if active and reserved + need > state["cells"]:
+                        break
+                    pending.pop(0)
+                    seq = free.pop(0)
+                    if shared:
+                        state["seq_cp"](n_seq, seq, 0, shared)
+                    entries.extend((tok, pos, seq, pos == len(toks) - 1) for pos, tok in enumerate(toks) if pos >= shared)
+                    owners.extend([-1] * (len(toks) - shared - 1) + [seq])
+                    active[seq] = {
+                        "i": i, "t0": t_step, "pos": len(toks), "need": need, "max_new": max_new, "n": 0, "pieces": [],
+                        "scanner": JsonObjectScanner(), "decoder": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+                    }
+                    reserved += need
+                logits = self._decode_entries(state, entries)
+                prefilled = False
+                for k, seq in enumerate(owners):
+                    if seq < 0:
+                        continue
+                    st = active[seq]
+                    tok = sample_token(logits[k], self.cfg.temperature, self.cfg.top_p, state["rng"])
+                    if st.pop("t0", None) is not None:
+                        # Prefill de la secuencia: el paso que evaluó su prompt hasta el primer token muestreado
+                        self.stats["prefill_ms"] += int((time.perf_counter() - t_step) * 1000)
+                        self.stats["prefill_samples"] += 1
+                        prefilled = True
+                    done = state["is_eog"](tok)
+                    if not done:
+                        st["n"] += 1
+                        piece = st["decoder"].decode(self.llm.detokenize([tok]))
+                        st["pieces"].append(piece)
+                        if self.cfg.early_stop and st["scanner"].feed(piece):
+                            self.stats["early_stops"] += 1
+                            done = True
+                        done = done or st["n"] >= st["max_new"]
+                    if not done:
+                        st["next"] = tok
+                        continue
+                    text = st["scanner"].text_so_far if self.cfg.early_stop else "".join(st["pieces"])
+                    out[st["i"]] = (text.strip(), st["n"])
+                    self._count("generated_tokens", st["n"])
+                    state["seq_rm"](seq, -1, -1)
+                    del active[seq]
+                    free.append(seq)
+                    reserved -= st["need"]
+                if prefilled:
+                    self.stats["prefill_wall_ms"] += int((time.perf_counter() - t_step) * 1000)
+        except Exception as e:
+            for seq, st in active.items():
+                out[st["i"]] = (e, 0)
+                state["seq_rm"](seq, -1, -1)
+            for i, _, _ in pending:
+                out[i] = (e, 0)
+        return out
+
+    def close(self) -> None:
+        if self._batch is not None:
+            llama_lib.llama_batch_free(self._batch["batch"])
+            llama_lib.llama_free(self._batch["ctx"])
+            self._batch = None
+
+    def classify_decision(self, prompt: str) -> Dict[str, float]:
+        """
+        Distribución de probabilidad sobre DECISION_LABELS sin decodificar texto libre: un prefill del prompt
+        (+ '{"decision": "'), y por etiqueta solo sus pocos tokens, sumando log-probabilidades; softmax con
+        classify_temperature sobre las seis sumas.
+        """
+        key = None
+        if self.cache is not None:
+            key = verdict_key(classify_cache_scope(self.cache_scope, self.cfg), prompt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        t0 = time.perf_counter()
+        text = self._chat_text(judge_messages(prompt)) + _CLASSIFY_ANSWER_PREFIX
+        prefix = self._tokenize(text)
+        # Tokenizar prefijo + etiqueta junto (el tokenizer puede fusionar la comilla con el inicio de la etiqueta)
+        full = {label: self._tokenize(text + label + '"') for label in DECISION_LABELS}
+        base = min(min(_common_prefix_len(prefix, toks) for toks in full.values()), len(prefix))
+        self._eval_reusing_prefix(prefix[:base])
+        logprobs = []
+        for label in DECISION_LABELS:
+            tail = full[label][base:]
+            self.llm.n_tokens = base
+            total = 0.0
+            for i, tok in enumerate(tail):
+                total += float(self._last_logprobs()[tok])
+                if i < len(tail) - 1:
+                    self.llm.eval([tok])
+            logprobs.append(total)
+        z = np.array(logprobs) / max(self.cfg.classify_temperature, 1e-6)
+        z = np.exp(z - z.max())
+        probs = {label: round(float(p), 4) for label, p in zip(DECISION_LABELS, z / z.sum())}
+        self.stats["classified"] += 1
+        self.stats["classify_ms"] += int((time.perf_counter() - t0) * 1000)
+        if key is not None:
+            self.cache.put(key, probs)
+        return probs
+
+    def classify_batch(self, prompts: List[str]) -> List[Any]:
+        """classify_decision por prompt, en orden; un error queda como Exception en su posición."""
+        results: List[Any] = []
+        for prompt in prompts:
+            try:
+                results.append(self.classify_decision(prompt))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _chat_text(self, messages: List[Dict[str, str]]) -> str:
+        """Prompt de chat como texto, con el template del .gguf (o ChatML) y el turno del asistente abierto."""
+        template = (getattr(self.llm, "metadata", None) or {}).get("tokenizer.chat_template")
+        if template and Jinja2ChatFormatter is not None:
+            try:
+                token_text = lambda t: self.llm.detokenize([t]).decode("utf-8", errors="ignore")
+                formatter = Jinja2ChatFormatter(
+                    template=template,
+                    eos_token=token_text(self.llm.token_eos()),
+                    bos_token=token_text(self.llm.token_bos()),
+                )
+                return formatter(messages=messages).prompt
+            except Exception:
+                pass
+        return "".join(_CHATML_TURN.format(**m) for m in messages) + "<|im_start|>assistant\n"
+
+    def _tokenize(self, text: str) -> List[int]:
+        return list(self.llm.tokenize(text.encode("utf-8"), add_bos=True, special=True))
+
+    def _eval_reusing_prefix(self, tokens: List[int]) -> None:
+        """Evalúa tokens reutilizando el prefijo que ya está en el KV (como Llama.generate); siempre evalúa al menos uno."""
+        cached = list(self.llm.input_ids[: self.llm.n_tokens])
+        n = min(_common_prefix_len(cached, tokens), len(tokens) - 1)
+        self.llm.n_tokens = n
+        self.llm.eval(tokens[n:])
+
+    def _last_logprobs(self) -> np.ndarray:
+        """Log-softmax de los logits de la última posición evaluada."""
+        logits = np.asarray(self.llm.scores[self.llm.n_tokens - 1], dtype=np.float64)
+        shifted = logits - logits.max()
+        return shifted - np.log(np.exp(shifted).sum())
+
+    def _complete(self, user_content: str, temperature: float, top_p: float) -> str:
+        """
+        Una completion (system + user). Con early_stop hace streaming y corta apenas cierra el objeto JSON
+        de nivel superior; si no, pide la completion entera. Suma tokens generados (también los de reparación).
+        """
+        kwargs = {}
+        if self.cfg.constrained_json:
+            kwargs["response_format"] = {"type": "json_object", "schema": JUDGE_JSON_SCHEMA}
+        messages = judge_messages(user_content)
+        if not self.cfg.early_stop:
+            out = self.llm.create_chat_completion(
+                messages=messages, temperature=temperature, top_p=top_p, max_tokens=self.cfg.max_tokens, **kwargs
+            )
+            n_tokens = int((out.get("usage") or {}).get("completion_tokens", 0))
+            self._count_tokens(n_tokens)
+            return (out.get("choices") or [{}])[0].get("message", {}).get("content", "").strip()
+        scanner = JsonObjectScanner()
+        n_tokens = 0
+        t0 = time.perf_counter()
+        stream = self.llm.create_chat_completion(
+            messages=messages, temperature=temperature, top_p=top_p, max_tokens=self.cfg.max_tokens, stream=True, **kwargs
+        )
+        try:
+            for chunk in stream:
+                if t0 is not None:
+                    # El primer chunk llega tras evaluar el prompt (prefill) y muestrear un token
+                    self.stats["prefill_ms"] += int((time.perf_counter() - t0) * 1000)
+                    self.stats["prefill_samples"] += 1
+                    t0 = None
+                piece = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+                if not piece:
+                    continue
+                n_tokens += 1
+                if scanner.feed(piece):
+                    self.stats["early_stops"] += 1
+                    break
+        finally:
+            # Cerrar el generador corta la generación en llama.cpp
+            if hasattr(stream, "close"):
+                stream.close()
+        self._count_tokens(n_tokens)
+        return scanner.text_so_far.strip()
+
     def embed_text(self, text: str) -> List[float]:
         if hasattr(self.llm, "embed"):
             return self.llm.embed(text)
         return []
+
+
+class HttpJudge(JudgeBackend):
+    """
+    Judge contra un servidor local compatible con OpenAI (llama.cpp server u otro): POST /v1/chat/completions.
+    El modelo se carga una vez por host en el servidor, no por corrida. Una requests.Session con keep-alive
+    (pool de cfg.concurrency conexiones); chat_json_batch manda la tanda con asyncio, hasta cfg.concurrency
+    requests en vuelo (Semaphore). Sin streaming (early_stop no aplica) ni logits (supports_classify False).
+    La caché de veredictos se consulta en el hilo principal; el ámbito es servidor + id de modelo que reporta.
+    """
+
+    def __init__(self, cfg: LLMConfig, cache: Optional[VerdictCache] = None):
+        if requests is None:
+            raise ImportError("requests is required for llm_backend=http. Install with: pip install requests")
+        # last_generated_tokens por hilo: cada request de la tanda corre en su propio hilo
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.url = cfg.server_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, cfg.concurrency))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        try:
+            resp = self.session.get(self.url + "/v1/models", timeout=10)
+            resp.raise_for_status()
+            models = resp.json().get("data") or [{}]
+        except Exception as e:
+            self.session.close()
+            raise ConnectionError(f"Servidor del judge no disponible en {self.url}: {e}") from e
+        self.server_model = models[0].get("id", "")
+        scope = None
+        if cache is not None:
+            scope = verdict_scope(
+                {"server": self.url, "model": cfg.model_filename, "server_model": self.server_model},
+                sampling_params(cfg), SYSTEM_JSON_ONLY,
+            )
+        super().__init__(cfg, cache, scope)
+        self._loop = asyncio.new_event_loop()
+
+    @property
+    def last_generated_tokens(self) -> int:
+        return getattr(self._local, "tokens", 0)
+
+    @last_generated_tokens.setter
+    def last_generated_tokens(self, value: int) -> None:
+        self._local.tokens = value
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    def _complete(self, user_content: str, temperature: float, top_p: float) -> str:
+        body: Dict[str, Any] = {
+            "model": self.cfg.model_filename,
+            "messages": judge_messages(user_content),
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_tokens": self.cfg.max_tokens,
+            "seed": self.cfg.seed,
+        }
+        if self.cfg.constrained_json:
+            body["response_format"] = {"type": "json_object", "schema": JUDGE_JSON_SCHEMA}
+        t0 = time.perf_counter()
+        resp = self.session.post(self.url + "/v1/chat/completions", json=body, timeout=self.cfg.request_timeout)
+        resp.raise_for_status()
+        out = resp.json()
+        self._count("http_requests")
+        self._count("http_ms", int((time.perf_counter() - t0) * 1000))
+        self._count_tokens(int((out.get("usage") or {}).get("completion_tokens", 0)))
+        return (out.get("choices") or [{}])[0].get("message", {}).get("content", "").strip()
+
+    def _judge_one(self, prompt: str) -> Tuple[Any, int]:
+        self.last_generated_tokens = 0
+        try:
+            result = self._chat_json(prompt)
+        except Exception as e:
+            result = e
+        return result, self.last_generated_tokens
+
+    async def _judge_all(self, prompts: List[str]) -> List[Tuple[Any, int]]:
+        sem = asyncio.Semaphore(max(1, self.cfg.concurrency))
+
+        async def one(prompt: str) -> Tuple[Any, int]:
+            async with sem:
+                return await asyncio.to_thread(self._judge_one, prompt)
+
+        return await asyncio.gather(*(one(p) for p in prompts))
+
+    def chat_json(self, prompt: str) -> Dict[str, Any]:
+        result = self.chat_json_batch([prompt])[0]
+        self.last_generated_tokens = self.last_generated_tokens_batch[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def chat_json_batch(self, prompts: List[str]) -> List[Any]:
+        """Como JudgeBackend.chat_json_batch, con los prompts no cacheados en requests concurrentes."""
+        self._count("batches")
+        results: List[Any] = [None] * len(prompts)
+        tokens = [0] * len(prompts)
+        todo: Dict[str, List[int]] = {}
+        for i, prompt in enumerate(prompts):
+            cached = self.cache.get(verdict_key(self.cache_scope, prompt)) if self.cache is not None else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                todo.setdefault(prompt, []).append(i)
+        judged = self._loop.run_until_complete(self._judge_all(list(todo))) if todo else []
+        for (prompt, positions), (result, n_tokens) in zip(todo.items(), judged):
+            if self.cache is not None and not isinstance(result, Exception):
+                self.cache.put(verdict_key(self.cache_scope, prompt), result)
+            for j, i in enumerate(positions):
+                results[i] = result if j == 0 or isinstance(result, Exception) else copy.deepcopy(result)
+                tokens[i] = n_tokens if j == 0 else 0
+        self.last_generated_tokens_batch = tokens
+        return results
+
+    def close(self) -> None:
+        if not self._loop.is_closed():
+            self._loop.run_until_complete(self._loop.shutdown_default_executor())
+            self._loop.close()
+        self.session.close()
+
+
+def make_judge(cfg: LLMConfig, cache: Optional[VerdictCache] = None) -> JudgeBackend:
+    """Judge según cfg.backend: "local" (LocalLLM) o "http" (HttpJudge)."""
+    if cfg.backend == "http":
+        return HttpJudge(cfg, cache=cache)
+    if cfg.backend != "local":
+        raise ValueError(f"llm_backend desconocido: {cfg.backend!r} (local o http)")
+    return LocalLLM(cfg, cache=cache)
@@ -1,9 +1,41 @@
 """
 Post-validación y scoring: umbrales STRONG_MATCH/WEAK_MATCH, reglas de consistencia, review_flag.
+Las señales de las reglas (strong_match_candidate, is_short_trigger, max_evidence_sim, has_out_of_domain_words)
+también las usa el triage previo al judge (core/triage.py).
 """
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from core.spec import STRONG_MATCH, WEAK_MATCH
 
+# Palabras muy fuera de dominio (heurística de OUT_OF_SCOPE)
+OUT_OF_DOMAIN_WORDS = ("torta", "futbol", "receta", "clima")
+
+
+def strong_match_candidate(candidates: list, flow_ref: str) -> Optional[Dict[str, Any]]:
+    """Primer candidato del flow_ref con alguna evidencia >= STRONG_MATCH (None si flow_ref es UNKNOWN / CHIT)."""
+    if not flow_ref or flow_ref in ("UNKNOWN", "CHIT"):
+        return None
+    for c in (candidates or []):
+        if c.get("flow") == flow_ref and any((e.get("sim") or 0) >= STRONG_MATCH for e in (c.get("evidence") or [])):
+            return c
+    return None
+
+
+def is_short_trigger(trigger_user_text: str) -> bool:
+    return len((trigger_user_text or "").strip().split()) <= 4
+
+
+def max_evidence_sim(candidates: list) -> float:
+    max_sim = 0.0
+    for c in (candidates or []):
+        for e in (c.get("evidence") or []):
+            max_sim = max(max_sim, (e.get("sim") or 0))
+    return max_sim
+
+
+def has_out_of_domain_words(trigger_user_text: str) -> bool:
+    text = (trigger_user_text or "").lower()
+    return any(w in text for w in OUT_OF_DOMAIN_WORDS)
+
 
 def post_validate(
     llm_result: Dict[str, Any],
@@ -24,31 +56,18 @@ def post_validate(
     review_flag = False
 
     # STRONG_MATCH en mismo flow_ref pero LLM dijo NEW_INTENT
-    if flow_ref and flow_ref not in ("UNKNOWN", "CHIT"):
-        for c in (candidates or []):
-            if (c.get("flow") == flow_ref) and any(
-                (e.get("sim") or 0) >= STRONG_MATCH for e in (c.get("evidence") or [])
-            ):
-                if "NEW_INTENT" in decision:
-                    confidence = min(confidence, 0.6)
-                    review_flag = True
-                break
+    if strong_match_candidate(candidates, flow_ref) is not None and "NEW_INTENT" in decision:
+        confidence = min(confidence, 0.6)
+        review_flag = True
 
     # slot_signals fuerte + trigger corto y LLM no dijo MISSING_PARAMETER_HANDLER
-    trigger_short = len((trigger_user_text or "").strip().split()) <= 4
-    if slot_signals and trigger_short and "MISSING_PARAMETER_HANDLER" not in decision:
+    if slot_signals and is_short_trigger(trigger_user_text) and "MISSING_PARAMETER_HANDLER" not in decision:
         confidence = min(confidence, 0.65)
         review_flag = True
 
     # Sin evidencias > WEAK_MATCH y texto claramente no bancario
-    max_sim = 0.0
-    for c in (candidates or []):
-        for e in (c.get("evidence") or []):
-            max_sim = max(max_sim, (e.get("sim") or 0))
-    if max_sim < WEAK_MATCH and decision != "OUT_OF_SCOPE":
-        # Heurística: palabras muy fuera de dominio
-        out_words = {"torta", "futbol", "receta", "clima"}
-        if any(w in (trigger_user_text or "").lower() for w in out_words):
+    if max_evidence_sim(candidates) < WEAK_MATCH and decision != "OUT_OF_SCOPE":
+        if has_out_of_domain_words(trigger_user_text):
             result["decision"] = "OUT_OF_SCOPE"
             result["confidence"] = 0.85
             review_flag = False
@@ -1,5 +1,12 @@
+import numpy as np
 import pandas as pd
 import unicodedata
+from typing import List, Optional
+
+from core.sessions import sort_by_session
+from core.context_builder import attach_flow_ref
+from core.spec import FLOWS_NEUTRALES
+from core.turn_cache import load_cached_turns, save_cached_turns
 
 
 def normalize_text(texto: str) -> str:
@@ -9,6 +16,41 @@ def normalize_text(texto: str) -> str:
     return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("utf-8").lower().strip()
 
 
+# Latin-1 -> ASCII según NFKD (acentos fuera, ½ -> 12, ¿ -> ""): en ese rango NFKD no reordena
+# nada que sobreviva al encode ascii, así que traducir char a char da lo mismo que normalize_text.
+_LATIN1_ASCII = {
+    c: unicodedata.normalize("NFKD", chr(c)).encode("ascii", "ignore").decode("utf-8")
+    for c in range(128, 256)
+}
+
+
+def _normalize_unique(texto: str) -> str:
+    """normalize_text con atajos: ASCII puro (solo lower/strip) y Latin-1 (tabla de traducción)."""
+    if not isinstance(texto, str):
+        return ""
+    if texto.isascii():
+        return texto.lower().strip()
+    if max(texto) <= "\xff":
+        return texto.translate(_LATIN1_ASCII).lower().strip()
+    return normalize_text(texto)
+
+
+def map_unique(values, fn, missing=""):
+    """
+    fn aplicada una vez por valor distinto (factorize -> fn sobre únicos -> scatter por códigos).
+    Los exports repiten mucho (plantillas del bot, nombres de intent). NaN/None -> missing.
+    Devuelve un array numpy (object) alineado con values.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), sort=False)
+    mapped = np.array([fn(u) for u in uniques] + [missing], dtype=object)
+    return mapped[codes]
+
+
+def normalize_texts(values) -> np.ndarray:
+    """normalize_text en batch (mismo resultado valor a valor), normalizando cada string distinto una sola vez."""
+    return map_unique(values, _normalize_unique)
+
+
 def _flow_from_intent(intent: str) -> str:
     """Parse flow desde intent según spec §4.1."""
     if not intent or not isinstance(intent, str):
@@ -23,19 +65,26 @@ def _flow_from_intent(intent: str) -> str:
     return intent
 
 
+# Mapeo automático si viene con nombres distintos
+CHAT_COL_MAP = {
+    "cod_wts_jsessionid": "session_id",
+    "ds_wts_message": "texto",
+    "ds_wts_intent": "intent_detectado",
+    "tipo_mensaje": "tipo"
+}
+COLUMNAS_REQUERIDAS = {"session_id", "tipo", "texto", "intent_detectado"}
+
+
 def cargar_chats(path_chat_csv: str) -> pd.DataFrame:
     df = pd.read_csv(path_chat_csv)
+    return normalizar_chats(df, path_chat_csv)
+
 
-    # Mapeo automático si viene con nombres distintos
-    col_map = {
-        "cod_wts_jsessionid": "session_id",
-        "ds_wts_message": "texto",
-        "ds_wts_intent": "intent_detectado",
-        "tipo_mensaje": "tipo"
-    }
-    df.rename(columns=col_map, inplace=True)
+def normalizar_chats(df: pd.DataFrame, path_chat_csv: str) -> pd.DataFrame:
+    """Renombra columnas (CHAT_COL_MAP), valida las requeridas, ffill de session_id y defaults de intent/tipo/fecha."""
+    df.rename(columns=CHAT_COL_MAP, inplace=True)
 
-    columnas_esperadas = {"session_id", "tipo", "texto", "intent_detectado"}
+    columnas_esperadas = COLUMNAS_REQUERIDAS
     if not columnas_esperadas.issubset(df.columns):
         raise ValueError(f"El archivo {path_chat_csv} no contiene las columnas requeridas: {columnas_esperadas}")
 
@@ -47,16 +96,50 @@ def cargar_chats(path_chat_csv: str) -> pd.DataFrame:
     return df
 
 
-def cargar_chats_as_turns(path_chat_csv: str) -> pd.DataFrame:
+def cargar_chats_as_turns(
+    path_chat_csv: str,
+    cache_dir: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    logger_callback=None,
+) -> pd.DataFrame:
     """
     Carga chats y devuelve DataFrame con columnas de turno interno:
     session_id, fecha, tipo, texto, texto_norm, intent_detectado, intent_norm,
-    is_no_match, flow_from_intent, turn_index.
+    is_no_match, flow_from_intent, turn_index, flow_ref, last_valid_intent.
+    Filas ordenadas por sesión (contiguas, en orden de turn_index) con índice posicional,
+    listas para core.sessions.build_session_index.
+    flow_ref / last_valid_intent: inferidos con FLOWS_NEUTRALES tomando cada turno como trigger
+    (ver context_builder.attach_flow_ref).
+    cache_dir: si se pasa, la tabla derivada se lee de / escribe en la caché columnar (core.turn_cache)
+    y no se re-parsea ni re-normaliza el CSV mientras no cambie. columns: proyección al leer.
+    La escritura de la caché es best-effort: si falla (p. ej. pyarrow.ArrowTypeError con columnas de tipos
+    mezclados) se informa por logger_callback y el análisis sigue.
     """
-    df = cargar_chats(path_chat_csv)
-    df["texto_norm"] = df["texto"].astype(str).map(normalize_text)
-    df["intent_norm"] = df["intent_detectado"].astype(str).map(normalize_text)
+    if cache_dir:
+        cached = load_cached_turns(path_chat_csv, cache_dir, columns)
+        if cached is not None:
+            return cached
+    df = _derive_turns(path_chat_csv)
+    if cache_dir:
+        try:
+            save_cached_turns(df, path_chat_csv, cache_dir)
+        except Exception as e:
+            if logger_callback:
+                logger_callback(f"No se pudo guardar la caché de turnos ({type(e).__name__}: {e}).")
+    return df[columns] if columns else df
+
+
+def _derive_turns(path_chat_csv: str) -> pd.DataFrame:
+    """Parse + normalización + columnas derivadas de cargar_chats_as_turns (sin caché)."""
+    return derive_turn_columns(cargar_chats(path_chat_csv))
+
+
+def derive_turn_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Columnas de turno sobre chats ya normalizados (cargar_chats): texto_norm ... last_valid_intent, orden por sesión."""
+    df["texto_norm"] = normalize_texts(df["texto"].astype(str))
+    df["intent_norm"] = normalize_texts(df["intent_detectado"].astype(str))
     df["is_no_match"] = df["intent_detectado"].astype(str).str.upper().str.startswith("NO_MATCH")
-    df["flow_from_intent"] = df["intent_detectado"].astype(str).map(_flow_from_intent)
+    df["flow_from_intent"] = map_unique(df["intent_detectado"].astype(str), _flow_from_intent)
     df["turn_index"] = df.groupby("session_id").cumcount()
-    return df
+    df = sort_by_session(df)
+    return attach_flow_ref(df, FLOWS_NEUTRALES)
@@ -0,0 +1,126 @@
+"""
+Empaquetado del payload del judge dentro de un presupuesto de tokens.
+build_judge_prompt volcaba el payload entero (todas las training_phrases de los top intents, toda la ventana
+de contexto y campos duplicados como mensaje_no_match / trigger_user_text_norm): el prefill domina la latencia
+en CPU y se pasaba de n_ctx. pack_payload arma el INPUT por prioridad hasta agotar el presupuesto:
+1) trigger, flow_ref, slots y datos del caso (los textos libres se cortan con "…" si solos pasan el presupuesto); 2) candidatos con su evidence; 3) contexto (del más reciente
+hacia atrás); 4) training_phrases extra (las que no están en evidence), repartidas entre candidatos.
+"""
+import json
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Margen de tokens que se deja libre además de max_tokens (plantilla de chat, BOS, etc.)
+PROMPT_MARGIN_TOKENS = 64
+# Campos del caso, en orden, siempre incluidos (mensaje_no_match = trigger_user_text, no se repite)
+PROMPT_CORE_FIELDS = (
+    "session_id", "case_id", "trigger_user_text", "flow_ref", "last_valid_intent", "slot_signals", "bot_no_match_text",
+)
+# Textos libres del caso que se cortan (en este orden) si los campos fijos solos pasan el presupuesto
+PROMPT_TRUNCATABLE_FIELDS = ("bot_no_match_text", "trigger_user_text")
+_ELLIPSIS = "…"
+# Costo aproximado de separadores (coma, comillas de la clave) por elemento agregado
+_ITEM_OVERHEAD = 2
+
+
+def approx_token_count(text: str) -> int:
+    """Estimación conservadora (~3 caracteres por token) cuando no hay tokenizer del modelo."""
+    return int(math.ceil(len(text) / 3.0))
+
+
+def prompt_budget(n_ctx: int, max_tokens: int, budget: Optional[int] = None) -> int:
+    """Tokens disponibles para el prompt completo: el configurado o n_ctx - max_tokens - margen."""
+    if budget:
+        return int(budget)
+    return max(256, int(n_ctx) - int(max_tokens) - PROMPT_MARGIN_TOKENS)
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def pack_payload(
+    payload: Dict[str, Any],
+    budget_tokens: Optional[int] = None,
+    count_tokens: Callable[[str], int] = approx_token_count,
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    INPUT del judge a partir del payload, por prioridad, sin pasar budget_tokens (None = sin límite).
+    Devuelve (payload empaquetado, recortado) — recortado=True si algo quedó afuera por presupuesto.
+    """
+    limit = math.inf if budget_tokens is None else budget_tokens
+    packed: Dict[str, Any] = {k: payload[k] for k in PROMPT_CORE_FIELDS if k in payload}
+    candidates: List[Dict[str, Any]] = []
+    kept: List[Dict[str, Any]] = []
+    packed["candidates"] = candidates
+    packed["context_messages"] = kept
+    used = count_tokens(_dumps(packed))
+    trimmed = False
+
+    # 1) Campos fijos más largos que el presupuesto: cortar los textos libres hasta lo que queda
+    for field in PROMPT_TRUNCATABLE_FIELDS:
+        if used <= limit:
+            break
+        text = packed.get(field)
+        if not isinstance(text, str) or not text:
+            continue
+        lo, hi = 0, len(text) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            packed[field] = text[:mid] + _ELLIPSIS
+            if count_tokens(_dumps(packed)) <= limit:
+                lo = mid
+            else:
+                hi = mid - 1
+        packed[field] = text[:lo] + _ELLIPSIS
+        used = count_tokens(_dumps(packed))
+        trimmed = True
+
+    def fits(obj: Any) -> bool:
+        nonlocal used
+        cost = count_tokens(_dumps(obj)) + _ITEM_OVERHEAD
+        if used + cost > limit:
+            return False
+        used += cost
+        return True
+
+    # 2) Candidatos con evidence (ya vienen ordenados por score)
+    for c in payload.get("candidates") or []:
+        item = {
+            "intent": c.get("intent", ""),
+            "flow": c.get("flow", ""),
+            "score": c.get("score", 0),
+            "evidence": [{"phrase": e.get("phrase"), "sim": round(float(e.get("sim") or 0), 3)} for e in c.get("evidence") or []],
+        }
+        if not fits(item):
+            trimmed = True
+            break
+        candidates.append(item)
+
+    # 3) Contexto: del mensaje más reciente hacia atrás, en orden cronológico en el prompt
+    context = payload.get("context_messages") or []
+    for m in reversed(context):
+        if not fits(m):
+            trimmed = True
+            break
+        kept.append(m)
+    kept.reverse()
+
+    # 4) Frases de training extra, una por candidato por vuelta
+    extras = []
+    for c, item in zip(payload.get("candidates") or [], candidates):
+        seen = {e["phrase"] for e in item["evidence"]}
+        extras.append((item, [p for p in c.get("training_phrases") or [] if p not in seen]))
+    for r in range(max((len(ph) for _, ph in extras), default=0)):
+        full = False
+        for item, phrases in extras:
+            if r >= len(phrases):
+                continue
+            if not fits(phrases[r]):
+                full = True
+                break
+            item.setdefault("training_phrases", []).append(phrases[r])
+        if full:
+            trimmed = True
+            break
+    return packed, trimmed
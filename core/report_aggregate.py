@@ -3,6 +3,7 @@ Fase 2: agregar registros post-análisis por flow/intent y escribir informe gene
 
 Toma las filas del registro caso a caso (fase 1), agrupa por flow_ref y por intent_top,
 consolida mejoras y new_training_phrases, y escribe informe_general_mejora.json y .md.
+InformeAccumulator agrega fila a fila (el pipeline no guarda las filas para el informe).
 
 Opcional futuro: pasar el informe agregado (por_flow, por_intent) a una segunda llamada LLM
 con prompt tipo "Generá un informe narrativo de mejoras para Dialogflow" y añadir
@@ -13,7 +14,7 @@ from __future__ import annotations
 import json
 import os
 from collections import defaultdict
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 
 def _safe_load_json(s: Any, default: Any = None):
@@ -29,81 +30,130 @@ def _safe_load_json(s: Any, default: Any = None):
         return default
 
 
-def aggregate_by_flow(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Agrupa por flow_ref. Por cada flow: cantidad, decisiones, mensajes, improvements y new_training_phrases consolidados."""
-    by_flow: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
-    for r in rows:
+class InformeAccumulator:
+    """
+    Informe general armado fila a fila (add), sin guardar las filas: por flow y por flow|intent solo quedan
+    contadores, las decisiones y los textos únicos (mensajes con tope, mejoras, frases). El pipeline lo
+    alimenta a medida que escribe cada fila, así la memoria no crece con las filas completas.
+    casos_unicos suma un peso por fila: 1 / multiplicidad por defecto; quien conoce las claves de dedup pasa
+    1.0 en la primera fila de cada clave y 0.0 en las repetidas (la multiplicidad puede crecer después).
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.unicos = 0.0
+        self.by_flow: Dict[str, Dict[str, Any]] = {}
+        self.by_intent: Dict[str, Dict[str, Any]] = {}
+        self.by_source: Dict[str, float] = defaultdict(float)
+
+    def add(self, r: Dict[str, Any], weight: Optional[float] = None) -> None:
+        if weight is None:
+            weight = _row_weight(r)
+        self.total += 1
+        self.unicos += weight
+        self.by_source[r.get("decided_by") or "sin_dato"] += weight
+        decision = r.get("decision") or ""
+        msg = (r.get("mensaje_no_match") or "").strip()
+        imp = _safe_load_json(r.get("improvements"), [])
+        improvements = [x for x in imp if isinstance(x, str)] if isinstance(imp, list) else []
+        intent_top = (r.get("intent_top") or "").strip()
+
         flow = (r.get("flow_ref") or "").strip() or "UNKNOWN"
-        by_flow[flow].append(r)
-
-    result = {}
-    for flow, group in sorted(by_flow.items()):
-        decisions = []
-        mensajes = []
-        improvements_all: List[str] = []
-        new_training_merged: Dict[str, List[str]] = {}
-        intent_counts: Dict[str, int] = defaultdict(int)
-        for r in group:
-            d = r.get("decision") or ""
-            if d:
-                decisions.append(d)
-            msg = (r.get("mensaje_no_match") or "").strip()
-            if msg:
-                mensajes.append(msg)
-            imp = _safe_load_json(r.get("improvements"), [])
-            if isinstance(imp, list):
-                improvements_all.extend(x for x in imp if isinstance(x, str))
-            ntp = _safe_load_json(r.get("new_training_phrases"), {})
-            if isinstance(ntp, dict):
-                for intent_key, phrases in ntp.items():
-                    if isinstance(phrases, list):
-                        new_training_merged.setdefault(intent_key, []).extend(phrases)
-                    elif isinstance(phrases, str):
-                        new_training_merged.setdefault(intent_key, []).append(phrases)
-            it = (r.get("intent_top") or "").strip()
-            if it:
-                intent_counts[it] += 1
-        result[flow] = {
-            "cantidad_casos": len(group),
-            "decisiones": decisions,
-            "resumen_decisiones": _count_values(decisions),
-            "mensajes_no_match": list(dict.fromkeys(mensajes))[:50],
-            "intent_top_counts": dict(intent_counts),
-            "improvements_consolidados": list(dict.fromkeys(improvements_all)),
-            "new_training_phrases_consolidados": {k: list(dict.fromkeys(v)) for k, v in new_training_merged.items()},
+        g = self.by_flow.get(flow)
+        if g is None:
+            g = self.by_flow[flow] = {
+                "n": 0, "unicos": 0.0, "decisiones": [], "mensajes": {}, "intent_counts": defaultdict(int),
+                "improvements": {}, "ntp": {},
+            }
+        _add_common(g, weight, decision, msg, improvements, 50)
+        ntp = _safe_load_json(r.get("new_training_phrases"), {})
+        if isinstance(ntp, dict):
+            for intent_key, phrases in ntp.items():
+                if isinstance(phrases, list):
+                    merged = g["ntp"].setdefault(intent_key, {})
+                    merged.update(dict.fromkeys(phrases))
+                elif isinstance(phrases, str):
+                    g["ntp"].setdefault(intent_key, {})[phrases] = None
+        if intent_top:
+            g["intent_counts"][intent_top] += 1
+
+        key = f"{flow}|{intent_top or 'SIN_INTENT'}"
+        g = self.by_intent.get(key)
+        if g is None:
+            g = self.by_intent[key] = {"n": 0, "unicos": 0.0, "decisiones": [], "mensajes": {}, "improvements": {}}
+        _add_common(g, weight, decision, msg, improvements, 30)
+
+    def build(self) -> Dict[str, Any]:
+        """Mismo payload que build_informe_general sobre las filas agregadas."""
+        por_flow = {}
+        for flow, g in sorted(self.by_flow.items()):
+            por_flow[flow] = {
+                "cantidad_casos": g["n"],
+                "casos_unicos": int(round(g["unicos"])),
+                "decisiones": list(g["decisiones"]),
+                "resumen_decisiones": _count_values(g["decisiones"]),
+                "mensajes_no_match": list(g["mensajes"]),
+                "intent_top_counts": dict(g["intent_counts"]),
+                "improvements_consolidados": list(g["improvements"]),
+                "new_training_phrases_consolidados": {k: list(v) for k, v in g["ntp"].items()},
+            }
+        por_intent = {}
+        for key, g in sorted(self.by_intent.items()):
+            flow, intent = key.split("|", 1)
+            por_intent[key] = {
+                "flow": flow,
+                "intent": intent,
+                "cantidad_casos": g["n"],
+                "casos_unicos": int(round(g["unicos"])),
+                "decisiones": list(g["decisiones"]),
+                "resumen_decisiones": _count_values(g["decisiones"]),
+                "mensajes_no_match_sample": list(g["mensajes"]),
+                "improvements_consolidados": list(g["improvements"]),
+            }
+        unicos = {k: int(round(v)) for k, v in sorted(self.by_source.items())}
+        total_unicos = sum(unicos.values())
+        return {
+            "total_casos_no_match": self.total,
+            "total_casos_unicos": int(round(self.unicos)),
+            "triage": {
+                "casos_unicos_por_origen": unicos,
+                "fraccion_sin_llm": round(unicos.get("triage", 0) / total_unicos, 4) if total_unicos else 0.0,
+            },
+            "por_flow": por_flow,
+            "por_intent": por_intent,
         }
-    return result
+
+
+def _add_common(g: Dict[str, Any], weight: float, decision: str, msg: str, improvements: List[str], max_msgs: int) -> None:
+    """Contadores, decisiones, mensajes únicos (los primeros max_msgs) y mejoras únicas de un grupo."""
+    g["n"] += 1
+    g["unicos"] += weight
+    if decision:
+        g["decisiones"].append(decision)
+    if msg and len(g["mensajes"]) < max_msgs:
+        g["mensajes"][msg] = None
+    g["improvements"].update(dict.fromkeys(improvements))
+
+
+def _row_weight(r: Dict[str, Any]) -> float:
+    """
+    Aporte de la fila a los casos únicos: cada clave de dedup aporta multiplicidad filas de 1/multiplicidad.
+    Las filas de una misma clave comparten flow_ref e intent_top, así que nunca quedan repartidas entre grupos.
+    """
+    try:
+        return 1.0 / max(1, int(r.get("multiplicidad") or 1))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def aggregate_by_flow(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Agrupa por flow_ref. Por cada flow: cantidad, decisiones, mensajes, improvements y new_training_phrases consolidados."""
+    return build_informe_general(rows)["por_flow"]
 
 
 def aggregate_by_intent(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
     """Agrupa por intent_top (y flow_ref). Por cada intent: cantidad, decisiones, mensajes, mejoras."""
-    by_intent: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
-    for r in rows:
-        intent = (r.get("intent_top") or "").strip() or "SIN_INTENT"
-        flow = (r.get("flow_ref") or "").strip() or "UNKNOWN"
-        key = f"{flow}|{intent}"
-        by_intent[key].append(r)
-
-    result = {}
-    for key, group in sorted(by_intent.items()):
-        flow, intent = key.split("|", 1) if "|" in key else ("UNKNOWN", key)
-        decisions = [r.get("decision") or "" for r in group if r.get("decision")]
-        mensajes = list(dict.fromkeys((r.get("mensaje_no_match") or "").strip() for r in group if (r.get("mensaje_no_match") or "").strip()))[:30]
-        improvements_all: List[str] = []
-        for r in group:
-            imp = _safe_load_json(r.get("improvements"), [])
-            if isinstance(imp, list):
-                improvements_all.extend(x for x in imp if isinstance(x, str))
-        result[key] = {
-            "flow": flow,
-            "intent": intent,
-            "cantidad_casos": len(group),
-            "decisiones": decisions,
-            "resumen_decisiones": _count_values(decisions),
-            "mensajes_no_match_sample": mensajes,
-            "improvements_consolidados": list(dict.fromkeys(improvements_all)),
-        }
-    return result
+    return build_informe_general(rows)["por_intent"]
 
 
 def _count_values(items: List[str]) -> Dict[str, int]:
@@ -115,14 +165,11 @@ def _count_values(items: List[str]) -> Dict[str, int]:
 
 
 def build_informe_general(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Construye el payload del informe general: por_flow, por_intent, total_casos."""
-    by_flow = aggregate_by_flow(rows)
-    by_intent = aggregate_by_intent(rows)
-    return {
-        "total_casos_no_match": len(rows),
-        "por_flow": by_flow,
-        "por_intent": by_intent,
-    }
+    """Construye el payload del informe general: por_flow, por_intent, total_casos, casos únicos (dedup), triage."""
+    acc = InformeAccumulator()
+    for r in rows:
+        acc.add(r)
+    return acc.build()
 
 
 def write_informe_general(
@@ -133,9 +180,12 @@ def write_informe_general(
     """
     Escribe informe_general_mejora.json y opcionalmente informe_general_mejora.md.
     """
-    os.makedirs(path_out_dir, exist_ok=True)
-    informe = build_informe_general(rows)
+    write_informe(build_informe_general(rows), path_out_dir, write_md)
 
+
+def write_informe(informe: Dict[str, Any], path_out_dir: str, write_md: bool = True) -> None:
+    """Escribe un informe ya armado (build_informe_general o InformeAccumulator.build)."""
+    os.makedirs(path_out_dir, exist_ok=True)
     json_path = os.path.join(path_out_dir, "informe_general_mejora.json")
     with open(json_path, "w", encoding="utf-8") as f:
         json.dump(informe, f, ensure_ascii=False, indent=2)
@@ -151,13 +201,23 @@ def _informe_to_md(informe: Dict[str, Any]) -> str:
         "# Informe general de mejora (NO_MATCH)",
         "",
         f"**Total de casos NO_MATCH:** {informe.get('total_casos_no_match', 0)}",
+        f"**Casos únicos (texto + flow_ref):** {informe.get('total_casos_unicos', informe.get('total_casos_no_match', 0))}",
+    ]
+    triage = informe.get("triage") or {}
+    por_origen = triage.get("casos_unicos_por_origen") or {}
+    if por_origen.get("triage"):
+        lines.append(
+            f"**Decididos por triage (sin LLM):** {por_origen['triage']} de {sum(por_origen.values())} casos únicos "
+            f"({100.0 * triage.get('fraccion_sin_llm', 0):.1f}%)"
+        )
+    lines += [
         "",
         "## Por flow",
         "",
     ]
     for flow, data in (informe.get("por_flow") or {}).items():
         lines.append(f"### {flow}")
-        lines.append(f"- Casos: {data.get('cantidad_casos', 0)}")
+        lines.append(f"- Casos: {data.get('cantidad_casos', 0)} ({data.get('casos_unicos', data.get('cantidad_casos', 0))} únicos)")
         res = data.get("resumen_decisiones") or {}
         if res:
             lines.append("- Decisiones: " + ", ".join(f"{k}({v})" for k, v in sorted(res.items(), key=lambda x: -x[1])))
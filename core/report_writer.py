@@ -1,10 +1,13 @@
 """
 Escritura de reportes: CSV (§11.1), JSONL auditoría, opcional cases_debug.
+write_reports escribe todo al final; StreamingReportWriter escribe fila a fila a medida que el judge termina
+y update_multiplicidad corrige después la columna multiplicidad recorriendo los archivos (sin tener las filas).
 """
 import os
+import csv
 import json
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Sequence
 from core.file_manager import guardar_csv
 
 
@@ -12,7 +15,8 @@ CSV_COLUMNS = [
     "fecha", "session_id", "case_id", "mensaje_no_match", "bot_no_match_text",
     "flow_ref", "last_valid_intent", "decision", "flow_recommended", "intent_top",
     "intents_relevantes", "top_evidence", "slot_signals", "improvements",
-    "new_training_phrases", "suggested_dialogflow", "confidence", "review_flag",
+    "new_training_phrases", "suggested_dialogflow", "confidence", "review_flag", "multiplicidad",
+    "decided_by",
 ]
 
 
@@ -28,6 +32,8 @@ def write_reports(
     os.makedirs(path_out_dir, exist_ok=True)
     csv_path = os.path.join(path_out_dir, "analisis_no_match.csv")
     df = pd.DataFrame(rows) if rows else pd.DataFrame(columns=CSV_COLUMNS)
+    # Campos extra de auditoría (p. ej. generated_tokens) van solo al JSONL
+    df = df[[c for c in df.columns if c in CSV_COLUMNS]]
     guardar_csv(df, csv_path)
     if write_jsonl:
         jsonl_path = os.path.join(path_out_dir, "auditoria.jsonl")
@@ -38,7 +44,95 @@ def write_reports(
         debug_dir = os.path.join(path_out_dir, "cases_debug")
         os.makedirs(debug_dir, exist_ok=True)
         for r in rows:
-            case_id = (r.get("case_id") or "unknown").replace(":", "_")
-            p = os.path.join(debug_dir, f"{case_id}.json")
-            with open(p, "w", encoding="utf-8") as f:
+            with open(_debug_path(debug_dir, r), "w", encoding="utf-8") as f:
                 json.dump(r, f, ensure_ascii=False, indent=2)
+
+
+def _debug_path(debug_dir: str, row: Dict[str, Any]) -> str:
+    case_id = (row.get("case_id") or "unknown").replace(":", "_")
+    return os.path.join(debug_dir, f"{case_id}.json")
+
+
+class StreamingReportWriter:
+    """
+    Mismos archivos que write_reports, escritos de a una fila (append + flush): el CSV con CSV_COLUMNS,
+    auditoria.jsonl y cases_debug/. Los resultados quedan en disco a medida que se juzgan.
+    Usar como context manager o llamar close().
+    """
+
+    def __init__(self, path_out_dir: str, write_jsonl: bool = True, write_debug: bool = False):
+        os.makedirs(path_out_dir, exist_ok=True)
+        self.path_out_dir = path_out_dir
+        self.csv_path = os.path.join(path_out_dir, "analisis_no_match.csv")
+        self.jsonl_path = os.path.join(path_out_dir, "auditoria.jsonl") if write_jsonl else None
+        self.debug_dir = os.path.join(path_out_dir, "cases_debug") if write_debug else None
+        if self.debug_dir:
+            os.makedirs(self.debug_dir, exist_ok=True)
+        self._csv_file = open(self.csv_path, "w", encoding="utf-8", newline="")
+        self._csv = csv.DictWriter(
+            self._csv_file, fieldnames=CSV_COLUMNS, extrasaction="ignore", lineterminator=os.linesep
+        )
+        self._csv.writeheader()
+        self._jsonl_file = open(self.jsonl_path, "w", encoding="utf-8") if self.jsonl_path else None
+        self.n_rows = 0
+
+    def write_row(self, row: Dict[str, Any]) -> None:
+        self._csv.writerow(row)
+        self._csv_file.flush()
+        if self._jsonl_file:
+            self._jsonl_file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._jsonl_file.flush()
+        if self.debug_dir:
+            with open(_debug_path(self.debug_dir, row), "w", encoding="utf-8") as f:
+                json.dump(row, f, ensure_ascii=False, indent=2)
+        self.n_rows += 1
+
+    def close(self) -> None:
+        for f in (self._csv_file, self._jsonl_file):
+            if f and not f.closed:
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def update_multiplicidad(
+    path_out_dir: str,
+    multiplicidades: Sequence[int],
+    write_jsonl: bool = True,
+    write_debug: bool = False,
+) -> None:
+    """
+    Reescribe multiplicidad (fila i -> multiplicidades[i], en orden de escritura) en los archivos de
+    StreamingReportWriter, leyéndolos de a una fila (temporal + replace); el resto de cada fila queda igual.
+    """
+    csv_path = os.path.join(path_out_dir, "analisis_no_match.csv")
+    debug_dir = os.path.join(path_out_dir, "cases_debug") if write_debug else None
+    tmp = csv_path + ".tmp"
+    with open(csv_path, encoding="utf-8", newline="") as src, open(tmp, "w", encoding="utf-8", newline="") as dst:
+        writer = csv.DictWriter(dst, fieldnames=CSV_COLUMNS, extrasaction="ignore", lineterminator=os.linesep)
+        writer.writeheader()
+        for row, mult in zip(csv.DictReader(src), multiplicidades):
+            row["multiplicidad"] = mult
+            writer.writerow(row)
+            if debug_dir:
+                path = _debug_path(debug_dir, row)
+                with open(path, encoding="utf-8") as f:
+                    case = json.load(f)
+                case["multiplicidad"] = mult
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(case, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, csv_path)
+    if write_jsonl:
+        jsonl_path = os.path.join(path_out_dir, "auditoria.jsonl")
+        tmp = jsonl_path + ".tmp"
+        with open(jsonl_path, encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as dst:
+            for line, mult in zip(src, multiplicidades):
+                row = json.loads(line)
+                row["multiplicidad"] = mult
+                dst.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(tmp, jsonl_path)
@@ -1,26 +1,74 @@
 """
 Índice TF-IDF sobre training phrases y recuperación de candidatos por intent.
 Agregación por intent, score_intent, priorización por flow_ref.
+Las filas del índice quedan agrupadas por intent (offsets intent_starts/intent_ends) para agregar
+por intent con reduceat/argpartition sobre toda una tanda de consultas a la vez.
 """
 import math
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+# Consultas por producto matriz (matrix @ Q.T denso: n_frases x RETRIEVE_CHUNK floats)
+RETRIEVE_CHUNK = 256
+
+# Parámetros del TfidfVectorizer (también forman parte de la clave de la caché del índice)
+VECTORIZER_PARAMS = {"max_features": 5000, "ngram_range": (1, 2), "min_df": 1}
+
 
 def build_training_index(df_training: pd.DataFrame) -> Dict[str, Any]:
     """
     Construye índice TF-IDF sobre phrase_norm.
-    Devuelve dict con: vectorizer, matrix, df (intent, flow, phrase, phrase_norm, row_id).
+    Devuelve dict con: vectorizer, matrix, df (intent, flow, phrase, phrase_norm, row_id) y la tabla
+    por intent: intent_names, intent_flows, intent_starts, intent_ends, intent_log_hits, intent_phrases (y phrases por fila).
+    df y matrix quedan ordenados por intent (orden de primera aparición, estable dentro del intent).
     """
-    texts = df_training["phrase_norm"].fillna("").astype(str).tolist()
-    vectorizer = TfidfVectorizer(max_features=5000, ngram_range=(1, 2), min_df=1)
+    codes, _ = pd.factorize(df_training["intent"], sort=False)
+    codes = np.where(codes < 0, codes.max(initial=-1) + 1, codes)
+    order = np.argsort(codes, kind="stable")
+    df = df_training.iloc[order].reset_index(drop=True)
+    texts = df["phrase_norm"].fillna("").astype(str).tolist()
+    vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
     matrix = vectorizer.fit_transform(texts)
-    return {
+    return assemble_index(vectorizer, matrix, df)
+
+
+def assemble_index(vectorizer, matrix, df: pd.DataFrame) -> Dict[str, Any]:
+    """Arma el dict del índice a partir de vectorizer, matrix y df ya ordenado por intent (build o caché)."""
+    index = {
         "vectorizer": vectorizer,
         "matrix": matrix,
-        "df": df_training.reset_index(drop=True),
+        "df": df,
+    }
+    index.update(_intent_table(df))
+    return index
+
+
+def _intent_table(df: pd.DataFrame) -> Dict[str, Any]:
+    """Offsets y datos por intent sobre df ordenado por intent (filas sin intent al final, fuera de la tabla)."""
+    intents = df["intent"].to_numpy(dtype=object)
+    valid = ~pd.isna(intents)
+    n_valid = int(valid.sum())
+    keys = intents[:n_valid]
+    if n_valid:
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]).astype(np.int64)
+    else:
+        starts = np.zeros(0, dtype=np.int64)
+    ends = np.r_[starts[1:], n_valid].astype(np.int64)
+    flows = df["flow"].to_numpy(dtype=object) if "flow" in df.columns else np.full(len(df), "", dtype=object)
+    phrases = df["phrase"] if "phrase" in df.columns else None
+    return {
+        "phrases": phrases.to_numpy(dtype=object) if phrases is not None else np.full(len(df), "", dtype=object),
+        "intent_names": keys[starts],
+        "intent_flows": flows[starts],
+        "intent_starts": starts,
+        "intent_ends": ends,
+        "intent_log_hits": np.array([math.log(1 + int(h)) for h in ends - starts], dtype=np.float64),
+        "intent_phrases": [
+            phrases.iloc[s:e].dropna().astype(str).tolist() if phrases is not None else []
+            for s, e in zip(starts, ends)
+        ],
     }
 
 
@@ -38,39 +86,79 @@ def retrieve_candidates(
     Devuelve lista de dicts con intent, flow, score, evidence [{phrase, sim}], training_phrases.
     evidence: frases de entrenamiento de ese intent que más se parecieron al trigger (TF-IDF) y su similitud.
     """
-    if not trigger_user_text_norm or not index.get("matrix").size:
-        return []
-    vectorizer = index["vectorizer"]
-    matrix = index["matrix"]
-    df = index["df"]
-    q = vectorizer.transform([trigger_user_text_norm])
-    sims = (matrix @ q.T).toarray().ravel()
-    df = df.copy()
-    df["_sim"] = sims
-    by_intent = df.groupby("intent", sort=False)
-    results = []
-    for intent, grp in by_intent:
-        flow = grp["flow"].iloc[0] if "flow" in grp.columns else ""
-        top_rows = grp.nlargest(evidence_per_intent + 5, "_sim")
-        sim_list = top_rows["_sim"].tolist()
-        max_sim = float(max(sim_list)) if sim_list else 0.0
-        top5 = sim_list[:5]
-        avg_top5 = float(np.mean(top5)) if top5 else 0.0
-        hits = len(grp)
-        score_intent = 0.65 * max_sim + 0.25 * avg_top5 + 0.10 * math.log(1 + hits)
-        if flow_ref and flow_ref not in ("UNKNOWN", "CHIT") and flow == flow_ref:
-            score_intent *= 1.1
-        evidence = [
-            {"phrase": r["phrase"], "sim": float(r["_sim"])}
-            for _, r in top_rows.head(evidence_per_intent).iterrows()
-        ]
-        training_phrases = grp["phrase"].dropna().astype(str).tolist() if "phrase" in grp.columns else []
-        results.append({
-            "intent": intent,
-            "flow": flow,
-            "score": round(score_intent, 4),
-            "evidence": evidence,
-            "training_phrases": training_phrases,
-        })
-    results.sort(key=lambda x: -x["score"])
-    return results[:top_intents]
+    return retrieve_candidates_batch(
+        [trigger_user_text_norm],
+        index,
+        [flow_ref],
+        top_intents=top_intents,
+        evidence_per_intent=evidence_per_intent,
+    )[0]
+
+
+def retrieve_candidates_batch(
+    texts_norm: Sequence[str],
+    index: Dict[str, Any],
+    flow_refs: Sequence[str],
+    top_intents: int = 10,
+    evidence_per_intent: int = 6,
+    chunk_size: Optional[int] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    retrieve_candidates para una tanda de triggers: un solo vectorizer.transform y un producto
+    matrix @ Q.T por bloque de chunk_size consultas; max / media top-5 por intent con reduceat y
+    argpartition sobre los offsets por intent. Devuelve una lista de candidatos por texto, en orden.
+    """
+    results: List[List[Dict[str, Any]]] = [[] for _ in texts_norm]
+    matrix = index.get("matrix")
+    if matrix is None or not matrix.size or not len(index["intent_starts"]):
+        return results
+    pending = [i for i, t in enumerate(texts_norm) if t]
+    chunk_size = chunk_size or RETRIEVE_CHUNK
+    for c in range(0, len(pending), chunk_size):
+        chunk = pending[c:c + chunk_size]
+        q = index["vectorizer"].transform([texts_norm[i] for i in chunk])
+        sims = (matrix @ q.T).toarray()
+        scores = _score_intents(sims, index, [flow_refs[i] for i in chunk])
+        ranked = np.round(scores, 4)
+        for j, i in enumerate(chunk):
+            top = np.argsort(-ranked[:, j], kind="stable")[:top_intents]
+            results[i] = [
+                _candidate(index, g, sims[:, j], float(scores[g, j]), evidence_per_intent)
+                for g in top
+            ]
+    return results
+
+
+def _score_intents(sims: np.ndarray, index: Dict[str, Any], flow_refs: Sequence[str]) -> np.ndarray:
+    """score_intent (n_intents x n_consultas) a partir de las similitudes por frase."""
+    starts = index["intent_starts"]
+    ends = index["intent_ends"]
+    n_rows = int(ends[-1])
+    max_sim = np.maximum.reduceat(sims[:n_rows], starts, axis=0)
+    avg_top5 = np.empty_like(max_sim)
+    for g, (s, e) in enumerate(zip(starts, ends)):
+        block = sims[s:e]
+        if e - s > 5:
+            block = np.partition(block, e - s - 5, axis=0)[e - s - 5:]
+        avg_top5[g] = np.mean(-np.sort(-block, axis=0), axis=0)
+    scores = 0.65 * max_sim + 0.25 * avg_top5 + 0.10 * index["intent_log_hits"][:, None]
+    flows = index["intent_flows"]
+    for j, flow_ref in enumerate(flow_refs):
+        if flow_ref and flow_ref not in ("UNKNOWN", "CHIT"):
+            scores[flows == flow_ref, j] *= 1.1
+    return scores
+
+
+def _candidate(index: Dict[str, Any], g: int, sims: np.ndarray, score: float, evidence_per_intent: int) -> Dict[str, Any]:
+    """Arma el candidato del intent g: evidence = frases con mayor similitud (empates en orden del training)."""
+    s, e = int(index["intent_starts"][g]), int(index["intent_ends"][g])
+    block = sims[s:e]
+    best = np.argsort(-block, kind="stable")[:evidence_per_intent]
+    phrases = index["phrases"]
+    return {
+        "intent": index["intent_names"][g],
+        "flow": index["intent_flows"][g],
+        "score": round(score, 4),
+        "evidence": [{"phrase": phrases[s + k], "sim": float(block[k])} for k in best],
+        "training_phrases": index["intent_phrases"][g],
+    }
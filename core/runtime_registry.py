@@ -0,0 +1,133 @@
+"""
+Registro de runtime a nivel de proceso (GUI, config resident_runtime): el LocalLLM cargado y el índice de training
+quedan vivos entre corridas de analizar_pipeline en lugar de recargar el .gguf y releer el CSV en cada click.
+Invalidación: un LocalLLM por archivo de modelo, que se recarga si cambian el .gguf (tamaño / mtime), n_ctx,
+n_threads u otro parámetro de carga de Llama; el índice, si cambia el contenido del CSV de training.
+preload() hace la carga en un hilo de fondo (vista de Análisis); una corrida que llega antes espera a que termine.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.index_cache import get_training_index, training_cache_key
+from core.llm_cache import VerdictCache, model_identity
+from core.llm_runtime import LLMConfig, judge_cache_scope, new_judge_stats, resolve_model_path
+
+_lock = threading.Lock()
+# model_filename -> (clave de carga, LocalLLM)
+_judges: Dict[str, Tuple[Tuple, Any]] = {}
+_index_lock = threading.Lock()
+# (ruta del CSV, clave de contenido, índice)
+_index: Optional[Tuple[str, str, Dict[str, Any]]] = None
+
+
+def _load_key(cfg: LLMConfig) -> Tuple:
+    """Lo que fija Llama(...) al cargar: identidad del archivo y parámetros de construcción."""
+    identity = model_identity(str(resolve_model_path(cfg.model_filename)))
+    return (
+        identity["path"], identity["size"], identity["mtime_ns"],
+        cfg.n_ctx, cfg.n_threads, cfg.n_batch, cfg.seed, cfg.prefix_cache_mb,
+    )
+
+
+def _local_llm(cfg: LLMConfig):
+    from core.llm_runtime import LocalLLM
+    return LocalLLM(cfg)
+
+
+def get_judge(
+    cfg: LLMConfig,
+    cache: Optional[VerdictCache] = None,
+    loader: Callable[[LLMConfig], Any] = _local_llm,
+    logger_callback=None,
+):
+    """
+    LocalLLM residente para cfg (lo carga si no está o si cambió su clave de carga). Por corrida se actualizan
+    cfg (muestreo), la caché de veredictos y su ámbito, y se ponen en cero las stats.
+    """
+    with _lock:
+        key = _load_key(cfg)
+        entry = _judges.get(cfg.model_filename)
+        if entry is None or entry[0] != key:
+            if entry is not None and logger_callback:
+                logger_callback(f"Modelo {cfg.model_filename} con otra configuración: recargando.")
+            _judges.pop(cfg.model_filename, None)
+            judge = loader(cfg)
+            _judges[cfg.model_filename] = (key, judge)
+        elif logger_callback:
+            logger_callback(f"Modelo {cfg.model_filename} ya cargado (residente).")
+        judge = _judges[cfg.model_filename][1]
+        judge.cfg = cfg
+        judge.cache = cache
+        judge.cache_scope = judge_cache_scope(cfg, key[0]) if cache is not None else None
+        judge.stats = new_judge_stats()
+        return judge
+
+
+def get_index(
+    path_training_csv: str,
+    cache_dir: Optional[str] = None,
+    rebuild: bool = False,
+    logger_callback=None,
+) -> Dict[str, Any]:
+    """Índice de training residente; si el CSV cambió (o rebuild), get_training_index (caché en disco o fit)."""
+    global _index
+    with _index_lock:
+        key = training_cache_key(path_training_csv)
+        if not rebuild and _index is not None and _index[:2] == (path_training_csv, key):
+            if logger_callback:
+                logger_callback("Índice de training en memoria (residente).")
+            return _index[2]
+        index = get_training_index(path_training_csv, cache_dir=cache_dir, rebuild=rebuild, logger_callback=logger_callback)
+        _index = (path_training_csv, key, index)
+        return index
+
+
+def preload(
+    config: Dict[str, Any],
+    path_training_csv: str,
+    cache_dir: Optional[str] = None,
+    logger_callback=None,
+) -> threading.Thread:
+    """
+    Carga en un hilo de fondo el índice y, si config tiene model_filename con backend local, el LocalLLM con el
+    perfil de tuning aplicado (como en la corrida). Si el perfil pide llm_workers > 1 el modelo no se precarga:
+    la corrida usa JudgePool y un LocalLLM residente sería una copia de más.
+    Los errores solo se informan (la corrida vuelve a intentar la carga).
+    """
+    def run():
+        try:
+            if path_training_csv:
+                get_index(path_training_csv, cache_dir=cache_dir)
+            from core.tuning import judge_workers, pipeline_judge_config
+            tuned, cfg = pipeline_judge_config(config)
+            model = cfg is not None and cfg.backend == "local" and judge_workers(tuned) == 1
+            if model:
+                get_judge(cfg)
+            if logger_callback:
+                logger_callback(
+                    "Precarga lista: índice de training" + (" y modelo" if model else "") + " en memoria."
+                )
+        except Exception as e:
+            if logger_callback:
+                logger_callback(f"Precarga incompleta ({type(e).__name__}: {e}).")
+
+    thread = threading.Thread(target=run, name="runtime-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def release_judge(model_filename: str) -> bool:
+    """Suelta el LocalLLM residente de model_filename (p. ej. la corrida pasa a JudgePool); True si había uno."""
+    with _lock:
+        return _judges.pop(model_filename, None) is not None
+
+
+def clear() -> None:
+    """Suelta el modelo y el índice residentes."""
+    global _index
+    with _lock:
+        _judges.clear()
+    with _index_lock:
+        _index = None
@@ -0,0 +1,74 @@
+"""
+Índice de sesiones sobre la tabla de turnos.
+cargar_chats_as_turns deja los turnos ordenados por sesión (contiguos, en orden de turn_index);
+build_session_index arma la tabla de offsets session_id -> (start, end) con arrays numpy,
+así cada caso corta su sesión por posición en lugar de filtrar todo el DataFrame.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def sort_by_session(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ordena filas por sesión (orden de primera aparición), estable: dentro de cada sesión
+    se conserva el orden del archivo. Filas sin session_id quedan al final.
+    Devuelve el DataFrame con índice posicional 0..n-1.
+    """
+    codes, uniques = pd.factorize(df["session_id"], sort=False)
+    codes = np.where(codes < 0, len(uniques), codes)
+    if len(codes) < 2 or bool(np.all(codes[1:] >= codes[:-1])):
+        return df.reset_index(drop=True)
+    order = np.argsort(codes, kind="stable")
+    return df.iloc[order].reset_index(drop=True)
+
+
+def build_session_index(df_turns: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Tabla de offsets sobre df_turns ya ordenado por sesión (ver sort_by_session).
+    Devuelve dict con: session_ids, starts, ends (arrays numpy, fila i = sesión i)
+    y positions (session_id -> i) para lookup O(1).
+    """
+    sids = df_turns["session_id"].to_numpy(dtype=object)
+    n = len(sids)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return {"session_ids": np.array([], dtype=object), "starts": empty, "ends": empty, "positions": {}}
+    missing = pd.isna(sids)
+    keys = np.where(missing, None, sids)
+    change = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(np.r_[True, change]).astype(np.int64)
+    ends = np.r_[starts[1:], n].astype(np.int64)
+    session_ids = keys[starts]
+    positions = {sid: i for i, sid in enumerate(session_ids) if sid is not None}
+    return {"session_ids": session_ids, "starts": starts, "ends": ends, "positions": positions}
+
+
+def session_bounds(session_index: Dict[str, Any], session_id: Any) -> Tuple[int, int]:
+    """(start, end) de la sesión en df_turns; (0, 0) si no existe."""
+    i = session_index["positions"].get(session_id)
+    if i is None:
+        return 0, 0
+    return int(session_index["starts"][i]), int(session_index["ends"][i])
+
+
+def row_session_starts(session_index: Dict[str, Any]) -> np.ndarray:
+    """Por cada fila de df_turns, la posición donde empieza su sesión (para operaciones vectorizadas por sesión)."""
+    starts = session_index["starts"]
+    return np.repeat(starts, session_index["ends"] - starts)
+
+
+def session_slice(
+    df_turns: pd.DataFrame,
+    session_id: Any,
+    session_index: Optional[Dict[str, Any]] = None,
+) -> pd.DataFrame:
+    """
+    Turnos de una sesión ordenados por turn_index.
+    Con session_index: corte posicional O(largo de sesión). Sin índice: filtro por máscara (DataFrames sueltos).
+    """
+    if session_index is not None:
+        start, end = session_bounds(session_index, session_id)
+        return df_turns.iloc[start:end]
+    return df_turns[df_turns["session_id"] == session_id].sort_values("turn_index")
@@ -22,3 +22,6 @@ FLOWS_NEUTRALES = frozenset({
 
 # Paralelismo (ThreadPoolExecutor)
 MAX_WORKERS = min(max((os.cpu_count() or 4) - 1, 1), 8)
+
+# Cola entre la fase paralela (payloads + prompts) y el judge secuencial
+PIPELINE_QUEUE_SIZE = 64
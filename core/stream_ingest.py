@@ -0,0 +1,97 @@
+"""
+Ingesta en streaming para exports de chats de varios GB.
+Lee el CSV por chunks con solo las columnas necesarias, arrastra el ffill de session_id y los
+contadores de turn_index entre chunks, y entrega los casos NO_MATCH (con flow_ref y ventana de
+contexto) apenas se completa cada sesión. La memoria pico queda acotada por el chunk más la sesión
+más larga, no por el tamaño del archivo.
+Supone el export agrupado por sesión (como los exports de Dialogflow): si una sesión reaparece más
+adelante, su turn_index continúa pero el contexto de la parte anterior ya no está disponible.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from core.cases import extract_no_match_cases
+from core.context_builder import attach_flow_ref, build_context_window
+from core.preprocess import CHAT_COL_MAP, derive_turn_columns, normalizar_chats
+from core.sessions import build_session_index
+from core.spec import FLOWS_NEUTRALES, MAX_MSG_CONTEXT
+
+# Filas por chunk de lectura
+STREAM_CHUNK_ROWS = 200_000
+STREAM_COLUMNS = ("session_id", "tipo", "texto", "intent_detectado", "fecha")
+
+
+def _usecols(column: str) -> bool:
+    """Solo columnas necesarias (nombres estándar o alias de CHAT_COL_MAP)."""
+    return column in STREAM_COLUMNS or column in CHAT_COL_MAP
+
+
+def _tail_start(session_ids: np.ndarray) -> int:
+    """Posición donde empieza la última sesión del buffer (puede continuar en el próximo chunk)."""
+    keys = np.where(pd.isna(session_ids), None, session_ids)
+    other = np.flatnonzero(keys != keys[-1])
+    return int(other[-1]) + 1 if len(other) else 0
+
+
+def _finish_block(block: pd.DataFrame, turns_seen: Dict[Any, int]) -> pd.DataFrame:
+    """Columnas de turno para un bloque de sesiones completas; turn_index continúa si la sesión ya se vio."""
+    df = derive_turn_columns(block.reset_index(drop=True))
+    if turns_seen:
+        offset = df["session_id"].map(turns_seen).fillna(0).astype(np.int64)
+        df["turn_index"] = df["turn_index"] + offset
+    for sid, n in df["session_id"].value_counts(sort=False).items():
+        turns_seen[sid] = turns_seen.get(sid, 0) + int(n)
+    return df
+
+
+def iter_session_blocks(path_chat_csv: str, chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Bloques de turnos (mismas columnas que cargar_chats_as_turns) que contienen solo sesiones completas.
+    """
+    pending: Optional[pd.DataFrame] = None
+    last_session = None
+    turns_seen: Dict[Any, int] = {}
+    for chunk in pd.read_csv(path_chat_csv, chunksize=chunk_rows, usecols=_usecols):
+        chunk = chunk.rename(columns=CHAT_COL_MAP)
+        if last_session is not None and len(chunk) and "session_id" in chunk.columns and pd.isna(chunk["session_id"].iloc[0]):
+            # Chunk que empieza a mitad de sesión: el ffill sigue desde la última sesión del chunk anterior
+            chunk["session_id"] = chunk["session_id"].astype(object)
+            chunk.iloc[0, chunk.columns.get_loc("session_id")] = last_session
+        chunk = normalizar_chats(chunk, path_chat_csv)
+        if not len(chunk):
+            continue
+        last_session = chunk["session_id"].iloc[-1]
+        buffer = chunk if pending is None else pd.concat([pending, chunk], ignore_index=True)
+        start = _tail_start(buffer["session_id"].to_numpy(dtype=object))
+        pending = buffer.iloc[start:]
+        if start:
+            yield _finish_block(buffer.iloc[:start], turns_seen)
+    if pending is not None and len(pending):
+        yield _finish_block(pending, turns_seen)
+
+
+def stream_no_match_cases(
+    path_chat_csv: str,
+    max_msgs: int = MAX_MSG_CONTEXT,
+    neutral_flows: Optional[Set[str]] = None,
+    chunk_rows: int = STREAM_CHUNK_ROWS,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Por cada bloque de sesiones completas, la lista de casos (registros de extract_no_match_cases)
+    con flow_ref, last_valid_intent y context_messages ya calculados.
+    """
+    neutral = set(neutral_flows or FLOWS_NEUTRALES)
+    for block in iter_session_blocks(path_chat_csv, chunk_rows):
+        session_index = build_session_index(block)
+        if neutral != set(FLOWS_NEUTRALES):
+            attach_flow_ref(block, neutral, session_index)
+        cases = extract_no_match_cases(block, session_index).to_dict("records")
+        for case in cases:
+            trigger_ref = {"session_id": case["session_id"], "turn_index": case["trigger_turn_index"]}
+            case["context_messages"] = build_context_window(
+                trigger_ref, block, case["flow_ref"], max_msgs, neutral, session_index
+            )
+        if cases:
+            yield cases
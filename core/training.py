@@ -3,7 +3,7 @@ Carga y normalización del dataset de entrenamiento (training phrases).
 Una fila por (intent, phrase) con intent, flow, language, phrase, phrase_norm, row_id.
 """
 import pandas as pd
-from core.preprocess import normalize_text
+from core.preprocess import normalize_texts
 
 
 def load_training_ffill(path: str) -> pd.DataFrame:
@@ -37,7 +37,7 @@ def load_training_ffill(path: str) -> pd.DataFrame:
     df["intent"] = df["intent"].ffill()
     df["phrase"] = df["phrase"].fillna("").astype(str)
     df["language"] = df.get("language", pd.Series(["es"] * len(df))).fillna("es").astype(str)
-    df["phrase_norm"] = df["phrase"].map(normalize_text)
+    df["phrase_norm"] = normalize_texts(df["phrase"])
     df["flow"] = df["intent"].astype(str).map(lambda x: x.split("_")[0] if "_" in x else x)
     df["row_id"] = range(len(df))
     return df[["intent", "flow", "language", "phrase", "phrase_norm", "row_id"]]
@@ -0,0 +1,69 @@
+"""
+Triage determinístico previo al judge: las reglas de post_validate (mismos umbrales STRONG_MATCH / WEAK_MATCH
+de core/spec.py) deciden los casos claros sin LLM; solo el resto ambiguo va al modelo.
+Cada fila del reporte lleva decided_by: triage, llm, llm_large (modelo grande de la cascada), llm_logprobs
+(clasificación, judge_mode=classify) o sin_llm.
+"""
+from typing import Any, Dict, List, Optional
+
+from core.post_validate import has_out_of_domain_words, is_short_trigger, max_evidence_sim, strong_match_candidate
+from core.spec import WEAK_MATCH
+
+DECIDED_BY_TRIAGE = "triage"
+DECIDED_BY_LLM = "llm"
+DECIDED_BY_LLM_LARGE = "llm_large"
+DECIDED_BY_LOGPROBS = "llm_logprobs"
+DECIDED_BY_DEFAULT = "sin_llm"
+
+
+def _verdict(decision: str, flow: str, intents: List[str], relevantes: list, why: str, confidence: float,
+             parameters: Optional[list] = None) -> Dict[str, Any]:
+    """Veredicto con la forma de JSON_SCHEMA_HINT (sin improvements ni frases nuevas: eso queda para el LLM)."""
+    return {
+        "decision": decision,
+        "flow_recommended": flow,
+        "intent_recommended": intents,
+        "intents_relevantes": relevantes,
+        "why": why,
+        "improvements": [],
+        "new_training_phrases": {},
+        "suggested_dialogflow": {"parameters": parameters or [], "contexts": []},
+        "confidence": confidence,
+    }
+
+
+def triage_case(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Veredicto por reglas para un payload del judge, o None si el caso es ambiguo (va al LLM).
+    Decide solo cuando exactamente una regla aplica:
+    - slot_signals + trigger corto (<= 4 palabras): MISSING_PARAMETER_HANDLER en el flow_ref.
+    - evidencia >= STRONG_MATCH de un intent del flow_ref: MISSED_EXISTING_INTENT_IN_FLOW con ese intent.
+    - ninguna evidencia >= WEAK_MATCH y palabras fuera de dominio: OUT_OF_SCOPE.
+    """
+    candidates = payload.get("candidates") or []
+    flow_ref = payload.get("flow_ref") or ""
+    text = payload.get("trigger_user_text") or ""
+    slots = payload.get("slot_signals") or []
+    slot_rule = bool(slots) and is_short_trigger(text)
+    strong = strong_match_candidate(candidates, flow_ref)
+    out_rule = max_evidence_sim(candidates) < WEAK_MATCH and has_out_of_domain_words(text)
+    if slot_rule + (strong is not None) + out_rule != 1:
+        return None
+    if slot_rule:
+        return _verdict(
+            "MISSING_PARAMETER_HANDLER", flow_ref, [], candidates[:3],
+            f"Triage: trigger corto con valor de slot ({', '.join(slots)}) dentro del flow activo.",
+            0.8, parameters=list(slots),
+        )
+    if strong is not None:
+        sim = max((e.get("sim") or 0) for e in strong.get("evidence") or [])
+        return _verdict(
+            "MISSED_EXISTING_INTENT_IN_FLOW", flow_ref, [strong.get("intent", "")], [strong],
+            f"Triage: evidencia {sim:.2f} >= STRONG_MATCH en {strong.get('intent', '')} ({flow_ref}).",
+            round(float(sim), 2),
+        )
+    return _verdict(
+        "OUT_OF_SCOPE", "", [], [],
+        "Triage: sin evidencias >= WEAK_MATCH y texto fuera de dominio.",
+        0.85,
+    )
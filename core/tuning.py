@@ -0,0 +1,224 @@
+"""
+Auto-tuning del judge (analyzer_cli.py tune): benchmark corto sobre una muestra de prompts reales con distintas
+combinaciones de n_threads / n_batch / llm_workers. Mide prefill y decode (tokens/s) y casos/min de punta a punta;
+el perfil ganador (más casos/min) se guarda por host + archivo de modelo en config/tuning_profiles.json y
+analizar_pipeline lo aplica solo (config use_tuning_profile, por defecto true).
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import tempfile
+import time
+from dataclasses import replace
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.config_loader import get_base_path
+from core.judge_pool import pool_threads_per_worker
+from core.llm_runtime import LLMConfig, llm_config_from_pipeline, resolve_model_path
+from core.prompt_budget import approx_token_count
+
+TUNING_PROFILES_FILENAME = "tuning_profiles.json"
+# Prompts de la muestra por combinación
+TUNING_SAMPLE = 8
+TUNING_BATCH_SIZES = (128, 256, 512)
+# Claves del config que fija un perfil
+TUNED_KEYS = ("n_threads", "n_batch", "llm_workers")
+
+
+def tuning_profiles_path(config: Optional[Dict[str, Any]] = None) -> str:
+    """config tuning_profiles_path o config/tuning_profiles.json junto a config.json."""
+    path = ((config or {}).get("tuning_profiles_path") or "").strip()
+    return path or os.path.join(get_base_path(), "config", TUNING_PROFILES_FILENAME)
+
+
+def profile_key(model_filename: str, host: Optional[str] = None) -> str:
+    """Clave del perfil: host + nombre y tamaño del .gguf (0 si no se encuentra)."""
+    try:
+        size = os.path.getsize(resolve_model_path(model_filename))
+    except (FileNotFoundError, OSError):
+        size = 0
+    return f"{host or socket.gethostname()}|{os.path.basename(model_filename)}|{size}"
+
+
+def thread_candidates(cpu: int) -> List[int]:
+    return sorted({max(1, cpu // 4), max(1, cpu // 2), max(1, cpu)})
+
+
+def worker_candidates(cpu: int) -> List[int]:
+    """1 proceso, y 2 / 4 si cada uno se queda con al menos 2 hilos."""
+    return [1] + [w for w in (2, 4) if cpu // w >= 2]
+
+
+def _default_factory(cfg: LLMConfig, n_workers: int):
+    if n_workers > 1:
+        from core.judge_pool import JudgePool
+        return JudgePool(cfg, n_workers)
+    from core.llm_runtime import LocalLLM
+    return LocalLLM(cfg)
+
+
+def benchmark_setting(
+    cfg: LLMConfig,
+    prompts: List[str],
+    n_workers: int = 1,
+    factory: Callable[[LLMConfig, int], Any] = _default_factory,
+    count_tokens: Callable[[str], int] = approx_token_count,
+) -> Dict[str, Any]:
+    """
+    Carga el judge con cfg (n_workers procesos), juzga la muestra en una tanda y mide:
+    load_s, cases_per_min (muestra / tiempo de juicio), prefill_tok_s (tokens del INPUT / ms hasta el primer token:
+    con el prefijo en caché es el prefill efectivo; en la tanda de LocalLLM, tokens de todos los prompts / prefill_wall_ms)
+    y decode_tok_s (tokens generados / tiempo fuera del prefill, agregado de los procesos). errors: prompts sin JSON válido.
+    """
+    t0 = time.perf_counter()
+    judge = factory(cfg, n_workers)
+    load_s = time.perf_counter() - t0
+    try:
+        t1 = time.perf_counter()
+        results = judge.chat_json_batch(prompts)
+        wall = max(time.perf_counter() - t1, 1e-6)
+        stats = dict(judge.stats)
+    finally:
+        close = getattr(judge, "close", None)
+        if close is not None:
+            close()
+    prefill_s = stats.get("prefill_ms", 0) / 1000.0
+    samples = stats.get("prefill_samples", 0)
+    prompt_tokens = sum(count_tokens(p) for p in prompts)
+    mean_tokens = prompt_tokens / max(1, len(prompts))
+    # Tanda de LocalLLM: los prompts se evalúan juntos, el prefill de reloj es el de los pasos que los evaluaron
+    prefill_wall_s = stats.get("prefill_wall_ms", 0) / 1000.0
+    if prefill_wall_s:
+        prefill_tok_s = round(prompt_tokens / prefill_wall_s, 1)
+        decode_s = wall - prefill_wall_s
+    else:
+        prefill_tok_s = round(mean_tokens / (prefill_s / samples), 1) if samples and prefill_s else 0.0
+        decode_s = wall - prefill_s / n_workers
+    return {
+        "n_threads": cfg.n_threads if n_workers == 1 else pool_threads_per_worker(n_workers),
+        "n_batch": cfg.n_batch,
+        "llm_workers": n_workers,
+        "load_s": round(load_s, 2),
+        "cases_per_min": round(60.0 * len(prompts) / wall, 2),
+        "prefill_tok_s": prefill_tok_s,
+        "decode_tok_s": round(stats.get("generated_tokens", 0) / max(decode_s, 1e-6), 1),
+        "errors": sum(isinstance(r, Exception) for r in results),
+    }
+
+
+def format_result(r: Dict[str, Any]) -> str:
+    return (
+        f"n_threads={r['n_threads']:<3} n_batch={r['n_batch']:<4} llm_workers={r['llm_workers']}: "
+        f"{r['cases_per_min']:7.1f} casos/min, prefill {r['prefill_tok_s']:7.1f} tok/s, "
+        f"decode {r['decode_tok_s']:6.1f} tok/s, carga {r['load_s']:.1f} s"
+        + (f", {r['errors']} errores" if r["errors"] else "")
+    )
+
+
+def _score(r: Dict[str, Any]) -> Tuple:
+    # Menos errores primero; después más casos/min
+    return (-r["errors"], r["cases_per_min"])
+
+
+def run_tuning(
+    prompts: List[str],
+    base_cfg: LLMConfig,
+    factory: Callable[[LLMConfig, int], Any] = _default_factory,
+    cpu: Optional[int] = None,
+    count_tokens: Callable[[str], int] = approx_token_count,
+    logger_callback=None,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Búsqueda por coordenadas sobre la grilla (un eje por vez, fijando el mejor valor del anterior): n_threads con
+    1 proceso, después n_batch, después llm_workers (con N procesos cada uno usa núcleos / N hilos).
+    Devuelve (mejor resultado, todos los resultados).
+    """
+    cpu = cpu or os.cpu_count() or 1
+    results: List[Dict[str, Any]] = []
+
+    def measure(n_threads: int, n_batch: int, n_workers: int) -> Dict[str, Any]:
+        cfg = replace(base_cfg, n_threads=n_threads, n_batch=n_batch)
+        r = benchmark_setting(cfg, prompts, n_workers, factory, count_tokens)
+        results.append(r)
+        if logger_callback:
+            logger_callback("  " + format_result(r))
+        return r
+
+    best = max((measure(t, base_cfg.n_batch, 1) for t in thread_candidates(cpu)), key=_score)
+    for b in TUNING_BATCH_SIZES:
+        if b != base_cfg.n_batch:
+            best = max(best, measure(best["n_threads"], b, 1), key=_score)
+    for w in worker_candidates(cpu)[1:]:
+        r = measure(best["n_threads"], best["n_batch"], w)
+        # Con pool, n_threads del perfil queda el de 1 proceso (el pool reparte los núcleos solo)
+        best = max(best, dict(r, n_threads=best["n_threads"]), key=_score)
+    return best, results
+
+
+def load_profiles(path: str) -> Dict[str, Any]:
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_profile(path: str, key: str, result: Dict[str, Any], sample_size: int) -> Dict[str, Any]:
+    """Guarda el perfil de key (los demás hosts / modelos quedan); escritura atómica (temporal + replace)."""
+    profiles = load_profiles(path)
+    profile = {k: result[k] for k in TUNED_KEYS}
+    profile["metrics"] = {k: result[k] for k in ("cases_per_min", "prefill_tok_s", "decode_tok_s", "load_s")}
+    profile["muestra"] = sample_size
+    profile["fecha"] = datetime.now().isoformat(timespec="seconds")
+    profiles[key] = profile
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(profiles, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return profile
+
+
+def apply_tuning_profile(config: Dict[str, Any], logger_callback=None) -> Dict[str, Any]:
+    """
+    Config con n_threads / n_batch / llm_workers del perfil de este host + modelo, si hay uno
+    (use_tuning_profile true, model_filename y backend local). Devuelve una copia; sin perfil, config tal cual.
+    """
+    if not config.get("use_tuning_profile", True) or not config.get("model_filename"):
+        return config
+    if config.get("llm_backend", "local") != "local":
+        return config
+    profile = load_profiles(tuning_profiles_path(config)).get(profile_key(config["model_filename"]))
+    if not profile:
+        return config
+    tuned = dict(config)
+    tuned.update({k: profile[k] for k in TUNED_KEYS if k in profile})
+    if logger_callback:
+        logger_callback(
+            "Perfil de tuning aplicado: " + ", ".join(f"{k}={tuned[k]}" for k in TUNED_KEYS if k in profile)
+            + f" ({profile.get('fecha', '')})."
+        )
+    return tuned
+
+
+def judge_workers(config: Dict[str, Any]) -> int:
+    """Procesos del judge (llm_workers, mínimo 1)."""
+    return max(1, int(config.get("llm_workers", 1) or 1))
+
+
+def pipeline_judge_config(
+    config: Dict[str, Any],
+    logger_callback=None,
+) -> Tuple[Dict[str, Any], Optional[LLMConfig]]:
+    """
+    (config con el perfil de tuning aplicado, LLMConfig del judge o None sin model_filename). Lo usan
+    analizar_pipeline y la precarga de la GUI, así el modelo precargado tiene la misma clave de carga
+    (n_threads, n_batch) que el de la corrida.
+    """
+    tuned = apply_tuning_profile(config, logger_callback)
+    return tuned, llm_config_from_pipeline(tuned) if tuned.get("model_filename") else None
@@ -0,0 +1,79 @@
+"""
+Caché columnar de la tabla de turnos derivada (salida de cargar_chats_as_turns).
+Clave: ruta + tamaño + mtime del CSV de chats + versión del formato. Parquet (pyarrow) si está
+instalado, con proyección de columnas al leer; si no, pickle de pandas como respaldo.
+"""
+import hashlib
+import importlib.util
+import os
+from typing import List, Optional
+
+import pandas as pd
+
+from core.spec import FLOWS_NEUTRALES
+
+TURN_CACHE_VERSION = 1
+
+
+def _parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _cache_prefix(path_chat_csv: str) -> str:
+    """Prefijo por archivo fuente (permite borrar entradas viejas del mismo CSV)."""
+    return hashlib.sha1(os.path.abspath(path_chat_csv).encode("utf-8")).hexdigest()[:12]
+
+
+def turn_cache_path(path_chat_csv: str, cache_dir: str) -> str:
+    """Ruta del archivo de caché para el estado actual (tamaño, mtime) del CSV."""
+    st = os.stat(path_chat_csv)
+    h = hashlib.sha1()
+    h.update(f"{os.path.abspath(path_chat_csv)}|{st.st_size}|{st.st_mtime_ns}|{TURN_CACHE_VERSION}".encode("utf-8"))
+    h.update("|".join(sorted(FLOWS_NEUTRALES)).encode("utf-8"))
+    ext = ".parquet" if _parquet_available() else ".pkl"
+    return os.path.join(cache_dir, "turns", f"{_cache_prefix(path_chat_csv)}-{h.hexdigest()[:16]}{ext}")
+
+
+def load_cached_turns(
+    path_chat_csv: str,
+    cache_dir: str,
+    columns: Optional[List[str]] = None,
+) -> Optional[pd.DataFrame]:
+    """Tabla de turnos cacheada (solo columns si se pide); None si no hay entrada para el estado actual del CSV."""
+    path = turn_cache_path(path_chat_csv, cache_dir)
+    if not os.path.isfile(path):
+        return None
+    try:
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path, columns=columns)
+        df = pd.read_pickle(path)
+    except Exception:
+        return None
+    return df[columns] if columns else df
+
+
+def save_cached_turns(df_turns: pd.DataFrame, path_chat_csv: str, cache_dir: str) -> str:
+    """Escribe la tabla de turnos (atómico: temporal + rename) y borra entradas viejas del mismo CSV."""
+    path = turn_cache_path(path_chat_csv, cache_dir)
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    tmp = path + ".tmp"
+    try:
+        if path.endswith(".parquet"):
+            df_turns.to_parquet(tmp, index=False)
+        else:
+            df_turns.to_pickle(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    prefix = _cache_prefix(path_chat_csv) + "-"
+    for name in os.listdir(folder):
+        old = os.path.join(folder, name)
+        if name.startswith(prefix) and old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
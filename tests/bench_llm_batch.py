@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark de throughput del judge por llm_batch_size: los mismos casos juzgados con chat_json_batch en tandas de
+1 (secuencial, create_chat_completion de a uno) y de N (N secuencias decodificadas juntas con llama_batch, un seq_id
+por caso). Reporta casos/min y tokens generados/s por tamaño. Sin caché de veredictos. No es un test: si no hay
+modelo configurado hace skip.
+
+Uso: python tests/bench_llm_batch.py [--casos N] [--tamanos 1 4 8]
+"""
+import argparse
+import os
+import sys
+import time
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+from core.config_loader import load_config, get_model_filename_from_config
+from core.llm_runtime import LocalLLM, LLMConfig, build_judge_prompt, new_judge_stats, resolve_model_path
+from tests.bench_llm_prefill import _payloads
+
+
+def _medir(model_filename, batch_size, calentamiento, prompts):
+    cfg = LLMConfig(model_filename=model_filename, n_ctx=2048, max_tokens=256, batch_size=batch_size)
+    llm = LocalLLM(cfg)
+    try:
+        # Una tanda de calentamiento (crea el contexto de tandas y evalúa el prefijo) fuera de la medición
+        llm.chat_json_batch(calentamiento[:batch_size])
+        llm.stats = new_judge_stats()
+        t0 = time.perf_counter()
+        for i in range(0, len(prompts), batch_size):
+            llm.chat_json_batch(prompts[i:i + batch_size])
+        segundos = time.perf_counter() - t0
+    finally:
+        llm.close()
+    return segundos, llm.stats["generated_tokens"], llm.stats["parallel_calls"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Casos/min y tokens/s del judge según llm_batch_size.")
+    ap.add_argument("--casos", type=int, default=16)
+    ap.add_argument("--tamanos", type=int, nargs="+", default=[1, 4, 8])
+    args = ap.parse_args()
+
+    model_filename = get_model_filename_from_config(load_config())
+    if not model_filename:
+        print("  [bench_llm_batch] Sin model_path configurado. Skip.")
+        return
+    try:
+        resolve_model_path(model_filename)
+    except FileNotFoundError as e:
+        print(f"  [bench_llm_batch] Modelo no encontrado ({e}). Skip.")
+        return
+
+    # El calentamiento usa casos aparte: la medición va sobre prompts que el modelo no vio
+    prompts = [build_judge_prompt(p) for p in _payloads(args.casos + max(args.tamanos))]
+    medidos, calentamiento = prompts[:args.casos], prompts[args.casos:]
+    print(f"  [bench_llm_batch] {model_filename}, {args.casos} casos")
+    for batch_size in args.tamanos:
+        try:
+            segundos, tokens, paralelos = _medir(model_filename, batch_size, calentamiento, medidos)
+        except (ImportError, OSError) as e:
+            print(f"  [bench_llm_batch] No se pudo cargar la LLM ({e}). Skip.")
+            return
+        print(
+            f"  llm_batch_size {batch_size:<3} {args.casos / segundos * 60:8.1f} casos/min | "
+            f"{tokens / segundos:7.1f} tokens/s | {segundos:6.1f} s"
+            + (f" | {paralelos} en paralelo" if paralelos else " | secuencial")
+        )
+
+
+if __name__ == "__main__":
+    main()
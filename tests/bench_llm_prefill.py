@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark de prefill del judge: ms hasta el primer token por caso, sin reuso del prefijo (KV reseteado antes de
+cada caso, como si cada prompt se evaluara desde cero), con el reuso que ya hace llama-cpp-python del prefijo de
+input_ids en el contexto vivo (llm_prefix_cache_mb = 0, el default) y con LlamaRAMCache + prefijo evaluado al
+cargar (llm_prefix_cache_mb > 0). Sirve para decidir si la caché en RAM compensa su memoria y el save_state por
+completion. No es un test: si no hay modelo configurado hace skip.
+
+Uso: python tests/bench_llm_prefill.py [--casos N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+from core.config_loader import load_config, get_model_filename_from_config
+from core.llm_runtime import LocalLLM, LLMConfig, build_judge_prompt, resolve_model_path
+from tests.payloads import get_ping_payload
+
+
+def _payloads(n):
+    """Variantes del payload de ping: mismo prefijo, sufijo (INPUT) distinto por caso."""
+    base = get_ping_payload()
+    out = []
+    for i in range(n):
+        p = dict(base)
+        p["case_id"] = f"bench-{i}"
+        p["trigger_user_text"] = f"{base.get('trigger_user_text', '')} ({i})"
+        out.append(p)
+    return out
+
+
+# MB de LlamaRAMCache para la medición con caché (llm_prefix_cache_mb viene apagado por defecto)
+BENCH_PREFIX_CACHE_MB = 256
+
+
+def _medir(model_filename, prefix_cache_mb, payloads, resetear):
+    cfg = LLMConfig(model_filename=model_filename, n_ctx=2048, max_tokens=1, early_stop=True, prefix_cache_mb=prefix_cache_mb)
+    t0 = time.perf_counter()
+    llm = LocalLLM(cfg)
+    carga = time.perf_counter() - t0
+    tiempos = []
+    for payload in payloads:
+        if resetear:
+            llm.llm.reset()
+        antes = llm.stats["prefill_ms"]
+        # Una sola completion de 1 token (sin parseo ni reparación): solo interesa el prefill
+        llm._complete(build_judge_prompt(payload), 0.0, 1.0)
+        tiempos.append(llm.stats["prefill_ms"] - antes)
+    return carga, tiempos
+
+
+def _resumen(nombre, carga, tiempos):
+    orden = sorted(tiempos)
+    p90 = orden[min(len(orden) - 1, int(0.9 * len(orden)))]
+    print(
+        f"  {nombre:<18} carga {carga:6.1f} s | prefill por caso: media {statistics.mean(tiempos):7.1f} ms, "
+        f"p50 {statistics.median(tiempos):7.1f} ms, p90 {p90:7.1f} ms"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prefill por caso con y sin reuso del prefijo estático.")
+    ap.add_argument("--casos", type=int, default=20)
+    args = ap.parse_args()
+
+    model_filename = get_model_filename_from_config(load_config())
+    if not model_filename:
+        print("  [bench_llm_prefill] Sin model_path configurado. Skip.")
+        return
+    try:
+        resolve_model_path(model_filename)
+    except FileNotFoundError as e:
+        print(f"  [bench_llm_prefill] Modelo no encontrado ({e}). Skip.")
+        return
+
+    payloads = _payloads(args.casos)
+    try:
+        antes = _medir(model_filename, 0, payloads, resetear=True)
+        vivo = _medir(model_filename, 0, payloads, resetear=False)
+        despues = _medir(model_filename, BENCH_PREFIX_CACHE_MB, payloads, resetear=False)
+    except (ImportError, OSError) as e:
+        print(f"  [bench_llm_prefill] No se pudo cargar la LLM ({e}). Skip.")
+        return
+    print(f"  [bench_llm_prefill] {model_filename}, {args.casos} casos")
+    _resumen("sin reuso", *antes)
+    _resumen("contexto vivo", *vivo)
+    _resumen("prefijo en caché", *despues)
+
+
+if __name__ == "__main__":
+    main()
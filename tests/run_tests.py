@@ -28,6 +28,21 @@ SCRIPTS = [
     "tests/test_slot_signals.py",
     "tests/test_cases.py",
     "tests/test_context_builder.py",
+    "tests/test_sessions.py",
+    "tests/test_retriever.py",
+    "tests/test_index_cache.py",
+    "tests/test_stream_ingest.py",
+    "tests/test_dedup.py",
+    "tests/test_report_writer.py",
+    "tests/test_journal.py",
+    "tests/test_llm_cache.py",
+    "tests/test_judge_pool.py",
+    "tests/test_judge_cascade.py",
+    "tests/test_llm_http.py",
+    "tests/test_runtime_registry.py",
+    "tests/test_tuning.py",
+    "tests/test_worker_ipc.py",
+    "tests/test_triage.py",
     "tests/test_llm_ping.py",
 ]
 
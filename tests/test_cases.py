@@ -37,12 +37,44 @@ s1,bot,NO_MATCH,NO_MATCH
                 pass
     cases = extract_no_match_cases(df_turns)
     assert len(cases) == 1
-    case = cases[0]
+    case = cases.iloc[0]
     assert case["trigger_user_text"] == "Quiero ver mi resumen de cuenta"
     assert case["trigger_user_text_norm"] == "quiero ver mi resumen de cuenta"
     assert "s1" in case["case_id"]
+    assert case["trigger_turn_index"] == 2
+    assert case["bot_no_match_text"] == "NO_MATCH"
+
+
+def test_extract_no_match_cases_por_sesion():
+    """El trigger no cruza sesiones: NO_MATCH sin turno usuario previo en su sesión -> trigger vacío."""
+    csv_content = """session_id,tipo,texto,intent_detectado
+s1,usuario,Marzo,
+s2,bot,No entendí,NO_MATCH
+s1,bot,No entendí,NO_MATCH
+s1,usuario,Con dólares,
+s1,bot,Hola,SALUDO_HI
+s1,bot,No entendí,NO_MATCH
+"""
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".csv", delete=False, encoding="utf-8") as f:
+        f.write(csv_content)
+        f.close()
+    try:
+        df_turns = cargar_chats_as_turns(f.name)
+    finally:
+        try:
+            os.unlink(f.name)
+        except OSError:
+            pass
+    cases = extract_no_match_cases(df_turns).set_index("case_id")
+    assert sorted(cases.index) == ["s1:1", "s1:4", "s2:0"]
+    assert cases.loc["s1:1", "trigger_user_text"] == "Marzo"
+    assert cases.loc["s1:4", "trigger_user_text_norm"] == "con dolares"
+    assert cases.loc["s1:4", "trigger_turn_index"] == 2
+    assert cases.loc["s2:0", "trigger_user_text"] == ""
+    assert cases.loc["s2:0", "trigger_turn_index"] == -1
 
 
 if __name__ == "__main__":
     test_extract_no_match_cases()
+    test_extract_no_match_cases_por_sesion()
     print("test_cases OK")
@@ -9,7 +9,7 @@ _raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _raiz not in sys.path:
     sys.path.insert(0, _raiz)
 
-from core.context_builder import infer_flow_ref, build_context_window
+from core.context_builder import infer_flow_ref, build_context_window, attach_flow_ref
 
 
 def test_infer_flow_ref():
@@ -44,7 +44,32 @@ def test_build_context_window():
     assert any(m.get("texto") == "El del mes pasado" for m in ctx)
 
 
+def test_attach_flow_ref_igual_que_infer_flow_ref():
+    """attach_flow_ref (vectorizado, por turno) coincide con infer_flow_ref tomando cada turno como trigger."""
+    df = pd.DataFrame([
+        {"session_id": "s1", "turn_index": 0, "intent_detectado": "", "flow_from_intent": ""},
+        {"session_id": "s1", "turn_index": 1, "intent_detectado": "SALUDO_HI", "flow_from_intent": "SALUDO"},
+        {"session_id": "s1", "turn_index": 2, "intent_detectado": "CHIT_chat", "flow_from_intent": "CHIT"},
+        {"session_id": "s1", "turn_index": 3, "intent_detectado": "Cuentas_Resumen", "flow_from_intent": "Cuentas"},
+        {"session_id": "s1", "turn_index": 4, "intent_detectado": "NO_MATCH", "flow_from_intent": "NO_MATCH"},
+        {"session_id": "s1", "turn_index": 5, "intent_detectado": "SALUDO_HI", "flow_from_intent": "SALUDO"},
+        {"session_id": "s1", "turn_index": 6, "intent_detectado": "", "flow_from_intent": ""},
+        {"session_id": "s2", "turn_index": 0, "intent_detectado": "CHIT_chat", "flow_from_intent": "CHIT"},
+        {"session_id": "s2", "turn_index": 1, "intent_detectado": "SALUDO_HI", "flow_from_intent": "SALUDO"},
+        {"session_id": "s2", "turn_index": 2, "intent_detectado": "", "flow_from_intent": ""},
+    ])
+    neutral = {"SALUDO", "CHIT", "GENERIC", "NO_MATCH"}
+    attach_flow_ref(df, neutral)
+    for _, row in df.iterrows():
+        trigger_ref = {"session_id": row["session_id"], "turn_index": row["turn_index"]}
+        assert (row["flow_ref"], row["last_valid_intent"]) == infer_flow_ref(trigger_ref, df, neutral)
+    assert (df.loc[6, "flow_ref"], df.loc[6, "last_valid_intent"]) == ("Cuentas", "Cuentas_Resumen")
+    assert (df.loc[9, "flow_ref"], df.loc[9, "last_valid_intent"]) == ("SALUDO", "CHIT_chat")
+    assert (df.loc[7, "flow_ref"], df.loc[7, "last_valid_intent"]) == ("UNKNOWN", "")
+
+
 if __name__ == "__main__":
     test_infer_flow_ref()
     test_build_context_window()
+    test_attach_flow_ref_igual_que_infer_flow_ref()
     print("test_context_builder OK")
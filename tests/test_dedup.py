@@ -0,0 +1,82 @@
+"""
+Test de deduplicación: un representante por (texto normalizado, flow_ref) y resultado replicado a cada case_id.
+"""
+import os
+import sys
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+from core.dedup import dedup_key, dedup_case_batches, fan_out_row
+from core.report_aggregate import InformeAccumulator, build_informe_general
+
+
+def _case(case_id, texto, flow, contexto="hola"):
+    return {
+        "case_id": case_id,
+        "session_id": case_id.split(":")[0],
+        "fecha": "",
+        "trigger_user_text": texto.upper(),
+        "trigger_user_text_norm": texto,
+        "bot_no_match_text": "No entendí",
+        "flow_ref": flow,
+        "last_valid_intent": f"{flow}_X",
+        "context_messages": [{"tipo": "usuario", "texto": contexto}],
+    }
+
+
+def test_dedup_case_batches_representantes():
+    """Solo pasa el primero de cada clave (también entre tandas); counts y members cubren todos los casos."""
+    batches = [
+        [_case("s1:1", "hola", "SALUDO"), _case("s2:1", "hola", "SALUDO"), _case("s3:1", "hola", "Cuentas")],
+        [_case("s4:1", "hola", "SALUDO"), _case("s5:1", "saldo", "Cuentas")],
+    ]
+    counts, dups = {}, []
+    reps = [c["case_id"] for b in dedup_case_batches(batches, counts, dedup_key, lambda k, c: dups.append(c)) for c in b]
+    assert reps == ["s1:1", "s3:1", "s5:1"]
+    assert counts[("hola", "SALUDO")] == 3
+    assert [c["case_id"] for c in dups] == ["s2:1", "s4:1"]
+    assert "context_messages" not in dups[0]
+    # Con contexto en la clave, contextos distintos no se agrupan
+    assert dedup_key(_case("a:1", "hola", "SALUDO", "x"), True) != dedup_key(_case("b:1", "hola", "SALUDO", "y"), True)
+    assert dedup_key(_case("a:1", "hola", "SALUDO", "x"), True) == dedup_key(_case("b:1", "hola", "SALUDO", "x"), True)
+
+
+def test_fan_out_row_y_informe():
+    """Cada caso recibe la decisión del representante con sus propios campos y multiplicidad; el informe cuenta únicos."""
+    batches = [[_case("s1:1", "hola", "SALUDO"), _case("s2:4", "hola", "SALUDO"), _case("s3:1", "saldo", "Cuentas")]]
+    counts, dups = {}, []
+    reps = [c for b in dedup_case_batches(batches, counts, dedup_key, lambda k, c: dups.append((k, c))) for c in b]
+    rep_rows = {
+        dedup_key(c): {
+            "case_id": c["case_id"], "session_id": c["session_id"], "fecha": "", "mensaje_no_match": c["trigger_user_text"],
+            "bot_no_match_text": c["bot_no_match_text"], "flow_ref": c["flow_ref"], "last_valid_intent": c["last_valid_intent"],
+            "decision": "MISSING_TRAINING", "intent_top": f"{c['flow_ref']}_X",
+        }
+        for c in reps
+    }
+    rows = []
+    for c in reps:
+        row = dict(rep_rows[dedup_key(c)], multiplicidad=counts[dedup_key(c)])
+        rows.append(row)
+        rows.extend(fan_out_row(row, d, counts[k]) for k, d in dups if k == dedup_key(c))
+    assert [r["case_id"] for r in rows] == ["s1:1", "s2:4", "s3:1"]
+    assert [r["session_id"] for r in rows] == ["s1", "s2", "s3"]
+    assert [r["multiplicidad"] for r in rows] == [2, 2, 1]
+    assert rows[1]["decision"] == "MISSING_TRAINING"
+    informe = build_informe_general(rows)
+    assert informe["total_casos_no_match"] == 3
+    assert informe["total_casos_unicos"] == 2
+    assert informe["por_flow"]["SALUDO"]["casos_unicos"] == 1
+    # Como en el pipeline: fila a fila, peso 1 en la primera fila de cada clave (la multiplicidad puede estar vieja)
+    acc = InformeAccumulator()
+    for r, w in zip(rows, [1.0, 0.0, 1.0]):
+        acc.add(dict(r, multiplicidad=1), w)
+    assert acc.build() == informe
+
+
+if __name__ == "__main__":
+    test_dedup_case_batches_representantes()
+    test_fan_out_row_y_informe()
+    print("test_dedup OK")
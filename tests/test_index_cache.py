@@ -0,0 +1,78 @@
+"""
+Test de la caché en disco del índice de training: hit devuelve el mismo retrieval; la clave cambia con el CSV.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+from core.index_cache import get_training_index, load_training_index, training_cache_key
+from core.retriever import retrieve_candidates
+
+CSV_INTENTS = """Intent Display Name,Language,Phrase
+Cuentas_Resumen,es,Quiero ver mi cuenta
+,,Resumen de cuenta
+Prestamos_Solicitud,es,Me pueden dar un préstamo?
+,,Necesito un préstamo personal
+"""
+
+
+def test_cache_hit_mismo_retrieval():
+    """Primera llamada construye y guarda; la segunda carga de caché (mmap) y da el mismo retrieval."""
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "Intent.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(CSV_INTENTS)
+        cache_dir = os.path.join(tmp, "cache")
+        logs = []
+        built = get_training_index(path, cache_dir=cache_dir, logger_callback=logs.append)
+        cached = get_training_index(path, cache_dir=cache_dir, logger_callback=logs.append)
+        assert "construido" in logs[0] and "caché" in logs[1] and "cargado" in logs[1]
+        assert list(cached["intent_names"]) == list(built["intent_names"])
+        for text, flow in [("cuanto me pueden dar", "Prestamos"), ("resumen de mi cuenta", "Cuentas")]:
+            assert retrieve_candidates(text, cached, flow) == retrieve_candidates(text, built, flow)
+
+        key = training_cache_key(path)
+        assert load_training_index(cache_dir, key) is not None
+        get_training_index(path, cache_dir=cache_dir, rebuild=True, logger_callback=logs.append)
+        assert "construido" in logs[2]
+
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(",,Cómo saco un préstamo?\n")
+        assert training_cache_key(path) != key
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def test_entrada_incompleta_se_reconstruye():
+    """Entrada parcial o corrupta (falta intent_starts.npy, .npy truncado): None y get_training_index reconstruye."""
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "Intent.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(CSV_INTENTS)
+        cache_dir = os.path.join(tmp, "cache")
+        get_training_index(path, cache_dir=cache_dir)
+        key = training_cache_key(path)
+        entry = os.path.join(cache_dir, "training_index", key)
+        os.remove(os.path.join(entry, "intent_starts.npy"))
+        assert load_training_index(cache_dir, key) is None
+        logs = []
+        get_training_index(path, cache_dir=cache_dir, logger_callback=logs.append)
+        assert "construido" in logs[0] and load_training_index(cache_dir, key) is not None
+        with open(os.path.join(entry, "intent_starts.npy"), "wb") as f:
+            f.write(b"no es npy")
+        assert load_training_index(cache_dir, key) is None
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_cache_hit_mismo_retrieval()
+    test_entrada_incompleta_se_reconstruye()
+    print("test_index_cache OK")
@@ -0,0 +1,78 @@
+"""
+Test del journal del judge: fsync por fila, huella del input y --resume (saltea casos ya juzgados).
+"""
+import os
+import sys
+import tempfile
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+import core.analyzer as analyzer
+from core.journal import JudgeJournal, journal_path, input_fingerprint, load_journal
+
+
+def test_journal_lookup_y_linea_cortada():
+    """Lookup por case_id + huella; una línea cortada al final (crash) se ignora y se compacta al reanudar."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = journal_path(tmp)
+        fp = input_fingerprint("prompt 1", {"model": "m.gguf"})
+        assert fp != input_fingerprint("prompt 1", None)
+        with JudgeJournal(path) as j:
+            j.append("s1:2", fp, {"case_id": "s1:2", "decision": "MISSING_TRAINING"})
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"case_id": "s2:1", "finger')
+        j = JudgeJournal(path, resume=True)
+        assert j.lookup("s1:2", fp)["decision"] == "MISSING_TRAINING"
+        assert j.lookup("s1:2", "otra huella") is None
+        assert j.lookup("s2:1", fp) is None
+        assert j.n_resumed == 1
+        j.append("s2:1", fp, {"case_id": "s2:1"})
+        j.close()
+        assert sorted(load_journal(path)) == ["s1:2", "s2:1"]
+        # Sin resume el journal empieza de cero
+        JudgeJournal(path).close()
+        assert load_journal(path) == {}
+
+
+def test_pipeline_resume_no_vuelve_a_juzgar():
+    """Run cortado (journal parcial): con resume solo se juzgan los casos faltantes y el CSV final es el mismo."""
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+    calls = []
+    original = analyzer._judge_row
+
+    def counting_judge(payload, prompt, llm=None):
+        calls.append(payload["case_id"])
+        return original(payload, prompt, llm)
+
+    analyzer._judge_row = counting_judge
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            config = {"use_cache": False, "max_workers": 2}
+            analyzer.analizar_pipeline(chats, training, tmp, config=dict(config), use_llm=False)
+            n_total = len(calls)
+            with open(os.path.join(tmp, "analisis_no_match.csv"), encoding="utf-8") as f:
+                csv_full = f.read()
+            with open(journal_path(tmp), encoding="utf-8") as f:
+                lines = f.readlines()
+            with open(journal_path(tmp), "w", encoding="utf-8") as f:
+                f.writelines(lines[:2])
+                f.write(lines[2][:10])
+            calls.clear()
+            analyzer.analizar_pipeline(chats, training, tmp, config=dict(config, resume=True), use_llm=False)
+            assert len(calls) == n_total - 2
+            with open(os.path.join(tmp, "analisis_no_match.csv"), encoding="utf-8") as f:
+                assert f.read() == csv_full
+            assert len(load_journal(journal_path(tmp))) == n_total
+    finally:
+        analyzer._judge_row = original
+
+
+if __name__ == "__main__":
+    test_journal_lookup_y_linea_cortada()
+    test_pipeline_resume_no_vuelve_a_juzgar()
+    print("test_journal OK")
@@ -0,0 +1,106 @@
+"""
+Test de la cascada del judge (modelo chico -> grande) con judges falsos: criterio de escalado, carga perezosa,
+stats por nivel, nivel que no carga y el pipeline con cascade_model_path.
+"""
+import csv
+import os
+import sys
+import tempfile
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+import core.llm_runtime as llm_runtime
+from core.judge_cascade import JudgeCascade, needs_escalation, format_cascade_stats, CASCADE_SMALL, CASCADE_LARGE
+from core.llm_runtime import LLMConfig, new_judge_stats
+
+_CONFIANZA = {"chico.gguf": 0.3, "grande.gguf": 0.9}
+
+
+class _FakeJudge:
+    """chat_json_batch: veredicto con la confianza del modelo (_CONFIANZA) y el modelo en why."""
+
+    cargados = []
+
+    def __init__(self, cfg, cache=None):
+        if cfg.model_filename not in _CONFIANZA:
+            raise FileNotFoundError(cfg.model_filename)
+        _FakeJudge.cargados.append(cfg.model_filename)
+        self.cfg = cfg
+        self.stats = new_judge_stats()
+
+    def chat_json_batch(self, prompts):
+        self.stats["calls"] += len(prompts)
+        self.last_generated_tokens_batch = [5] * len(prompts)
+        return [
+            {"decision": "AMBIGUOUS", "why": self.cfg.model_filename, "confidence": _CONFIANZA[self.cfg.model_filename]}
+            for _ in prompts
+        ]
+
+
+def test_needs_escalation():
+    assert needs_escalation({"confidence": 0.5, "review_flag": False}, 0.7)
+    assert needs_escalation({"confidence": 0.9, "review_flag": True}, 0.7)
+    assert not needs_escalation({"confidence": 0.9, "review_flag": False}, 0.7)
+    assert needs_escalation({"confidence": "", "review_flag": False}, 0.7)
+
+
+def test_cascada_carga_perezosa_y_stats():
+    """Ningún modelo se carga hasta que hace falta; stats sumadas de los dos niveles y casos por nivel."""
+    _FakeJudge.cargados = []
+    cascade = JudgeCascade(LLMConfig("chico.gguf"), LLMConfig("grande.gguf"), _FakeJudge)
+    assert _FakeJudge.cargados == []
+    assert [r["why"] for r in cascade.chat_json_batch(["a", "b"])] == ["chico.gguf"] * 2
+    assert _FakeJudge.cargados == ["chico.gguf"]
+    cascade.chat_json_batch(["c"])
+    assert _FakeJudge.cargados == ["chico.gguf"]
+    assert [r["why"] for r in cascade.escalate_batch(["a"])] == ["grande.gguf"]
+    assert cascade.last_generated_tokens_batch == [5]
+    assert _FakeJudge.cargados == ["chico.gguf", "grande.gguf"]
+    assert cascade.tier_stats[CASCADE_SMALL]["cases"] == 3 and cascade.tier_stats[CASCADE_LARGE]["cases"] == 1
+    assert cascade.stats["calls"] == 4 and cascade.stats["escalated_large"] == 1
+    assert "3 casos" in format_cascade_stats(cascade.tier_stats)
+    # Modelo grande que no carga: sus posiciones devuelven el error y no se reintenta la carga
+    roto = JudgeCascade(LLMConfig("chico.gguf"), LLMConfig("no_existe.gguf"), _FakeJudge)
+    results = roto.escalate_batch(["a", "b"])
+    assert all(isinstance(r, FileNotFoundError) for r in results)
+    assert isinstance(roto.escalate_batch(["c"])[0], RuntimeError)
+    assert "no cargó" in format_cascade_stats(roto.tier_stats)
+
+
+def test_pipeline_cascada():
+    """Con cascade_model_path los casos de confianza baja los decide el grande (llm_large); si no carga, queda el chico."""
+    import core.analyzer as analyzer
+
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+    original = llm_runtime.LocalLLM
+    llm_runtime.LocalLLM = _FakeJudge
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            base = {"use_cache": False, "max_workers": 2, "journal": False, "model_filename": "chico.gguf"}
+            leer = lambda d: list(csv.DictReader(open(os.path.join(tmp, d, "analisis_no_match.csv"), encoding="utf-8")))
+            _FakeJudge.cargados = []
+            analyzer.analizar_pipeline(
+                chats, training, os.path.join(tmp, "a"), use_llm=True, config=dict(base, cascade_model_path="grande.gguf"),
+            )
+            rows = [r for r in leer("a") if r["decided_by"] != "triage"]
+            assert rows and {r["decided_by"] for r in rows} == {"llm_large"}
+            assert sorted(_FakeJudge.cargados) == ["chico.gguf", "grande.gguf"]
+            analyzer.analizar_pipeline(
+                chats, training, os.path.join(tmp, "b"), use_llm=True, config=dict(base, cascade_model_path="no_existe.gguf"),
+            )
+            rows = [r for r in leer("b") if r["decided_by"] != "triage"]
+            assert rows and {r["decided_by"] for r in rows} == {"llm"}
+    finally:
+        llm_runtime.LocalLLM = original
+
+
+if __name__ == "__main__":
+    test_needs_escalation()
+    test_cascada_carga_perezosa_y_stats()
+    test_pipeline_cascada()
+    print("test_judge_cascade OK")
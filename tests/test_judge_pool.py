@@ -0,0 +1,147 @@
+"""
+Test del pool de procesos del judge con un LLM falso: orden de resultados, hilos por worker, watchdog
+(worker que muere a mitad de un caso) y el pipeline con llm_workers > 1.
+"""
+import csv
+import json
+import os
+import sys
+import tempfile
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+import core.judge_pool as judge_pool
+from core.judge_pool import JudgePool, pool_threads_per_worker
+from core.llm_cache import VerdictCache
+from core.llm_runtime import LLMConfig, new_judge_stats
+
+
+class _FakeJudge:
+    """chat_json: "crash:<marca>" mata el proceso la primera vez (crea la marca), "crash" siempre, "error" levanta."""
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.stats = new_judge_stats()
+        self.last_generated_tokens = 0
+
+    def chat_json(self, prompt):
+        if prompt == "crash":
+            os._exit(1)
+        if prompt.startswith("crash:"):
+            marca = prompt.split(":", 1)[1]
+            if not os.path.exists(marca):
+                open(marca, "w").close()
+                os._exit(1)
+        if prompt == "error":
+            raise ValueError("salida rota")
+        self.stats["calls"] += 1
+        self.last_generated_tokens = len(prompt)
+        return {"decision": "AMBIGUOUS", "why": prompt[-20:], "threads": self.cfg.n_threads, "confidence": 0.4}
+
+    def classify_decision(self, prompt):
+        self.stats["classified"] += 1
+        return {"AMBIGUOUS": 0.9, "OUT_OF_SCOPE": 0.1} if prompt == "a" else {"AMBIGUOUS": 0.1, "OUT_OF_SCOPE": 0.9}
+
+
+def _fake_factory(cfg):
+    return _FakeJudge(cfg)
+
+
+def _failing_factory(cfg):
+    raise OSError("sin modelo")
+
+
+def test_pool_orden_e_hilos():
+    """map devuelve en orden; cada worker recibe núcleos / N hilos; stats agregadas de todos los procesos."""
+    with JudgePool(LLMConfig(model_filename="m.gguf"), 2, factory=_fake_factory) as pool:
+        prompts = [f"p{i}" for i in range(7)]
+        results = pool.map(prompts)
+        assert [r["why"] for r, _ in results] == prompts
+        assert [n for _, n in results] == [len(p) for p in prompts]
+        assert {r["threads"] for r, _ in results} == {pool_threads_per_worker(2)}
+        assert pool.stats["calls"] == 7
+        assert [r["why"] for r in pool.chat_json_batch(["x", "yy"])] == ["x", "yy"]
+        assert pool.last_generated_tokens_batch == [1, 2] and pool.stats["batches"] == 1
+        probs = pool.classify_batch(["a", "b", "a"])
+        assert [max(p, key=p.get) for p in probs] == ["AMBIGUOUS", "OUT_OF_SCOPE", "AMBIGUOUS"]
+        assert pool.stats["classified"] == 3
+    assert pool_threads_per_worker(4, total=32) == 8
+    assert pool_threads_per_worker(64, total=32) == 1
+
+
+def test_pool_watchdog_reencola():
+    """Worker muerto a mitad de un caso: se reinicia y el caso se reintenta; si muere siempre, queda como error."""
+    with tempfile.TemporaryDirectory() as tmp:
+        marca = os.path.join(tmp, "murio")
+        with JudgePool(LLMConfig(model_filename="m.gguf"), 2, factory=_fake_factory, max_case_retries=1) as pool:
+            results = pool.map(["a", "crash:" + marca, "b", "error", "crash"])
+            assert results[0][0]["why"] == "a" and results[2][0]["why"] == "b"
+            assert results[1][0]["why"] == ("crash:" + marca)[-20:]
+            assert isinstance(results[3][0], RuntimeError) and "salida rota" in str(results[3][0])
+            assert isinstance(results[4][0], RuntimeError)
+            assert pool.stats["worker_restarts"] == 3
+            assert pool.map(["c"])[0][0]["why"] == "c"
+
+
+def test_pool_carga_fallida_y_cache():
+    """Si ningún worker carga, el constructor falla; con caché, un prompt ya juzgado no va a los workers."""
+    try:
+        JudgePool(LLMConfig(model_filename="m.gguf"), 2, factory=_failing_factory)
+        raise AssertionError("debió fallar")
+    except RuntimeError as e:
+        assert "sin modelo" in str(e)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = VerdictCache(os.path.join(tmp, "v.sqlite"))
+        with JudgePool(LLMConfig(model_filename="m.gguf"), 2, factory=_fake_factory, cache=cache, cache_scope="s") as pool:
+            pool.map(["x", "y"])
+            assert pool.map(["x", "y", "z"])[0][0]["why"] == "x"
+            assert pool.stats["calls"] == 3
+        cache.close()
+
+
+def test_pipeline_con_pool():
+    """analizar_pipeline con llm_workers=2: mismas filas que sin LLM, veredicto del pool en cada una."""
+    # Import local: los workers (spawn) importan este módulo y no necesitan pandas / sklearn
+    import core.analyzer as analyzer
+
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+
+    class _FakePool(JudgePool):
+        def __init__(self, cfg, n_workers, **kwargs):
+            kwargs["factory"] = _fake_factory
+            super().__init__(cfg, n_workers, **kwargs)
+
+    original = judge_pool.JudgePool
+    judge_pool.JudgePool = _FakePool
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            base = {"use_cache": False, "max_workers": 2, "journal": False}
+            analyzer.analizar_pipeline(chats, training, os.path.join(tmp, "a"), config=dict(base), use_llm=False)
+            analyzer.analizar_pipeline(
+                chats, training, os.path.join(tmp, "b"), use_llm=True,
+                config=dict(base, model_filename="m.gguf", llm_workers=2, llm_cache=False),
+            )
+            leer = lambda d: list(csv.DictReader(open(os.path.join(tmp, d, "analisis_no_match.csv"), encoding="utf-8")))
+            sin_llm, con_pool = leer("a"), leer("b")
+            assert sorted(r["case_id"] for r in sin_llm) == sorted(r["case_id"] for r in con_pool)
+            with open(os.path.join(tmp, "b", "auditoria.jsonl"), encoding="utf-8") as f:
+                audit = [json.loads(line) for line in f]
+            juzgadas = [r for r in audit if r.get("generated_tokens")]
+            assert juzgadas and len(juzgadas) <= len(audit)
+            # Los casos que decide el triage no pasan por el pool
+            assert all(r["decision"] == "AMBIGUOUS" for r in audit if r["decided_by"] == "llm")
+    finally:
+        judge_pool.JudgePool = original
+
+
+if __name__ == "__main__":
+    test_pool_orden_e_hilos()
+    test_pool_watchdog_reencola()
+    test_pool_carga_fallida_y_cache()
+    test_pipeline_con_pool()
+    print("test_judge_pool OK")
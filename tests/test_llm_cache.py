@@ -0,0 +1,81 @@
+"""
+Test de la caché de veredictos del judge (SQLite): hit / miss, clave por modelo + muestreo + prompt, tope LRU.
+"""
+import os
+import sys
+import tempfile
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+from core.llm_cache import VerdictCache, model_identity, verdict_scope, verdict_key
+from core.llm_runtime import LocalLLM, LLMConfig, SYSTEM_JSON_ONLY, sampling_params, new_judge_stats
+
+
+class _FakeLlama:
+    """Simula llama_cpp.Llama.create_chat_completion y cuenta llamadas."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def create_chat_completion(self, messages, **kwargs):
+        self.calls += 1
+        return {"choices": [{"message": {"content": '{"decision": "OUT_OF_SCOPE", "confidence": 0.9}'}}]}
+
+
+def _fake_llm(cache, model_path, **cfg_kwargs):
+    """LocalLLM sin llama-cpp: mismo estado que arma __init__, con backend falso."""
+    llm = LocalLLM.__new__(LocalLLM)
+    llm.cfg = LLMConfig(model_filename=os.path.basename(model_path), early_stop=False, **cfg_kwargs)
+    llm.stats = new_judge_stats()
+    llm.cache = cache
+    llm.cache_scope = verdict_scope(model_identity(model_path), sampling_params(llm.cfg), SYSTEM_JSON_ONLY)
+    llm.llm = _FakeLlama()
+    return llm
+
+
+def test_verdict_cache_hit_miss_y_lru():
+    """get/put persisten entre aperturas; al pasar el tope se borran las menos usadas."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "v.sqlite")
+        cache = VerdictCache(path, max_entries=2)
+        assert cache.get("a") is None
+        cache.put("a", {"decision": "AMBIGUOUS"})
+        cache.put("b", {"decision": "FLOW_SWITCH"})
+        assert cache.get("a")["decision"] == "AMBIGUOUS"
+        cache.put("c", {"decision": "OUT_OF_SCOPE"})
+        assert cache.prune() == 1
+        assert cache.get("b") is None
+        assert (cache.hits, cache.misses) == (1, 2)
+        cache.close()
+        again = VerdictCache(path, max_entries=2)
+        assert again.get("a")["decision"] == "AMBIGUOUS"
+        assert len(again) == 2
+        again.close()
+
+
+def test_local_llm_usa_cache():
+    """Mismo prompt + mismo modelo / muestreo: el segundo chat_json no llama al modelo; otra temperatura sí."""
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, "m.gguf")
+        with open(model_path, "wb") as f:
+            f.write(b"gguf")
+        cache = VerdictCache(os.path.join(tmp, "v.sqlite"))
+        llm = _fake_llm(cache, model_path)
+        first = llm.chat_json("prompt X")
+        first["confidence"] = 0.0
+        assert llm.chat_json("prompt X") == {"decision": "OUT_OF_SCOPE", "confidence": 0.9}
+        assert llm.llm.calls == 1
+        other = _fake_llm(cache, model_path, temperature=0.7)
+        other.chat_json("prompt X")
+        assert other.llm.calls == 1
+        assert verdict_key(llm.cache_scope, "prompt X") != verdict_key(other.cache_scope, "prompt X")
+        assert (cache.hits, cache.misses) == (1, 2)
+        cache.close()
+
+
+if __name__ == "__main__":
+    test_verdict_cache_hit_miss_y_lru()
+    test_local_llm_usa_cache()
+    print("test_llm_cache OK")
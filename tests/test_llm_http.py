@@ -0,0 +1,167 @@
+"""
+Test del backend HTTP del judge (HttpJudge) contra un servidor falso compatible con OpenAI (ThreadingHTTPServer):
+orden de la tanda, límite de concurrencia, keep-alive, reparación de JSON, caché y el pipeline con llm_backend=http.
+"""
+import csv
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+from core.llm_cache import VerdictCache
+from core.llm_runtime import HttpJudge, LLMConfig, make_judge
+
+
+class _FakeServer:
+    """
+    /v1/models y /v1/chat/completions. El veredicto repite el final del INPUT en why; si el INPUT termina en
+    "roto" la primera respuesta no es JSON. Cuenta requests, conexiones y requests en vuelo (máximo).
+    """
+
+    def __init__(self, delay=0.05):
+        estado = self
+        self.delay = delay
+        self.requests = 0
+        self.conexiones = set()
+        self.en_vuelo = 0
+        self.max_en_vuelo = 0
+        self.lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, data):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._send({"object": "list", "data": [{"id": "fake.gguf"}]})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with estado.lock:
+                    estado.requests += 1
+                    estado.conexiones.add(self.client_address)
+                    estado.en_vuelo += 1
+                    estado.max_en_vuelo = max(estado.max_en_vuelo, estado.en_vuelo)
+                time.sleep(estado.delay)
+                user = body["messages"][-1]["content"]
+                if user.endswith("roto"):
+                    content = "no es json"
+                else:
+                    content = json.dumps({"decision": "AMBIGUOUS", "why": user[-12:], "confidence": 0.4})
+                with estado.lock:
+                    estado.en_vuelo -= 1
+                self._send({"choices": [{"message": {"content": content}}], "usage": {"completion_tokens": 7}})
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def test_http_tanda_concurrente():
+    """Tanda en orden, hasta concurrency requests en vuelo, conexiones reutilizadas, duplicados una vez."""
+    server = _FakeServer()
+    try:
+        judge = make_judge(LLMConfig(model_filename="m.gguf", backend="http", server_url=server.url, concurrency=3))
+        assert isinstance(judge, HttpJudge) and judge.server_model == "fake.gguf"
+        prompts = [f"caso-{i}" for i in range(9)] + ["caso-0"]
+        results = judge.chat_json_batch(prompts)
+        assert [r["why"] for r in results] == [p[-12:] for p in prompts]
+        assert judge.last_generated_tokens_batch == [7] * 9 + [0]
+        assert server.requests == 9 and 1 < server.max_en_vuelo <= 3
+        assert len(server.conexiones) <= 3
+        judge.chat_json_batch([f"otro-{i}" for i in range(6)])
+        assert len(server.conexiones) <= 3
+        assert judge.stats["calls"] == 15 and judge.stats["http_requests"] == 15 and judge.stats["batches"] == 2
+        assert judge.chat_json("suelto")["why"] == "suelto" and judge.last_generated_tokens == 7
+        assert not judge.supports_classify
+        judge.close()
+    finally:
+        server.close()
+
+
+def test_http_reparacion_y_cache():
+    """Salida no JSON: segunda request de reparación; con caché, lo ya juzgado no vuelve al servidor."""
+    server = _FakeServer(delay=0)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = VerdictCache(os.path.join(tmp, "v.sqlite"))
+            judge = HttpJudge(LLMConfig(model_filename="m.gguf", backend="http", server_url=server.url), cache=cache)
+            results = judge.chat_json_batch(["a roto", "b"])
+            # La reparación reenvía el texto no JSON en otro INPUT, que el servidor sí contesta con JSON
+            assert results[0]["why"].endswith("no es json") and results[1]["why"] == "b"
+            assert judge.stats["repairs"] == 1 and judge.stats["repair_failures"] == 0
+            assert judge.stats["http_requests"] == 3
+            antes = server.requests
+            assert judge.chat_json_batch(["b"])[0]["why"] == "b" and server.requests == antes
+            judge.close()
+            cache.close()
+    finally:
+        server.close()
+
+
+def test_http_sin_servidor():
+    """Servidor caído: el constructor falla (el pipeline sigue sin judge); backend desconocido: ValueError."""
+    try:
+        HttpJudge(LLMConfig(model_filename="m.gguf", backend="http", server_url="http://127.0.0.1:9"))
+        raise AssertionError("debió fallar")
+    except ConnectionError:
+        pass
+    try:
+        make_judge(LLMConfig(model_filename="m.gguf", backend="grpc"))
+        raise AssertionError("debió fallar")
+    except ValueError:
+        pass
+
+
+def test_pipeline_http():
+    """analizar_pipeline con llm_backend=http: los casos que no decide el triage los juzga el servidor."""
+    from core.analyzer import analizar_pipeline
+
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+    server = _FakeServer(delay=0)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            analizar_pipeline(
+                chats, training, tmp, use_llm=True,
+                config={
+                    "use_cache": False, "max_workers": 2, "journal": False, "model_filename": "m.gguf",
+                    "llm_backend": "http", "llm_server_url": server.url, "llm_concurrency": 2,
+                },
+            )
+            with open(os.path.join(tmp, "analisis_no_match.csv"), encoding="utf-8") as f:
+                rows = [r for r in csv.DictReader(f) if r["decided_by"] == "llm"]
+        assert rows and server.requests >= len({r["case_id"] for r in rows}) > 0
+        assert all(r["decision"] == "AMBIGUOUS" for r in rows)
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    test_http_tanda_concurrente()
+    test_http_reparacion_y_cache()
+    test_http_sin_servidor()
+    test_pipeline_http()
+    print("test_llm_http OK")
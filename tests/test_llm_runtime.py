@@ -1,14 +1,25 @@
 """
 Test de parseo JSON del judge (respuesta mock).
 """
+import ctypes
+import json
 import os
 import sys
+import tempfile
+import time
+from types import SimpleNamespace
 
 _raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _raiz not in sys.path:
     sys.path.insert(0, _raiz)
 
-from core.llm_runtime import extract_json_object, safe_json_loads
+from core.llm_runtime import (
+    extract_json_object, safe_json_loads, JsonObjectScanner, LocalLLM, LLMConfig, JUDGE_JSON_SCHEMA, new_judge_stats, format_judge_stats,
+    JUDGE_PROMPT_PREFIX, SYSTEM_JSON_ONLY, build_judge_prompt, sample_token,
+)
+import core.llm_runtime as llm_runtime
+import numpy as np
+from core.llm_runtime import DECISION_LABELS, decision_margin, needs_full_judge
 
 
 def test_extract_json_object_plain():
@@ -40,8 +51,537 @@ def test_extract_json_object_nested():
     assert obj["intents_relevantes"][0]["intent"] == "X"
 
 
+class _ScriptedLlama:
+    """Devuelve las respuestas dadas en orden (con stream=True, un chunk por token) y guarda los kwargs."""
+
+    def __init__(self, respuestas):
+        self.respuestas = list(respuestas)
+        self.kwargs = []
+        self.messages = []
+        self.streamed = 0
+
+    def create_chat_completion(self, messages, **kwargs):
+        self.kwargs.append(kwargs)
+        self.messages.append(messages)
+        text = self.respuestas.pop(0)
+        if not kwargs.get("stream"):
+            return {"choices": [{"message": {"content": text}}], "usage": {"completion_tokens": len(text.split())}}
+        return self._stream(text.split(" "))
+
+    def _stream(self, tokens):
+        yield {"choices": [{"delta": {"role": "assistant"}}]}
+        for i, tok in enumerate(tokens):
+            self.streamed += 1
+            yield {"choices": [{"delta": {"content": tok if i == 0 else " " + tok}}]}
+
+
+def _scripted_llm(respuestas, **cfg_kwargs):
+    llm = LocalLLM.__new__(LocalLLM)
+    llm.cfg = LLMConfig(model_filename="m.gguf", **cfg_kwargs)
+    llm.stats = new_judge_stats()
+    llm.last_generated_tokens = 0
+    llm.cache = None
+    llm.llm = _ScriptedLlama(respuestas)
+    return llm
+
+
+def test_judge_schema_enum():
+    """El schema derivado de JSON_SCHEMA_HINT restringe decision al enum y pide todas las claves."""
+    assert "AMBIGUOUS" in JUDGE_JSON_SCHEMA["properties"]["decision"]["enum"]
+    assert "confidence" in JUDGE_JSON_SCHEMA["required"]
+    assert JUDGE_JSON_SCHEMA["properties"]["confidence"]["type"] == "number"
+
+
+def test_chat_json_reparacion_contada():
+    """Salida no JSON: segunda completion de reparación, contada en stats; constrained_json pasa response_format."""
+    llm = _scripted_llm(["no sé", '{"decision": "AMBIGUOUS"}', '{"decision": "FLOW_SWITCH"}'], early_stop=False)
+    assert llm.chat_json("p")["decision"] == "AMBIGUOUS"
+    assert (llm.stats["calls"], llm.stats["repairs"], llm.stats["repair_failures"]) == (1, 1, 0)
+    assert "response_format" not in llm.llm.kwargs[0]
+    llm.cfg.constrained_json = True
+    assert llm.chat_json("p")["decision"] == "FLOW_SWITCH"
+    assert llm.llm.kwargs[-1]["response_format"]["schema"] is JUDGE_JSON_SCHEMA
+    assert "(50.0%)" in format_judge_stats(llm.stats)
+
+
+def test_json_object_scanner():
+    """Cierra en la llave que balancea el primer objeto; llaves y comillas escapadas dentro de strings no cuentan."""
+    sc = JsonObjectScanner()
+    assert not sc.feed('Respuesta: {"why": "usa } y \\" {", ')
+    assert sc.feed('"x": {"y": 1}} y sigue {')
+    assert sc.text_so_far == 'Respuesta: {"why": "usa } y \\" {", "x": {"y": 1}}'
+    assert safe_json_loads(sc.text_so_far)["x"] == {"y": 1}
+
+
+def test_chat_json_early_stop():
+    """Con early_stop (streaming) deja de leer tokens al cerrar el JSON y cuenta los generados."""
+    llm = _scripted_llm(['{"decision": "OUT_OF_SCOPE", "confidence": 0.9} Explicación: esto sigue y sigue y sigue'])
+    assert llm.chat_json("p") == {"decision": "OUT_OF_SCOPE", "confidence": 0.9}
+    assert llm.llm.kwargs[0]["stream"] is True
+    assert llm.llm.streamed == 4
+    assert llm.last_generated_tokens == 4
+    assert llm.stats["early_stops"] == 1
+
+
+def test_prefix_cache_warm():
+    """Al cargar: LlamaRAMCache + una evaluación de system + prefijo; cada caso repite ese prefijo y mide el prefill."""
+    creados = []
+
+    class _FakeLlama(_ScriptedLlama):
+        def __init__(self, **kwargs):
+            super().__init__(['{"decision": "AMBIGUOUS"}', '{"decision": "AMBIGUOUS"}', '{"decision": "OUT_OF_SCOPE"}'])
+            self.cache = None
+            creados.append(self)
+
+        def set_cache(self, cache):
+            self.cache = cache
+
+    orig = (llm_runtime.Llama, llm_runtime.LlamaRAMCache, os.environ.get("MODEL_PATH"))
+    with tempfile.TemporaryDirectory() as tmp:
+        model = os.path.join(tmp, "m.gguf")
+        open(model, "wb").close()
+        os.environ["MODEL_PATH"] = model
+        llm_runtime.Llama = _FakeLlama
+        llm_runtime.LlamaRAMCache = lambda capacity_bytes: {"capacity_bytes": capacity_bytes}
+        try:
+            llm = LocalLLM(LLMConfig(model_filename="m.gguf", prefix_cache_mb=8))
+            fake = creados[-1]
+            assert llm.prefix_cached
+            assert fake.cache == {"capacity_bytes": 8 << 20}
+            assert fake.messages[0] == [
+                {"role": "system", "content": SYSTEM_JSON_ONLY},
+                {"role": "user", "content": JUDGE_PROMPT_PREFIX},
+            ]
+            assert fake.kwargs[0]["max_tokens"] == 1
+            for motivo in ("uno", "dos"):
+                llm.judge_case({"trigger_user_text": motivo})
+            user_a, user_b = fake.messages[1][1]["content"], fake.messages[2][1]["content"]
+            assert user_a.startswith(JUDGE_PROMPT_PREFIX) and user_b.startswith(JUDGE_PROMPT_PREFIX)
+            assert user_a == build_judge_prompt({"trigger_user_text": "uno"}) and user_a != user_b
+            assert (llm.stats["calls"], llm.stats["prefill_samples"]) == (2, 2)
+            assert "prefill" in format_judge_stats(llm.stats)
+            sin = LocalLLM(LLMConfig(model_filename="m.gguf", prefix_cache_mb=0))
+            assert not sin.prefix_cached and creados[-1].cache is None and creados[-1].messages == []
+        finally:
+            llm_runtime.Llama, llm_runtime.LlamaRAMCache = orig[0], orig[1]
+            if orig[2] is None:
+                os.environ.pop("MODEL_PATH", None)
+            else:
+                os.environ["MODEL_PATH"] = orig[2]
+
+
+def test_chat_json_batch():
+    """Tanda en orden: el error de un prompt queda en su posición, un prompt repetido se juzga una vez."""
+    llm = _scripted_llm(['{"decision": "FLOW_SWITCH"}', "nada", "tampoco", '{"decision": "OUT_OF_SCOPE"}'], early_stop=False)
+    results = llm.chat_json_batch(["a", "b", "a", "c"])
+    assert results[0] == {"decision": "FLOW_SWITCH"} and results[2] == results[0] and results[2] is not results[0]
+    assert isinstance(results[1], ValueError)
+    assert results[3] == {"decision": "OUT_OF_SCOPE"}
+    assert llm.last_generated_tokens_batch == [2, 2, 0, 2]
+    assert (llm.stats["calls"], llm.stats["batches"]) == (3, 1)
+    assert "1 tandas" in format_judge_stats(llm.stats)
+
+
+class _BatchLib:
+    """
+    API de bajo nivel falsa (llama_batch / llama_decode): KV por seq_id, tokens = bytes (BOS 0, EOG 256). Los
+    logits de cada secuencia empujan '{"eco": "<mensaje del usuario>"} y sigue' después del turno del asistente
+    ("roto" responde sin JSON); guarda los seq_id de cada llama_decode.
+    """
+
+    def __init__(self):
+        self.kv = {}
+        self.llamadas = []
+        self.params = None
+        self._logits = {}
+
+    def llama_context_default_params(self):
+        return SimpleNamespace(n_ctx=512, n_batch=512, n_ubatch=512, n_seq_max=1, n_threads=4, n_threads_batch=4, kv_unified=False)
+
+    def llama_init_from_model(self, model, params):
+        self.params = params
+        return "ctx"
+
+    def llama_batch_init(self, n_tokens, embd, n_seq_max):
+        return SimpleNamespace(
+            token=[0] * n_tokens, pos=[0] * n_tokens, n_seq_id=[0] * n_tokens,
+            seq_id=[[0] * n_seq_max for _ in range(n_tokens)], logits=[False] * n_tokens, n_tokens=0,
+        )
+
+    def llama_decode(self, ctx, batch):
+        time.sleep(0.002)
+        self._logits = {}
+        self.llamadas.append([batch.seq_id[k][0] for k in range(batch.n_tokens)])
+        for k in range(batch.n_tokens):
+            cells = self.kv.setdefault(batch.seq_id[k][0], {})
+            assert set(range(batch.pos[k])) <= set(cells), "posición sin las anteriores en el KV de la secuencia"
+            cells[batch.pos[k]] = batch.token[k]
+            if batch.logits[k]:
+                self._logits[k] = self._siguiente([cells[p] for p in range(batch.pos[k] + 1)])
+        return 0
+
+    def _siguiente(self, toks):
+        texto = bytes(t for t in toks[1:] if t < 256).decode("utf-8")
+        user = texto.rsplit("<|im_start|>user\n", 1)[1].split("<|im_end|>", 1)[0]
+        hecho = texto.rsplit("<|im_start|>assistant\n", 1)[1]
+        objetivo = "sin json" if user == "roto" else '{"eco": "%s"} y sigue' % user
+        logits = np.zeros(257, dtype=np.float32)
+        logits[ord(objetivo[len(hecho)]) if len(hecho) < len(objetivo) else 256] = 30.0
+        return logits
+
+    def llama_get_logits_ith(self, ctx, i):
+        return self._logits[i].ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+
+    def llama_get_memory(self, ctx):
+        return "mem"
+
+    def llama_memory_seq_rm(self, mem, seq, p0, p1):
+        self.kv[seq] = {p: t for p, t in self.kv.get(seq, {}).items() if not (p >= max(p0, 0) and (p1 < 0 or p < p1))}
+
+    def llama_memory_seq_cp(self, mem, src, dst, p0, p1):
+        self.kv.setdefault(dst, {}).update({p: t for p, t in self.kv[src].items() if p0 <= p < p1})
+
+    def llama_model_get_vocab(self, model):
+        return "vocab"
+
+    def llama_token_is_eog(self, vocab, tok):
+        return tok == 256
+
+    def llama_batch_free(self, batch):
+        pass
+
+    def llama_free(self, ctx):
+        pass
+
+
+class _BatchLlama(_ScriptedLlama):
+    model = "modelo"
+    metadata = {}
+
+    def tokenize(self, text, add_bos=True, special=False):
+        return ([0] if add_bos else []) + list(text)
+
+    def detokenize(self, tokens):
+        return bytes(t for t in tokens if t < 256)
+
+    def n_vocab(self):
+        return 257
+
+    def token_eos(self):
+        return 256
+
+
+def test_chat_json_batch_multisecuencia():
+    """
+    Con la API de bajo nivel la tanda se decodifica junta: llama_decode con varios seq_id, el prefijo evaluado una vez
+    y copiado, seq_id liberados para los prompts que esperan; resultados en orden, salida no JSON reparada.
+    """
+    lib = _BatchLib()
+    llm = _scripted_llm([], batch_size=2)
+    llm.llm = _BatchLlama(['{"eco": "reparado"}'])
+    original = llm_runtime.llama_lib
+    llm_runtime.llama_lib = lib
+    try:
+        results = llm.chat_json_batch(["uno", "dos", "roto", "uno", "tres"])
+        llm.close()
+    finally:
+        llm_runtime.llama_lib = original
+    assert results == [{"eco": "uno"}, {"eco": "dos"}, {"eco": "reparado"}, {"eco": "uno"}, {"eco": "tres"}]
+    assert (lib.params.n_seq_max, lib.params.kv_unified, lib.params.n_ctx) == (3, True, 2 * llm.cfg.n_ctx)
+    prefijo = sum(1 for call in lib.llamadas for seq in call if seq == 2)
+    assert prefijo == len(llm._tokenize(llm._chat_text(llm_runtime.judge_messages(JUDGE_PROMPT_PREFIX))))
+    assert any(set(call) == {0, 1} for call in lib.llamadas)
+    assert {seq for call in lib.llamadas for seq in call} == {0, 1, 2}
+    assert not lib.kv[0] and not lib.kv[1]
+    assert llm.last_generated_tokens_batch[:2] == [len('{"eco": "uno"}'), len('{"eco": "dos"}')]
+    assert llm.last_generated_tokens_batch[3] == 0
+    assert (llm.stats["calls"], llm.stats["parallel_calls"], llm.stats["repairs"], llm.stats["batches"]) == (4, 4, 1, 1)
+    assert "4 prompts decodificados en paralelo" in format_judge_stats(llm.stats)
+    # Prefill medido por secuencia (paso que evaluó el prompt hasta el primer token; + 1 de la reparación en
+    # streaming) y una vez por paso de reloj
+    assert llm.stats["prefill_samples"] == 4 + 1 and llm.stats["prefill_ms"] >= 4 * 2
+    assert 0 < llm.stats["prefill_wall_ms"] < llm.stats["prefill_ms"]
+    rng = np.random.default_rng(0)
+    assert sample_token(np.array([0.0, 3.0, 1.0]), 0.0, 0.9, rng) == 1
+    assert sample_token(np.array([0.0, 30.0, 1.0]), 0.2, 0.9, rng) == 1
+
+
+def test_tuning_mide_tanda():
+    """benchmark_setting sobre el camino en tanda de LocalLLM: prefill y decode en tokens/s distintos de cero."""
+    from core.tuning import benchmark_setting
+
+    lib = _BatchLib()
+    original = llm_runtime.llama_lib
+    llm_runtime.llama_lib = lib
+
+    def factory(cfg, n_workers):
+        llm = _scripted_llm([], batch_size=4)
+        llm.llm = _BatchLlama([])
+        return llm
+
+    try:
+        r = benchmark_setting(LLMConfig("m.gguf"), ["uno", "dos", "tres", "cuatro"], factory=factory)
+    finally:
+        llm_runtime.llama_lib = original
+    assert r["prefill_tok_s"] > 0 and r["decode_tok_s"] > 0 and r["errors"] == 0
+
+
+def test_pipeline_tandas():
+    """El consumidor de analizar_pipeline junta payloads en tandas de hasta llm_batch_size para chat_json_batch."""
+    import core.analyzer as analyzer
+
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+    tandas = []
+
+    class _FakeLocalLLM:
+        def __init__(self, cfg, cache=None):
+            self.cfg = cfg
+            self.stats = new_judge_stats()
+
+        def chat_json_batch(self, prompts):
+            tandas.append(len(prompts))
+            self.last_generated_tokens_batch = [3] * len(prompts)
+            return [{"decision": "OUT_OF_SCOPE", "confidence": 0.9} for _ in prompts]
+
+    original = llm_runtime.LocalLLM
+    llm_runtime.LocalLLM = _FakeLocalLLM
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            analyzer.analizar_pipeline(
+                chats, training, tmp, use_llm=True,
+                config={"use_cache": False, "max_workers": 2, "journal": False, "model_filename": "m.gguf", "llm_batch_size": 4},
+            )
+            with open(os.path.join(tmp, "auditoria.jsonl"), encoding="utf-8") as f:
+                n_juzgadas = sum(1 for line in f if '"generated_tokens": 3' in line)
+    finally:
+        llm_runtime.LocalLLM = original
+    assert tandas and max(tandas) <= 4
+    assert sum(tandas) == n_juzgadas
+
+
+class _ByteLlama:
+    """
+    Llama falso a nivel de bytes para classify_decision: tokenize = bytes (+ BOS 0), eval escribe logits de la
+    última posición que empujan la continuación de las etiquetas preferidas después de '{"decision": "'.
+    """
+
+    def __init__(self, preferidas):
+        self.preferidas = preferidas
+        self.input_ids = np.zeros(8192, dtype=np.intc)
+        self.scores = np.zeros((8192, 256), dtype=np.float32)
+        self.n_tokens = 0
+        self.evaluados = 0
+
+    def tokenize(self, text, add_bos=True, special=False):
+        return ([0] if add_bos else []) + list(text)
+
+    def eval(self, tokens):
+        for tok in tokens:
+            self.input_ids[self.n_tokens] = tok
+            self.n_tokens += 1
+            self.evaluados += 1
+            texto = bytes(int(t) for t in self.input_ids[1:self.n_tokens]).decode("utf-8", errors="ignore")
+            logits = np.zeros(256, dtype=np.float32)
+            marca = texto.rfind('{"decision": "')
+            if marca >= 0:
+                hecho = texto[marca + len('{"decision": "'):]
+                for label in self.preferidas:
+                    objetivo = label + '"'
+                    if objetivo.startswith(hecho) and len(hecho) < len(objetivo):
+                        logits[ord(objetivo[len(hecho)])] = 8.0
+            self.scores[self.n_tokens - 1] = logits
+
+
+def _classify_llm(preferidas, **cfg_kwargs):
+    llm = _scripted_llm([], **cfg_kwargs)
+    llm.llm = _ByteLlama(preferidas)
+    return llm
+
+
+def test_classify_decision_logprobs():
+    """Distribución sobre las seis etiquetas desde logprobs; el segundo caso reutiliza el prefijo del KV."""
+    llm = _classify_llm(["OUT_OF_SCOPE"])
+    probs = llm.classify_decision("INPUT: receta de torta")
+    assert set(probs) == set(DECISION_LABELS)
+    assert max(probs, key=probs.get) == "OUT_OF_SCOPE" and probs["OUT_OF_SCOPE"] > 0.99
+    assert abs(sum(probs.values()) - 1.0) < 1e-3
+    primera = llm.llm.evaluados
+    llm.classify_decision("INPUT: receta de pizza")
+    assert llm.llm.evaluados - primera < primera / 2
+    assert llm.stats["classified"] == 2 and llm.stats["generated_tokens"] == 0
+    # Dos etiquetas igual de empujadas: margen bajo -> judge completo
+    empate = _classify_llm(["FLOW_SWITCH", "AMBIGUOUS"]).classify_decision("INPUT: x")
+    assert abs(empate["FLOW_SWITCH"] - empate["AMBIGUOUS"]) < 0.2
+    assert needs_full_judge(empate, 0.2) and not needs_full_judge(probs, 0.2)
+    assert needs_full_judge(probs, 0.2, ["OUT_OF_SCOPE"])
+    assert abs(decision_margin({"A": 0.7, "B": 0.2, "C": 0.1}) - 0.5) < 1e-9
+
+
+def test_pipeline_classify():
+    """judge_mode=classify: los casos con margen alto salen por logprobs; solo los de margen bajo van a chat_json."""
+    import core.analyzer as analyzer
+
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+    generados = []
+
+    class _FakeLocalLLM:
+        supports_classify = True
+
+        def __init__(self, cfg, cache=None):
+            self.cfg = cfg
+            self.stats = new_judge_stats()
+
+        def classify_batch(self, prompts):
+            # Margen bajo solo para el caso "Cuánto me pueden dar?"
+            return [
+                {"NEW_INTENT_IN_FLOW": 0.5, "AMBIGUOUS": 0.5} if "Cuánto me pueden" in p else {"OUT_OF_SCOPE": 0.9, "AMBIGUOUS": 0.1}
+                for p in prompts
+            ]
+
+        def chat_json_batch(self, prompts):
+            generados.extend(prompts)
+            self.last_generated_tokens_batch = [5] * len(prompts)
+            return [{"decision": "NEW_INTENT_IN_FLOW", "confidence": 0.7} for _ in prompts]
+
+    original = llm_runtime.LocalLLM
+    llm_runtime.LocalLLM = _FakeLocalLLM
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            analyzer.analizar_pipeline(
+                chats, training, tmp, use_llm=True,
+                config={
+                    "use_cache": False, "max_workers": 2, "journal": False, "triage": False,
+                    "model_filename": "m.gguf", "judge_mode": "classify",
+                },
+            )
+            with open(os.path.join(tmp, "auditoria.jsonl"), encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f]
+    finally:
+        llm_runtime.LocalLLM = original
+    assert len(generados) == 1 and "Cuánto me pueden" in generados[0]
+    por_logprobs = [r for r in rows if r["decided_by"] == "llm_logprobs"]
+    assert len(por_logprobs) == len(rows) - 1
+    assert all(r["decision"] == "OUT_OF_SCOPE" and r["decision_probs"]["OUT_OF_SCOPE"] == 0.9 for r in por_logprobs)
+    assert [r["decision"] for r in rows if r["decided_by"] == "llm"] == ["NEW_INTENT_IN_FLOW"]
+
+
+def test_classify_sin_escalado_por_defecto():
+    """Margen alto en NEW_INTENT_IN_FLOW: sin classify_full_decisions no se llama a chat_json; si se lista, escala."""
+    import core.analyzer as analyzer
+
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+    generados = []
+
+    class _FakeLocalLLM:
+        supports_classify = True
+
+        def __init__(self, cfg, cache=None):
+            self.cfg = cfg
+            self.stats = new_judge_stats()
+
+        def classify_batch(self, prompts):
+            return [{"NEW_INTENT_IN_FLOW": 0.9, "AMBIGUOUS": 0.1} for _ in prompts]
+
+        def chat_json(self, prompt):
+            generados.append(prompt)
+            return {"decision": "NEW_INTENT_IN_FLOW", "confidence": 0.7}
+
+        def chat_json_batch(self, prompts):
+            self.last_generated_tokens_batch = [5] * len(prompts)
+            return [self.chat_json(p) for p in prompts]
+
+    def correr(extra):
+        config = {"use_cache": False, "max_workers": 2, "journal": False, "triage": False,
+                  "model_filename": "m.gguf", "judge_mode": "classify"}
+        with tempfile.TemporaryDirectory() as tmp:
+            analyzer.analizar_pipeline(chats, training, tmp, use_llm=True, config=dict(config, **extra))
+            with open(os.path.join(tmp, "auditoria.jsonl"), encoding="utf-8") as f:
+                return [json.loads(line) for line in f]
+
+    original = llm_runtime.LocalLLM
+    llm_runtime.LocalLLM = _FakeLocalLLM
+    try:
+        rows = correr({})
+        assert rows and not generados
+        assert all(r["decided_by"] == "llm_logprobs" and r["decision"] == "NEW_INTENT_IN_FLOW" for r in rows)
+        rows = correr({"classify_full_decisions": ["NEW_INTENT_IN_FLOW"]})
+        assert generados and all(r["decided_by"] == "llm" for r in rows)
+    finally:
+        llm_runtime.LocalLLM = original
+
+
+def test_classify_sin_logprobs_avisa():
+    """Backend sin supports_classify: un solo aviso y todos los casos al judge generativo, sin contar escalados."""
+    import core.analyzer as analyzer
+
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+    judges = []
+
+    class _FakeJudge(llm_runtime.JudgeBackend):
+        def __init__(self, cfg, cache=None):
+            super().__init__(cfg)
+            judges.append(self)
+
+        def _complete(self, user_content, temperature, top_p):
+            return '{"decision": "OUT_OF_SCOPE", "confidence": 0.9}'
+
+    assert not _FakeJudge(LLMConfig("m.gguf")).supports_classify
+    try:
+        _FakeJudge(LLMConfig("m.gguf")).classify_batch(["a"])
+        assert False, "classify_batch sin logits debe fallar"
+    except NotImplementedError:
+        pass
+    try:
+        llm_runtime.JudgeBackend(LLMConfig("m.gguf"))
+        assert False, "JudgeBackend es abstracta"
+    except TypeError:
+        pass
+    logs = []
+    original = llm_runtime.LocalLLM
+    llm_runtime.LocalLLM = _FakeJudge
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            analyzer.analizar_pipeline(
+                chats, training, tmp, use_llm=True, logger_callback=logs.append,
+                config={"use_cache": False, "max_workers": 2, "journal": False, "triage": False,
+                        "model_filename": "m.gguf", "judge_mode": "classify"},
+            )
+            with open(os.path.join(tmp, "auditoria.jsonl"), encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f]
+    finally:
+        llm_runtime.LocalLLM = original
+    assert sum("judge_mode=classify no disponible" in m for m in logs) == 1
+    assert rows and all(r["decided_by"] == "llm" for r in rows)
+    assert judges[-1].stats["escalated"] == 0 and judges[-1].stats["calls"] > 0
+
+
 if __name__ == "__main__":
     test_extract_json_object_plain()
     test_extract_json_object_markdown()
     test_extract_json_object_nested()
+    test_judge_schema_enum()
+    test_chat_json_reparacion_contada()
+    test_json_object_scanner()
+    test_chat_json_early_stop()
+    test_prefix_cache_warm()
+    test_chat_json_batch()
+    test_chat_json_batch_multisecuencia()
+    test_tuning_mide_tanda()
+    test_pipeline_tandas()
+    test_classify_decision_logprobs()
+    test_pipeline_classify()
+    test_classify_sin_escalado_por_defecto()
+    test_classify_sin_logprobs_avisa()
     print("test_llm_runtime OK")
@@ -6,6 +6,7 @@ Sirven para validar el flujo de datos que usa la UI y el pipeline.
 import io
 import os
 import sys
+import shutil
 import tempfile
 import pandas as pd
 
@@ -13,7 +14,7 @@ _raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _raiz not in sys.path:
     sys.path.insert(0, _raiz)
 
-from core.preprocess import normalize_text, cargar_chats, cargar_chats_as_turns
+from core.preprocess import normalize_text, normalize_texts, cargar_chats, cargar_chats_as_turns
 
 
 def test_normalize_text():
@@ -29,6 +30,13 @@ def test_normalize_text():
     assert normalize_text(None) == ""
 
 
+def test_normalize_texts_igual_que_normalize_text():
+    """normalize_texts (únicos + tabla Latin-1) da lo mismo que normalize_text valor a valor."""
+    valores = ["Ups, no entendí", "Ups, no entendí", "¿Cuánto?", "½ Año", "\xa0Niño ", "ﬁn", "Ωmega", "", None, pd.NA, "OK"]
+    assert list(normalize_texts(valores)) == [normalize_text(v) for v in valores]
+    assert list(normalize_texts(pd.Series(["DÓLARES", "Marzo"]))) == ["dolares", "marzo"]
+
+
 def test_cargar_chats_columnas_renombradas():
     """cargar_chats renombra columnas legacy (cod_wts_jsessionid -> session_id, etc.)."""
     csv = """cod_wts_jsessionid,tipo_mensaje,ds_wts_message,ds_wts_intent
@@ -107,9 +115,65 @@ s1,bot,NO_MATCH,NO_MATCH
             pass
 
 
+def test_cargar_chats_as_turns_cache():
+    """Con cache_dir: la segunda carga sale de la caché (igual a la primera), con proyección; si el CSV cambia se recalcula."""
+    csv = """session_id,tipo,texto,intent_detectado
+s1,usuario,Marzo,
+s1,bot,NO_MATCH,NO_MATCH
+"""
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "Chat.csv")
+    cache_dir = os.path.join(tmp, "cache")
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(csv)
+        df = cargar_chats_as_turns(path, cache_dir=cache_dir)
+        assert os.listdir(os.path.join(cache_dir, "turns"))
+        cached = cargar_chats_as_turns(path, cache_dir=cache_dir)
+        assert list(cached.columns) == list(df.columns)
+        assert cached["texto_norm"].tolist() == df["texto_norm"].tolist()
+        assert cached["flow_ref"].tolist() == df["flow_ref"].tolist()
+        proj = cargar_chats_as_turns(path, cache_dir=cache_dir, columns=["session_id", "texto"])
+        assert list(proj.columns) == ["session_id", "texto"]
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("s1,usuario,Con dólares,\n")
+        os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+        again = cargar_chats_as_turns(path, cache_dir=cache_dir)
+        assert again["texto_norm"].tolist() == ["marzo", "no_match", "con dolares"]
+        assert len(os.listdir(os.path.join(cache_dir, "turns"))) == 1
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def test_cache_turnos_falla_escritura():
+    """Si guardar la caché falla con cualquier error (p. ej. ArrowTypeError, un TypeError), la carga sigue y lo informa."""
+    import core.preprocess as preprocess
+
+    def _falla(*args, **kwargs):
+        raise TypeError("Expected bytes, got a 'int' object")
+
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "Chat.csv")
+    original = preprocess.save_cached_turns
+    preprocess.save_cached_turns = _falla
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("session_id,tipo,texto,intent_detectado\ns1,usuario,Marzo,\n")
+        logs = []
+        df = cargar_chats_as_turns(path, cache_dir=os.path.join(tmp, "cache"), logger_callback=logs.append)
+        assert df["texto_norm"].tolist() == ["marzo"]
+        assert len(logs) == 1 and "TypeError" in logs[0]
+    finally:
+        preprocess.save_cached_turns = original
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
 if __name__ == "__main__":
     test_normalize_text()
+    test_normalize_texts_igual_que_normalize_text()
     test_cargar_chats_columnas_renombradas()
     test_cargar_chats_columnas_directas()
     test_cargar_chats_as_turns()
+    test_cargar_chats_as_turns_cache()
+    test_cache_turnos_falla_escritura()
     print("test_preprocess OK")
@@ -11,7 +11,8 @@ _raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _raiz not in sys.path:
     sys.path.insert(0, _raiz)
 
-from core.llm_runtime import build_judge_prompt, JSON_SCHEMA_HINT
+from core.llm_runtime import build_judge_prompt, build_judge_prompt_budgeted, JSON_SCHEMA_HINT
+from core.prompt_budget import pack_payload, approx_token_count
 from tests.payloads import get_ping_payload
 
 
@@ -69,6 +70,53 @@ def test_json_schema_hint_has_expected_keys():
     assert set(JSON_SCHEMA_HINT.keys()) >= expected
 
 
+def _payload_grande():
+    payload = get_ping_payload()
+    payload["mensaje_no_match"] = payload["trigger_user_text"]
+    payload["trigger_user_text_norm"] = "el del mes pasado"
+    payload["context_messages"] = [{"tipo": "usuario", "texto": f"mensaje {i} " * 5, "intent": None} for i in range(10)]
+    payload["candidates"][0]["training_phrases"] += [f"frase extra {i} de resumen" for i in range(200)]
+    return payload
+
+
+def test_pack_payload_sin_duplicados():
+    """Sin límite: entra todo menos los campos duplicados; training_phrases solo las que no están en evidence."""
+    packed, trimmed = pack_payload(_payload_grande())
+    assert not trimmed
+    assert "mensaje_no_match" not in packed and "trigger_user_text_norm" not in packed
+    assert len(packed["context_messages"]) == 10
+    extra = packed["candidates"][0]["training_phrases"]
+    assert "Resumen de mi cuenta" not in extra and "Quiero ver el resumen de mi cuenta" in extra
+
+
+def test_prompt_respeta_presupuesto_por_prioridad():
+    """Con presupuesto chico: primero caen las frases extra, después el contexto viejo; trigger y evidence quedan."""
+    payload = _payload_grande()
+    _, full_tokens, _ = build_judge_prompt_budgeted(payload)
+    prompt, n_tokens, trimmed = build_judge_prompt_budgeted(payload, 700, approx_token_count)
+    assert trimmed and n_tokens <= 700 < full_tokens
+    obj = json.loads(prompt[prompt.find("INPUT:") + len("INPUT:"):].strip())
+    assert obj["trigger_user_text"] == "El del mes pasado"
+    assert obj["slot_signals"] == ["MONTH_PERIOD"]
+    assert len(obj["candidates"][0]["evidence"]) == 3
+    assert "training_phrases" not in obj["candidates"][0]
+    assert 0 < len(obj["context_messages"]) < 10
+    assert obj["context_messages"][-1]["texto"].startswith("mensaje 9")
+
+
+def test_trigger_largo_se_corta():
+    """Campos fijos que solos pasan el presupuesto: se cortan bot_no_match_text y después el trigger, con "…"."""
+    payload = _payload_grande()
+    payload["trigger_user_text"] = " ".join(f"palabra{i}" for i in range(600))
+    payload["bot_no_match_text"] = "No entendí tu consulta. " * 20
+    prompt, n_tokens, trimmed = build_judge_prompt_budgeted(payload, 1000, approx_token_count)
+    assert trimmed and n_tokens <= 1000
+    obj = json.loads(prompt[prompt.find("INPUT:") + len("INPUT:"):].strip())
+    assert obj["bot_no_match_text"] == "…"
+    assert obj["trigger_user_text"].startswith("palabra0 palabra1") and obj["trigger_user_text"].endswith("…")
+    assert obj["slot_signals"] == ["MONTH_PERIOD"] and obj["candidates"] == []
+
+
 def log_prompt_armado():
     """Escribe en salida (log) el prompt armado para el caso de ping (mismo que usa test_llm_ping)."""
     payload = get_ping_payload()
@@ -83,5 +131,8 @@ if __name__ == "__main__":
     test_build_judge_prompt_contains_schema()
     test_build_judge_prompt_contains_input()
     test_json_schema_hint_has_expected_keys()
+    test_pack_payload_sin_duplicados()
+    test_prompt_respeta_presupuesto_por_prioridad()
+    test_trigger_largo_se_corta()
     log_prompt_armado()
     print("test_prompt_build OK")
@@ -0,0 +1,79 @@
+"""
+Test de escritura de reportes: StreamingReportWriter (fila a fila) deja los mismos archivos que write_reports,
+y el pipeline sin LLM escribe una fila por caso con la cola productor / judge.
+"""
+import os
+import sys
+import tempfile
+import pandas as pd
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+from core.report_writer import write_reports, StreamingReportWriter, update_multiplicidad, CSV_COLUMNS
+from core.analyzer import analizar_pipeline
+
+
+def _rows():
+    base = {c: "" for c in CSV_COLUMNS}
+    return [
+        dict(base, case_id="s1:3", mensaje_no_match='dice "hola", y más', confidence=0.5, review_flag=True, multiplicidad=2),
+        dict(base, case_id="s2:1", mensaje_no_match="saldo\ncuenta", confidence=0.0, review_flag=False, multiplicidad=1),
+    ]
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_streaming_writer_igual_que_write_reports():
+    """CSV, JSONL y cases_debug idénticos a write_reports."""
+    with tempfile.TemporaryDirectory() as tmp:
+        a, b = os.path.join(tmp, "a"), os.path.join(tmp, "b")
+        write_reports(_rows(), a, write_jsonl=True, write_debug=True)
+        with StreamingReportWriter(b, write_jsonl=True, write_debug=True) as writer:
+            for row in _rows():
+                writer.write_row(row)
+        assert writer.n_rows == 2
+        for name in ("analisis_no_match.csv", "auditoria.jsonl", os.path.join("cases_debug", "s1_3.json")):
+            assert _read(os.path.join(a, name)) == _read(os.path.join(b, name)), name
+
+
+def test_update_multiplicidad_igual_que_reescribir():
+    """Corregir multiplicidad sobre los archivos deja lo mismo que write_reports con las filas corregidas."""
+    with tempfile.TemporaryDirectory() as tmp:
+        a, b = os.path.join(tmp, "a"), os.path.join(tmp, "b")
+        corregidas = [dict(r, multiplicidad=m) for r, m in zip(_rows(), [3, 4])]
+        write_reports(corregidas, a, write_jsonl=True, write_debug=True)
+        with StreamingReportWriter(b, write_jsonl=True, write_debug=True) as writer:
+            for row in _rows():
+                writer.write_row(row)
+        update_multiplicidad(b, [3, 4], write_jsonl=True, write_debug=True)
+        for name in ("analisis_no_match.csv", "auditoria.jsonl", os.path.join("cases_debug", "s1_3.json")):
+            assert _read(os.path.join(a, name)) == _read(os.path.join(b, name)), name
+        assert not [n for n in os.listdir(b) if n.endswith(".tmp")]
+
+
+def test_pipeline_sin_llm_escribe_una_fila_por_caso():
+    """analizar_pipeline (productor en hilo + judge) con datos de data/: una fila por case_id, sin duplicados."""
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        analizar_pipeline(chats, training, tmp, config={"use_cache": False, "max_workers": 2}, use_llm=False)
+        df = pd.read_csv(os.path.join(tmp, "analisis_no_match.csv"))
+        assert len(df) > 0
+        assert df["case_id"].is_unique
+        assert list(df.columns) == CSV_COLUMNS
+        assert (df["multiplicidad"] >= 1).all()
+        assert os.path.isfile(os.path.join(tmp, "informe_general_mejora.json"))
+
+
+if __name__ == "__main__":
+    test_streaming_writer_igual_que_write_reports()
+    test_update_multiplicidad_igual_que_reescribir()
+    test_pipeline_sin_llm_escribe_una_fila_por_caso()
+    print("test_report_writer OK")
@@ -0,0 +1,103 @@
+"""
+Test del retriever TF-IDF: retrieve_candidates_batch contra el scoring por consulta original (groupby por intent),
+guardado acá como referencia independiente.
+"""
+import math
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+from core.preprocess import normalize_text
+from core.retriever import build_training_index, retrieve_candidates, retrieve_candidates_batch
+
+
+def _index():
+    """Training con intents intercalados (no contiguos) y uno con más de 5 frases."""
+    rows = [
+        ("Cuentas_Resumen", "Quiero ver el resumen de mi cuenta"),
+        ("Prestamos_Solicitud", "Me pueden dar un préstamo?"),
+        ("Cuentas_Resumen", "Resumen de mi cuenta"),
+        ("Tarjetas_Resumen", "Resumen tarjeta"),
+        ("Prestamos_Solicitud", "Quiero solicitar un préstamo"),
+        ("Prestamos_Solicitud", "Necesito un préstamo personal"),
+        ("Prestamos_Solicitud", "Cómo saco un préstamo?"),
+        ("Prestamos_Solicitud", "Cuánto me prestan"),
+        ("Prestamos_Solicitud", "Préstamo en dólares"),
+        ("Prestamos_Solicitud", "Préstamo para mi hijo"),
+        ("Cuentas_Resumen", "Estado de cuenta"),
+    ]
+    df = pd.DataFrame(rows, columns=["intent", "phrase"])
+    df["phrase_norm"] = df["phrase"].map(normalize_text)
+    df["flow"] = df["intent"].map(lambda x: x.split("_")[0])
+    df["language"] = "es"
+    df["row_id"] = range(len(df))
+    return build_training_index(df)
+
+
+def _referencia(text, index, flow_ref, top_intents, evidence_per_intent):
+    """Implementación por consulta previa al batch: groupby por intent + nlargest sobre el DataFrame del índice."""
+    if not text:
+        return []
+    sims = (index["matrix"] @ index["vectorizer"].transform([text]).T).toarray().ravel()
+    df = index["df"].copy()
+    df["_sim"] = sims
+    results = []
+    for intent, grp in df.groupby("intent", sort=False):
+        flow = grp["flow"].iloc[0]
+        top_rows = grp.nlargest(evidence_per_intent + 5, "_sim")
+        sim_list = top_rows["_sim"].tolist()
+        score = 0.65 * max(sim_list) + 0.25 * float(np.mean(sim_list[:5])) + 0.10 * math.log(1 + len(grp))
+        if flow_ref and flow_ref not in ("UNKNOWN", "CHIT") and flow == flow_ref:
+            score *= 1.1
+        results.append({
+            "intent": intent,
+            "flow": flow,
+            "score": round(score, 4),
+            "evidence": [(r["phrase"], float(r["_sim"])) for _, r in top_rows.head(evidence_per_intent).iterrows()],
+            "training_phrases": grp["phrase"].dropna().astype(str).tolist(),
+        })
+    results.sort(key=lambda x: -x["score"])
+    return results[:top_intents]
+
+
+def test_index_agrupado_por_intent():
+    """Las filas del índice quedan agrupadas por intent, en orden de primera aparición."""
+    index = _index()
+    assert list(index["intent_names"]) == ["Cuentas_Resumen", "Prestamos_Solicitud", "Tarjetas_Resumen"]
+    assert list(index["intent_ends"] - index["intent_starts"]) == [3, 7, 1]
+    assert index["intent_phrases"][0] == ["Quiero ver el resumen de mi cuenta", "Resumen de mi cuenta", "Estado de cuenta"]
+
+
+def test_batch_igual_que_referencia():
+    """El batch (y retrieve_candidates) rankea, puntúa y arma la evidencia como el scoring por consulta original."""
+    index = _index()
+    textos = [normalize_text(t) for t in ["Cuánto me pueden dar?", "resumen de cuenta", "", "torta", "préstamo cuenta"]]
+    flows = ["Prestamos", "Tarjetas", "Cuentas", "UNKNOWN", "Cuentas"]
+    batch = retrieve_candidates_batch(textos, index, flows, top_intents=2, evidence_per_intent=3, chunk_size=2)
+    assert len(batch) == 5
+    for t, f, got in zip(textos, flows, batch):
+        esperado = _referencia(t, index, f, 2, 3)
+        assert [c["intent"] for c in got] == [c["intent"] for c in esperado]
+        for c, e in zip(got, esperado):
+            assert (c["flow"], c["score"], c["training_phrases"]) == (e["flow"], e["score"], e["training_phrases"])
+            assert [ev["phrase"] for ev in c["evidence"]] == [p for p, _ in e["evidence"]]
+            # Los sims pueden diferir en el último ulp por el orden de suma del producto disperso
+            assert np.allclose([ev["sim"] for ev in c["evidence"]], [s for _, s in e["evidence"]])
+        assert retrieve_candidates(t, index, f, top_intents=2, evidence_per_intent=3) == got
+    # Valores fijos: el préstamo gana con la frase más parecida primero; texto vacío sin candidatos
+    assert batch[0][0]["intent"] == "Prestamos_Solicitud"
+    assert batch[0][0]["evidence"][0]["phrase"] == "Me pueden dar un préstamo?"
+    assert len(batch[0][0]["evidence"]) == 3
+    assert batch[1][0]["intent"] == "Cuentas_Resumen"
+    assert batch[2] == []
+
+
+if __name__ == "__main__":
+    test_index_agrupado_por_intent()
+    test_batch_igual_que_referencia()
+    print("test_retriever OK")
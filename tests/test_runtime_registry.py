@@ -0,0 +1,163 @@
+"""
+Test del registro de runtime (resident_runtime): el judge y el índice de training se cargan una vez entre corridas
+y se invalidan al cambiar el modelo / n_ctx / n_threads o el CSV de training; precarga en segundo plano.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+import core.llm_runtime as llm_runtime
+from core import runtime_registry
+from core.llm_runtime import LLMConfig, new_judge_stats
+
+
+class _FakeLocalLLM:
+    cargas = 0
+
+    def __init__(self, cfg, cache=None):
+        _FakeLocalLLM.cargas += 1
+        self.cfg = cfg
+        self.cache = cache
+        self.stats = new_judge_stats()
+
+    def chat_json_batch(self, prompts):
+        self.stats["calls"] += len(prompts)
+        self.last_generated_tokens_batch = [1] * len(prompts)
+        return [{"decision": "AMBIGUOUS", "confidence": 0.4} for _ in prompts]
+
+
+def _con_modelo_falso(fn):
+    """Corre fn con MODEL_PATH a un .gguf vacío y LocalLLM reemplazado por _FakeLocalLLM."""
+    original_env = os.environ.get("MODEL_PATH")
+    original_llm = llm_runtime.LocalLLM
+    with tempfile.TemporaryDirectory() as tmp:
+        modelo = os.path.join(tmp, "m.gguf")
+        open(modelo, "wb").close()
+        os.environ["MODEL_PATH"] = modelo
+        llm_runtime.LocalLLM = _FakeLocalLLM
+        _FakeLocalLLM.cargas = 0
+        runtime_registry.clear()
+        try:
+            fn(tmp, modelo)
+        finally:
+            llm_runtime.LocalLLM = original_llm
+            if original_env is None:
+                os.environ.pop("MODEL_PATH", None)
+            else:
+                os.environ["MODEL_PATH"] = original_env
+            runtime_registry.clear()
+
+
+def test_judge_residente():
+    """Misma clave de carga: mismo objeto (cfg y stats de la corrida nueva); n_ctx / n_threads / archivo: recarga."""
+    def fn(tmp, modelo):
+        a = runtime_registry.get_judge(LLMConfig("m.gguf", temperature=0.2))
+        a.stats["calls"] = 5
+        b = runtime_registry.get_judge(LLMConfig("m.gguf", temperature=0.0))
+        assert a is b and _FakeLocalLLM.cargas == 1
+        assert b.cfg.temperature == 0.0 and b.stats["calls"] == 0
+        runtime_registry.get_judge(LLMConfig("m.gguf", n_ctx=2048))
+        runtime_registry.get_judge(LLMConfig("m.gguf", n_ctx=2048, n_threads=2))
+        assert _FakeLocalLLM.cargas == 3
+        with open(modelo, "wb") as f:
+            f.write(b"otro modelo")
+        runtime_registry.get_judge(LLMConfig("m.gguf", n_ctx=2048, n_threads=2))
+        assert _FakeLocalLLM.cargas == 4
+
+    _con_modelo_falso(fn)
+
+
+def test_indice_residente():
+    """El índice se reutiliza mientras el CSV no cambie; rebuild o CSV modificado lo vuelven a construir."""
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(training):
+        return
+    runtime_registry.clear()
+    with tempfile.TemporaryDirectory() as tmp:
+        copia = os.path.join(tmp, "Intent.csv")
+        shutil.copy(training, copia)
+        a = runtime_registry.get_index(copia)
+        assert runtime_registry.get_index(copia) is a
+        assert runtime_registry.get_index(copia, rebuild=True) is not a
+        b = runtime_registry.get_index(copia)
+        with open(copia, "a", encoding="utf-8") as f:
+            f.write("\n")
+        assert runtime_registry.get_index(copia) is not b
+    runtime_registry.clear()
+
+
+def test_pipeline_residente_y_precarga():
+    """preload carga modelo e índice en un hilo; dos corridas con resident_runtime no vuelven a cargar el modelo."""
+    from core.analyzer import analizar_pipeline
+
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+
+    def fn(tmp, modelo):
+        config = {
+            "use_cache": False, "max_workers": 2, "journal": False, "model_filename": "m.gguf",
+            "resident_runtime": True,
+        }
+        logs = []
+        runtime_registry.preload(config, training, logger_callback=logs.append).join()
+        assert _FakeLocalLLM.cargas == 1 and "Precarga lista" in logs[-1]
+        for corrida in ("a", "b"):
+            logs = []
+            analizar_pipeline(chats, training, os.path.join(tmp, corrida), config=dict(config), logger_callback=logs.append)
+            assert any("residente" in m for m in logs)
+        assert _FakeLocalLLM.cargas == 1
+
+    _con_modelo_falso(fn)
+
+
+def test_precarga_con_perfil_de_tuning():
+    """La precarga aplica el perfil de tune (misma clave de carga que la corrida); con llm_workers > 1 no carga modelo."""
+    import json
+    from core.analyzer import analizar_pipeline
+    from core.tuning import profile_key
+
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+
+    def fn(tmp, modelo):
+        perfiles = os.path.join(tmp, "tuning_profiles.json")
+        with open(perfiles, "w", encoding="utf-8") as f:
+            json.dump({profile_key("m.gguf"): {"n_threads": 3, "n_batch": 128, "llm_workers": 1}}, f)
+        config = {
+            "use_cache": False, "max_workers": 2, "journal": False, "model_filename": "m.gguf",
+            "resident_runtime": True, "n_threads": 8, "n_batch": 256, "tuning_profiles_path": perfiles,
+        }
+        runtime_registry.preload(config, training).join()
+        assert _FakeLocalLLM.cargas == 1
+        analizar_pipeline(chats, training, os.path.join(tmp, "out"), config=dict(config))
+        judge = runtime_registry.get_judge(LLMConfig("m.gguf", n_threads=3, n_batch=128))
+        assert _FakeLocalLLM.cargas == 1 and (judge.cfg.n_threads, judge.cfg.n_batch) == (3, 128)
+
+        runtime_registry.clear()
+        _FakeLocalLLM.cargas = 0
+        with open(perfiles, "w", encoding="utf-8") as f:
+            json.dump({profile_key("m.gguf"): {"n_threads": 3, "n_batch": 128, "llm_workers": 2}}, f)
+        logs = []
+        runtime_registry.preload(config, training, logger_callback=logs.append).join()
+        assert _FakeLocalLLM.cargas == 0 and "modelo" not in logs[-1]
+        runtime_registry.get_judge(LLMConfig("m.gguf"))
+        assert runtime_registry.release_judge("m.gguf") and not runtime_registry.release_judge("m.gguf")
+
+    _con_modelo_falso(fn)
+
+
+if __name__ == "__main__":
+    test_judge_residente()
+    test_indice_residente()
+    test_pipeline_residente_y_precarga()
+    test_precarga_con_perfil_de_tuning()
+    print("test_runtime_registry OK")
@@ -0,0 +1,64 @@
+"""
+Test del índice de sesiones: orden por sesión y offsets session_id -> (start, end).
+"""
+import os
+import sys
+import pandas as pd
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+from core.sessions import sort_by_session, build_session_index, session_bounds, session_slice
+from core.context_builder import infer_flow_ref, build_context_window
+
+
+def _turns_intercalados() -> pd.DataFrame:
+    """Dos sesiones intercaladas en el archivo (s1, s2, s1, s2, s1)."""
+    df = pd.DataFrame([
+        {"session_id": "s1", "tipo": "usuario", "texto": "Quiero ver cuenta", "intent_detectado": "", "flow_from_intent": ""},
+        {"session_id": "s2", "tipo": "usuario", "texto": "Hola", "intent_detectado": "", "flow_from_intent": ""},
+        {"session_id": "s1", "tipo": "bot", "texto": "OK", "intent_detectado": "Cuentas_Resumen", "flow_from_intent": "Cuentas"},
+        {"session_id": "s2", "tipo": "bot", "texto": "Hola!", "intent_detectado": "SALUDO_HI", "flow_from_intent": "SALUDO"},
+        {"session_id": "s1", "tipo": "usuario", "texto": "El del mes pasado", "intent_detectado": "", "flow_from_intent": ""},
+    ])
+    df["turn_index"] = df.groupby("session_id").cumcount()
+    return df
+
+
+def test_sort_by_session_contiguo():
+    """Las sesiones quedan contiguas, en orden de primera aparición y con turn_index creciente."""
+    df = sort_by_session(_turns_intercalados())
+    assert list(df["session_id"]) == ["s1", "s1", "s1", "s2", "s2"]
+    assert list(df["turn_index"]) == [0, 1, 2, 0, 1]
+    assert list(df.index) == [0, 1, 2, 3, 4]
+
+
+def test_build_session_index_offsets():
+    """Offsets (start, end) por sesión; sesión inexistente -> (0, 0)."""
+    df = sort_by_session(_turns_intercalados())
+    si = build_session_index(df)
+    assert session_bounds(si, "s1") == (0, 3)
+    assert session_bounds(si, "s2") == (3, 5)
+    assert session_bounds(si, "nope") == (0, 0)
+    assert list(session_slice(df, "s2", si)["texto"]) == ["Hola", "Hola!"]
+
+
+def test_context_con_offsets_igual_que_sin_indice():
+    """infer_flow_ref y build_context_window dan lo mismo cortando por offsets que filtrando."""
+    df = sort_by_session(_turns_intercalados())
+    si = build_session_index(df)
+    trigger = {"session_id": "s1", "turn_index": 2}
+    neutral = {"SALUDO", "CHIT", "GENERIC", "NO_MATCH"}
+    assert infer_flow_ref(trigger, df, neutral, si) == infer_flow_ref(trigger, df, neutral) == ("Cuentas", "Cuentas_Resumen")
+    ctx_idx = build_context_window(trigger, df, "Cuentas", 12, neutral, si)
+    ctx = build_context_window(trigger, df, "Cuentas", 12, neutral)
+    assert ctx_idx == ctx
+    assert ctx[-1]["texto"] == "El del mes pasado"
+
+
+if __name__ == "__main__":
+    test_sort_by_session_contiguo()
+    test_build_session_index_offsets()
+    test_context_con_offsets_igual_que_sin_indice()
+    print("test_sessions OK")
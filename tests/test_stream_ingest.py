@@ -0,0 +1,89 @@
+"""
+Test de la ingesta en streaming: con chunks chicos (sesiones partidas entre chunks y filas sin
+session_id al inicio de un chunk) los casos y su contexto son los mismos que cargando todo el CSV.
+"""
+import os
+import sys
+import tempfile
+import pandas as pd
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+from core.preprocess import cargar_chats_as_turns
+from core.sessions import build_session_index
+from core.cases import extract_no_match_cases
+from core.context_builder import build_context_window
+from core.spec import FLOWS_NEUTRALES
+from core.stream_ingest import iter_session_blocks, stream_no_match_cases
+
+
+def _write_chats(path: str) -> None:
+    """Export con nombres de Dialogflow; session_id solo en la primera fila de cada sesión."""
+    rows = []
+    for s in range(4):
+        sid = f"sess{s}"
+        turns = [
+            ("usuario", "Quiero ver mi cuenta", ""),
+            ("bot", "Claro", "Cuentas_Resumen"),
+            ("usuario", f"el del mes {s}", ""),
+            ("bot", "No entendí", "NO_MATCH"),
+            ("usuario", "saldo", ""),
+            ("bot", "Tu saldo", "Cuentas_Saldo"),
+        ]
+        for i, (tipo, texto, intent) in enumerate(turns):
+            rows.append({
+                "cod_wts_jsessionid": sid if i == 0 else None,
+                "tipo_mensaje": tipo,
+                "ds_wts_message": texto,
+                "ds_wts_intent": intent,
+                "columna_extra": "x",
+            })
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def _full_cases(path: str, max_msgs: int):
+    df = cargar_chats_as_turns(path)
+    si = build_session_index(df)
+    cases = extract_no_match_cases(df, si).to_dict("records")
+    for case in cases:
+        trigger = {"session_id": case["session_id"], "turn_index": case["trigger_turn_index"]}
+        case["context_messages"] = build_context_window(trigger, df, case["flow_ref"], max_msgs, set(FLOWS_NEUTRALES), si)
+    return cases
+
+
+def test_bloques_con_sesiones_completas():
+    """Cada sesión cae entera en un solo bloque y turn_index no se reinicia entre chunks."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chats.csv")
+        _write_chats(path)
+        blocks = list(iter_session_blocks(path, chunk_rows=4))
+    seen = []
+    for block in blocks:
+        assert "columna_extra" not in block.columns
+        for sid, grp in block.groupby("session_id", sort=False):
+            assert sid not in seen
+            seen.append(sid)
+            assert list(grp["turn_index"]) == list(range(6))
+    assert seen == ["sess0", "sess1", "sess2", "sess3"]
+
+
+def test_stream_igual_que_carga_completa():
+    """Mismos casos (ids, flow_ref, trigger y contexto) que extract_no_match_cases sobre todo el archivo."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chats.csv")
+        _write_chats(path)
+        full = _full_cases(path, 12)
+        for chunk_rows in (1, 5, 7, 1000):
+            streamed = [c for batch in stream_no_match_cases(path, 12, chunk_rows=chunk_rows) for c in batch]
+            assert streamed == full, chunk_rows
+    assert len(full) == 4
+    assert full[0]["trigger_user_text"] == "el del mes 0"
+    assert full[0]["flow_ref"] == "Cuentas"
+
+
+if __name__ == "__main__":
+    test_bloques_con_sesiones_completas()
+    test_stream_igual_que_carga_completa()
+    print("test_stream_ingest OK")
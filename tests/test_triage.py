@@ -0,0 +1,68 @@
+"""
+Test del triage por reglas previo al judge: cada regla, casos ambiguos (van al LLM) y --triage-only en el pipeline.
+"""
+import csv
+import json
+import os
+import sys
+import tempfile
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+from core.triage import triage_case, DECIDED_BY_TRIAGE, DECIDED_BY_DEFAULT
+
+
+def _payload(text, flow_ref="Cuentas", slots=None, evidence=None, flow="Cuentas"):
+    candidates = [{"intent": "cuentas.resumen", "flow": flow, "score": 0.5, "evidence": evidence or []}]
+    return {"trigger_user_text": text, "flow_ref": flow_ref, "slot_signals": slots or [], "candidates": candidates}
+
+
+def test_reglas_de_triage():
+    """STRONG_MATCH en el flow_ref, slot en trigger corto y fuera de dominio deciden; lo demás vuelve None."""
+    strong = triage_case(_payload("quiero el resumen de la cuenta", evidence=[{"phrase": "resumen", "sim": 0.81}]))
+    assert strong["decision"] == "MISSED_EXISTING_INTENT_IN_FLOW"
+    assert strong["intent_recommended"] == ["cuentas.resumen"] and strong["confidence"] == 0.81
+    slot = triage_case(_payload("Marzo", slots=["MONTH_PERIOD"]))
+    assert slot["decision"] == "MISSING_PARAMETER_HANDLER" and slot["suggested_dialogflow"]["parameters"] == ["MONTH_PERIOD"]
+    fuera = triage_case(_payload("receta de torta de chocolate", evidence=[{"phrase": "x", "sim": 0.2}]))
+    assert fuera["decision"] == "OUT_OF_SCOPE"
+    # STRONG_MATCH de otro flow, trigger largo con slot, sin señales: ambiguos
+    assert triage_case(_payload("resumen", evidence=[{"phrase": "r", "sim": 0.9}], flow="Tarjetas")) is None
+    assert triage_case(_payload("quiero ver lo de marzo del año pasado", slots=["MONTH_PERIOD"])) is None
+    assert triage_case(_payload("no entiendo nada", evidence=[{"phrase": "x", "sim": 0.3}])) is None
+    # Dos reglas a la vez (slot + STRONG_MATCH): lo decide el LLM
+    assert triage_case(_payload("Marzo", slots=["MONTH_PERIOD"], evidence=[{"phrase": "r", "sim": 0.8}])) is None
+
+
+def test_pipeline_triage_only():
+    """--triage-only: columna decided_by, sin LLM; el informe general trae la fracción decidida por reglas."""
+    from core.analyzer import analizar_pipeline
+
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        analizar_pipeline(chats, training, tmp, config={"use_cache": False, "max_workers": 2, "triage_only": True})
+        with open(os.path.join(tmp, "analisis_no_match.csv"), encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        origen = {r["decided_by"] for r in rows}
+        assert origen <= {DECIDED_BY_TRIAGE, DECIDED_BY_DEFAULT} and DECIDED_BY_TRIAGE in origen
+        n_triage = sum(r["decided_by"] == DECIDED_BY_TRIAGE for r in rows)
+        assert all(r["decision"] != "AMBIGUOUS" for r in rows if r["decided_by"] == DECIDED_BY_TRIAGE)
+        with open(os.path.join(tmp, "informe_general_mejora.json"), encoding="utf-8") as f:
+            triage = json.load(f)["triage"]
+        assert triage["casos_unicos_por_origen"][DECIDED_BY_TRIAGE] == n_triage
+        assert 0 < triage["fraccion_sin_llm"] <= 1
+        # Sin LLM y sin triage_only no hay triage: todo queda con la decisión por defecto
+        analizar_pipeline(chats, training, tmp, config={"use_cache": False, "max_workers": 2}, use_llm=False)
+        with open(os.path.join(tmp, "analisis_no_match.csv"), encoding="utf-8") as f:
+            assert {r["decided_by"] for r in csv.DictReader(f)} == {DECIDED_BY_DEFAULT}
+
+
+if __name__ == "__main__":
+    test_reglas_de_triage()
+    test_pipeline_triage_only()
+    print("test_triage OK")
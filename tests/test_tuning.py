@@ -0,0 +1,122 @@
+"""
+Test del auto-tuning (analyzer_cli.py tune) con un judge falso cuya velocidad depende de n_threads / n_batch /
+llm_workers: búsqueda por coordenadas, perfil por host + modelo y aplicación automática en analizar_pipeline.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+import core.llm_runtime as llm_runtime
+from core.llm_runtime import LLMConfig, new_judge_stats
+from core.tuning import apply_tuning_profile, profile_key, run_tuning, save_profile, load_profiles
+
+
+class _FakeJudge:
+    """Tiempo por caso = 20 ms / eficiencia: hasta 4 hilos escala, más hilos empeora; n_batch 512 es 1.5x; N procesos."""
+
+    def __init__(self, cfg, n_workers=1):
+        self.cfg = cfg
+        self.n_workers = n_workers
+        self.stats = new_judge_stats()
+
+    def chat_json_batch(self, prompts):
+        t = self.cfg.n_threads
+        eff = (t if t <= 4 else 2.5) if self.n_workers == 1 else 3.2 * self.n_workers
+        eff *= 1.5 if self.cfg.n_batch == 512 else 1.0
+        time.sleep(0.02 * len(prompts) / eff)
+        self.stats["generated_tokens"] += 10 * len(prompts)
+        self.stats["prefill_ms"] += 5 * len(prompts)
+        self.stats["prefill_samples"] += len(prompts)
+        return [{"decision": "AMBIGUOUS"} for _ in prompts]
+
+
+def test_run_tuning():
+    """Eje por eje: 4 hilos, después n_batch 512, después 4 procesos; métricas por combinación."""
+    best, results = run_tuning([f"p{i}" for i in range(8)], LLMConfig("m.gguf", n_batch=256), factory=_FakeJudge, cpu=8)
+    assert [(r["n_threads"], r["n_batch"], r["llm_workers"]) for r in results[:3]] == [(2, 256, 1), (4, 256, 1), (8, 256, 1)]
+    assert len(results) == 3 + 2 + 2
+    assert (best["n_threads"], best["n_batch"], best["llm_workers"]) == (4, 512, 4)
+    assert all(r["cases_per_min"] > 0 and r["decode_tok_s"] > 0 and r["prefill_tok_s"] > 0 for r in results)
+
+
+def test_perfil_por_host_y_modelo():
+    """save_profile guarda por clave sin pisar otras; apply_tuning_profile lo aplica salvo use_tuning_profile false o http."""
+    original_env = os.environ.get("MODEL_PATH")
+    with tempfile.TemporaryDirectory() as tmp:
+        modelo = os.path.join(tmp, "m.gguf")
+        with open(modelo, "wb") as f:
+            f.write(b"gguf")
+        os.environ["MODEL_PATH"] = modelo
+        try:
+            path = os.path.join(tmp, "tuning_profiles.json")
+            resultado = {"n_threads": 4, "n_batch": 512, "llm_workers": 2, "cases_per_min": 30.0,
+                         "prefill_tok_s": 900.0, "decode_tok_s": 20.0, "load_s": 1.0}
+            save_profile(path, "otro-host|m.gguf|4", dict(resultado, n_threads=16), 8)
+            save_profile(path, profile_key("m.gguf"), resultado, 8)
+            assert len(load_profiles(path)) == 2 and profile_key("m.gguf").endswith("|m.gguf|4")
+            config = {"model_filename": "m.gguf", "n_threads": 8, "n_batch": 256, "tuning_profiles_path": path}
+            logs = []
+            tuned = apply_tuning_profile(config, logs.append)
+            assert (tuned["n_threads"], tuned["n_batch"], tuned["llm_workers"]) == (4, 512, 2)
+            assert config["n_threads"] == 8 and "Perfil de tuning aplicado" in logs[0]
+            assert apply_tuning_profile(dict(config, use_tuning_profile=False)) == dict(config, use_tuning_profile=False)
+            assert apply_tuning_profile(dict(config, llm_backend="http"))["n_threads"] == 8
+            assert apply_tuning_profile(dict(config, model_filename="otro.gguf"))["n_threads"] == 8
+        finally:
+            if original_env is None:
+                os.environ.pop("MODEL_PATH", None)
+            else:
+                os.environ["MODEL_PATH"] = original_env
+
+
+def test_pipeline_aplica_perfil():
+    """analizar_pipeline carga el judge con los valores del perfil; sample_judge_prompts arma prompts reales."""
+    from core.analyzer import analizar_pipeline, sample_judge_prompts
+
+    chats = os.path.join(_raiz, "data", "Chat.csv")
+    training = os.path.join(_raiz, "data", "Intent.csv")
+    if not os.path.isfile(chats) or not os.path.isfile(training):
+        return
+    prompts = sample_judge_prompts(chats, training, n=3)
+    assert 0 < len(prompts) <= 3 and all("INPUT" in p for p in prompts)
+    cargados = []
+
+    class _FakeLocalLLM(_FakeJudge):
+        def __init__(self, cfg, cache=None):
+            super().__init__(cfg)
+            cargados.append(cfg)
+
+        def chat_json_batch(self, prompts):
+            self.last_generated_tokens_batch = [0] * len(prompts)
+            return super().chat_json_batch(prompts)
+
+    original = llm_runtime.LocalLLM
+    llm_runtime.LocalLLM = _FakeLocalLLM
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tuning_profiles.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({profile_key("m.gguf"): {"n_threads": 3, "n_batch": 128, "llm_workers": 1}}, f)
+            logs = []
+            analizar_pipeline(
+                chats, training, os.path.join(tmp, "out"), logger_callback=logs.append,
+                config={"use_cache": False, "max_workers": 2, "journal": False, "model_filename": "m.gguf",
+                        "n_threads": 8, "tuning_profiles_path": path},
+            )
+    finally:
+        llm_runtime.LocalLLM = original
+    assert cargados and (cargados[0].n_threads, cargados[0].n_batch) == (3, 128)
+    assert any("Perfil de tuning aplicado" in m for m in logs)
+
+
+if __name__ == "__main__":
+    test_run_tuning()
+    test_perfil_por_host_y_modelo()
+    test_pipeline_aplica_perfil()
+    print("test_tuning OK")
@@ -65,7 +65,7 @@ Cuentas_Resumen,es,Quiero ver mi cuenta
 
         cases = extract_no_match_cases(df_turns)
         assert len(cases) == 1
-        case = cases[0]
+        case = cases.iloc[0]
         assert case["trigger_user_text"] == "El del mes pasado"
 
         # Índice mínimo para process_one_case (retriever)
@@ -110,7 +110,7 @@ def test_flow_with_real_data_if_present():
     df_training = load_training_ffill(path_intents)
     cases = extract_no_match_cases(df_turns)
     index = build_training_index(df_training)
-    for c in cases[:2]:  # como mucho 2 casos
+    for c in cases.head(2).to_dict("records"):  # como mucho 2 casos
         r = process_one_case(c, df_turns, index, neutral_flows=FLOWS_NEUTRALES)
         assert "flow_ref" in r and "candidates" in r
 
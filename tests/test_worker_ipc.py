@@ -0,0 +1,84 @@
+"""
+Test de lo que viaja a los workers de la fase paralela: chunks sin cortar sesiones, solo los turnos de las sesiones
+de cada tarea (columnas mínimas) y el índice abierto con mmap desde la caché; los payloads no cambian.
+"""
+import os
+import sys
+import tempfile
+
+_raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _raiz not in sys.path:
+    sys.path.insert(0, _raiz)
+
+import core.analyzer as analyzer
+from core.analyzer import WORKER_TURN_COLUMNS, _session_chunks, _session_turns, process_cases
+from core.cases import extract_no_match_cases
+from core.index_cache import cached_index_entry, get_training_index
+from core.preprocess import cargar_chats_as_turns
+from core.sessions import build_session_index
+from core.spec import FLOWS_NEUTRALES
+
+CHATS = os.path.join(_raiz, "data", "Chat.csv")
+TRAINING = os.path.join(_raiz, "data", "Intent.csv")
+
+
+def _datos():
+    df = cargar_chats_as_turns(CHATS)
+    session_index = build_session_index(df)
+    return df, session_index, extract_no_match_cases(df, session_index).to_dict("records")
+
+
+def test_chunks_por_sesion():
+    """Un chunk se cierra en el primer cambio de sesión después de chunk_size casos; el orden se conserva."""
+    casos = [{"case_id": i, "session_id": s} for i, s in enumerate("aaabbcddd")]
+    chunks = list(_session_chunks([casos[:4], casos[4:]], 2))
+    assert [[c["session_id"] for c in ch] for ch in chunks] == [["a", "a", "a"], ["b", "b"], ["c", "d", "d", "d"]]
+    assert [c["case_id"] for ch in chunks for c in ch] == list(range(9))
+
+
+def test_turnos_por_tarea():
+    """Cada tarea lleva solo turnos de sus sesiones y WORKER_TURN_COLUMNS; process_cases da lo mismo que con todo."""
+    if not os.path.isfile(CHATS) or not os.path.isfile(TRAINING):
+        return
+    df, session_index, cases = _datos()
+    index = get_training_index(TRAINING)
+    neutral = set(FLOWS_NEUTRALES)
+    for chunk in _session_chunks([cases], 2):
+        turns = _session_turns(chunk, df, session_index, 3)
+        assert tuple(turns.columns) == WORKER_TURN_COLUMNS
+        assert set(turns["session_id"]) <= {c["session_id"] for c in chunk} and len(turns) < len(df)
+        esperado = process_cases(chunk, df, index, 3, 3, 2, neutral, session_index)
+        assert process_cases(chunk, turns, index, 3, 3, 2, neutral, build_session_index(turns)) == esperado
+        # Sin flow_ref en el caso la sesión viaja desde el inicio (infer_flow_ref mira todo lo anterior)
+        sin_flow = [{k: v for k, v in c.items() if k != "flow_ref"} for c in chunk]
+        turns = _session_turns(sin_flow, df, session_index, 3)
+        assert process_cases(sin_flow, turns, index, 3, 3, 2, neutral, build_session_index(turns)) == esperado
+    assert _session_turns(chunk, None, None, 3) is None
+
+
+def test_worker_indice_mmap():
+    """Con caché el worker recibe (cache_dir, key) y abre la matriz con mmap; el resultado es el del índice pickleado."""
+    if not os.path.isfile(CHATS) or not os.path.isfile(TRAINING):
+        return
+    df, session_index, cases = _datos()
+    chunk = cases[:4]
+    task = (chunk, _session_turns(chunk, df, session_index, 5))
+    with tempfile.TemporaryDirectory() as tmp:
+        assert cached_index_entry(None, TRAINING) is None and cached_index_entry(tmp, TRAINING) is None
+        index = get_training_index(TRAINING, cache_dir=tmp)
+        source = cached_index_entry(tmp, TRAINING)
+        assert source is not None and source[0] == tmp
+        analyzer._init_process_worker((source, 5, 3, 2, list(FLOWS_NEUTRALES), 4000, None))
+        # Vista de solo lectura sobre el .npy mapeado (mmap_mode="r"), no una copia
+        assert not analyzer._worker_index["matrix"].data.flags.writeable
+        por_mmap = analyzer._process_cases_worker(task)
+        analyzer._init_process_worker((index, 5, 3, 2, list(FLOWS_NEUTRALES), 4000, None))
+        assert analyzer._process_cases_worker(task) == por_mmap
+        analyzer._worker_index = None
+
+
+if __name__ == "__main__":
+    test_chunks_por_sesion()
+    test_turnos_por_tarea()
+    test_worker_indice_mmap()
+    print("test_worker_ipc OK")
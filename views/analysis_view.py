@@ -4,8 +4,9 @@ import threading
 import os
 import pandas as pd
 
-from core.config_loader import load_config, resolve_data_path, get_model_filename_from_config
+from core.config_loader import load_config, resolve_data_path, get_model_filename_from_config, resolve_cache_dir
 from core.analyzer import analizar_pipeline
+from core import runtime_registry
 
 class AnalysisView(tk.Frame):
     def __init__(self, parent):
@@ -26,6 +27,15 @@ class AnalysisView(tk.Frame):
             font=("Segoe UI", 10),
         )
         self.chk_informe_agregado.pack(anchor="w")
+        self.var_reanudar = tk.BooleanVar(value=False)
+        self.chk_reanudar = tk.Checkbutton(
+            opts_frame,
+            text="Reanudar análisis interrumpido (no volver a juzgar casos del journal)",
+            variable=self.var_reanudar,
+            bg="#ECECEC",
+            font=("Segoe UI", 10),
+        )
+        self.chk_reanudar.pack(anchor="w")
 
         btn_frame = tk.Frame(self, bg="#ECECEC")
         btn_frame.pack(pady=5)
@@ -36,6 +46,41 @@ class AnalysisView(tk.Frame):
         self.tabla_frame = tk.Frame(self, bg="#ECECEC")
         self.tabla_frame.pack(fill="both", expand=True, padx=10, pady=10)
 
+        self._precarga = None
+
+    def on_show(self):
+        """Al abrir la vista: precarga en segundo plano del índice de training y del modelo (runtime_registry)."""
+        if self._precarga is not None and self._precarga.is_alive():
+            return
+        try:
+            config = load_config()
+            pipeline_config = self._pipeline_config(config)
+            path_out = resolve_data_path(config.get("output_folder", "outputs"))
+            training = config.get("csv_intents", "")
+            self._precarga = runtime_registry.preload(
+                pipeline_config,
+                resolve_data_path(training) if training else "",
+                cache_dir=resolve_cache_dir(pipeline_config, path_out),
+                logger_callback=self.log,
+            )
+        except Exception as e:
+            self.log(f"No se pudo precargar: {e}")
+
+    def _pipeline_config(self, config):
+        model_filename = get_model_filename_from_config(config)
+        return {
+            "max_workers": config.get("max_workers", 4),
+            "model_filename": model_filename or None,
+            "n_ctx": config.get("n_ctx", 4096),
+            "n_threads": config.get("n_threads", 8),
+            "write_jsonl": True,
+            "write_debug": config.get("write_debug", False),
+            "write_informe_general": self.var_informe_agregado.get(),
+            "cache_folder": config.get("cache_folder", ""),
+            "resume": self.var_reanudar.get(),
+            "resident_runtime": True,
+        }
+
     def log(self, mensaje):
         self.console.insert(tk.END, mensaje + "\n")
         self.console.see(tk.END)
@@ -50,16 +95,8 @@ class AnalysisView(tk.Frame):
         try:
             config = load_config()
             path_out = resolve_data_path(config.get("output_folder", "outputs"))
-            model_filename = get_model_filename_from_config(config)
-            pipeline_config = {
-                "max_workers": config.get("max_workers", 4),
-                "model_filename": model_filename or None,
-                "n_ctx": config.get("n_ctx", 4096),
-                "n_threads": config.get("n_threads", 8),
-                "write_jsonl": True,
-                "write_debug": config.get("write_debug", False),
-                "write_informe_general": self.var_informe_agregado.get(),
-            }
+            pipeline_config = self._pipeline_config(config)
+            model_filename = pipeline_config["model_filename"]
             analizar_pipeline(
                 path_chat_csv=resolve_data_path(config.get("csv_chats", "")),
                 path_training_csv=resolve_data_path(config.get("csv_intents", "")),